@@ -10,6 +10,7 @@ import os
 import secrets
 import hashlib
 import logging
+from contextvars import ContextVar
 from datetime import datetime, timezone, timedelta
 from typing import Optional
 
@@ -50,6 +51,7 @@ ORGS_COLLECTION = "organizations"
 SESSIONS_COLLECTION = "sessions"
 MEMBERSHIPS_COLLECTION = "memberships"
 OAUTH_STATES_COLLECTION = "oauth_states"
+SLUG_INDEX_COLLECTION = "slug_index"  # slug -> org_id, for keyed SSO lookups
 
 # Temporary in-memory storage for OAuth states (short-lived, can be in-memory)
 # These are CSRF tokens that expire in minutes, not user data
@@ -77,6 +79,19 @@ def get_db():
     return _db
 
 
+_async_db = None
+
+def get_async_db():
+    """Get async Firestore client for use inside async endpoints."""
+    global _async_db
+    if _async_db is None and FIRESTORE_AVAILABLE:
+        try:
+            _async_db = firestore.AsyncClient(project=FIRESTORE_PROJECT)
+        except Exception as e:
+            logger.error(f"Async Firestore connection failed: {e}")
+    return _async_db
+
+
 # =============================================================================
 # REQUEST/RESPONSE MODELS
 # =============================================================================
@@ -141,7 +156,7 @@ def get_user_by_email(email: str) -> Optional[dict]:
     
     users_ref = db.collection(USERS_COLLECTION)
     query = users_ref.where("email", "==", email).limit(1)
-    docs = list(query.stream())
+    docs = query.get()
     
     if docs:
         user_data = docs[0].to_dict()
@@ -207,12 +222,27 @@ def create_org_record(org_id: str, name: str, slug: str, owner_id: str) -> dict:
     }
     
     db.collection(ORGS_COLLECTION).document(org_id).set(org_data)
+    index_org_slug(slug, org_id)
     org_data["id"] = org_id
     return org_data
 
 
-def create_membership_record(user_id: str, org_id: str, role: str = "owner") -> dict:
-    """Create membership in Firestore."""
+def index_org_slug(slug: str, org_id: str) -> None:
+    """Claim slug_index/{slug} for an org. The first org to claim a slug keeps it."""
+    db = get_db()
+    if not db:
+        return
+    
+    try:
+        db.collection(SLUG_INDEX_COLLECTION).document(slug.lower()).create({"org_id": org_id})
+    except Exception as e:
+        logger.debug(f"Slug {slug} already indexed: {e}")
+
+
+def create_membership_record(
+    user_id: str, org_id: str, role: str = "owner", email: str = "", name: str = "",
+) -> dict:
+    """Create membership in Firestore (user email/name are denormalized onto it)."""
     db = get_db()
     if not db:
         raise HTTPException(503, "Database unavailable")
@@ -222,6 +252,8 @@ def create_membership_record(user_id: str, org_id: str, role: str = "owner") ->
     mem_data = {
         "user_id": user_id,
         "org_id": org_id,
+        "email": email,
+        "name": name,
         "role": role,
         "created_at": now,
     }
@@ -239,7 +271,7 @@ def get_user_org(user_id: str) -> Optional[dict]:
     # Find membership
     mem_ref = db.collection(MEMBERSHIPS_COLLECTION)
     query = mem_ref.where("user_id", "==", user_id).limit(1)
-    docs = list(query.stream())
+    docs = query.get()
     
     if not docs:
         return None
@@ -259,18 +291,38 @@ def get_user_org(user_id: str) -> Optional[dict]:
     return None
 
 
+# Per-request org lookup memo, installed by the org_request_cache dependency
+_org_cache: ContextVar[Optional[dict]] = ContextVar("org_cache", default=None)
+
+
+async def org_request_cache() -> None:
+    """
+    Router dependency that scopes get_org_by_id memoization to one request.
+    
+    Each request runs in its own context, so the dict set here is visible to
+    the endpoint (and to asyncio.to_thread calls it makes) and nowhere else.
+    """
+    _org_cache.set({})
+
+
 def get_org_by_id(org_id: str) -> Optional[dict]:
     """Get organization by ID from Firestore."""
+    cache = _org_cache.get()
+    if cache is not None and org_id in cache:
+        return cache[org_id]
+    
     db = get_db()
     if not db:
         return None
     
     org_doc = db.collection(ORGS_COLLECTION).document(org_id).get()
+    org_data = None
     if org_doc.exists:
         org_data = org_doc.to_dict()
         org_data["id"] = org_doc.id
-        return org_data
-    return None
+    if cache is not None:
+        cache[org_id] = org_data
+    return org_data
 
 
 def update_org(org_id: str, updates: dict) -> bool:
@@ -279,6 +331,10 @@ def update_org(org_id: str, updates: dict) -> bool:
     if not db:
         return False
     
+    cache = _org_cache.get()
+    if cache is not None:
+        cache.pop(org_id, None)
+    
     try:
         db.collection(ORGS_COLLECTION).document(org_id).update({
             **updates,
@@ -482,7 +538,7 @@ async def signup(request: SignupRequest):
     org = create_org_record(org_id, company_name, slug, user_id)
     
     # Create membership in Firestore
-    create_membership_record(user_id, org_id, "owner")
+    create_membership_record(user_id, org_id, "owner", request.email, request.name)
     
     # Create session in Firestore
     token = create_session_token(user_id, org_id)
@@ -787,10 +843,11 @@ async def google_oauth_callback(code: str, state: str):
             "updated_at": now,
         }
         db.collection(ORGS_COLLECTION).document(org_id).set(org_data)
+        index_org_slug(org_data["slug"], org_id)
         org_data["id"] = org_id
         
         # Create membership
-        create_membership_record(user_id, org_id, "owner")
+        create_membership_record(user_id, org_id, "owner", email, name)
         
         logger.info(f"New Google OAuth user: {email} (user: {user_id}, org: {org_id})")
         
@@ -969,10 +1026,11 @@ async def github_oauth_callback(code: str, state: str):
             "updated_at": now,
         }
         db.collection(ORGS_COLLECTION).document(org_id).set(org_data)
+        index_org_slug(org_data["slug"], org_id)
         org_data["id"] = org_id
         
         # Create membership
-        create_membership_record(user_id, org_id, "owner")
+        create_membership_record(user_id, org_id, "owner", email, name)
         
         logger.info(f"New GitHub OAuth user: {email} (user: {user_id}, org: {org_id})")
         
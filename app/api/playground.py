@@ -13,16 +13,27 @@ import logging
 import uuid
 import time
 import os
+import asyncio
+import hashlib
 from datetime import datetime, timezone
 from typing import Optional, List, Dict, Any
 
+import orjson
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 
-from app.api.auth import require_auth, get_db
+from app.api.auth import require_auth, get_async_db
+from app.api.templates import new_template_ref
+from app.core.caching import playground_cache, request_hasher
+from app.core.secrets import get_llm_credentials
 
 logger = logging.getLogger("tracevox.playground")
-router = APIRouter(prefix="/playground", tags=["Prompt Playground"])
+router = APIRouter(
+    prefix="/playground",
+    tags=["Prompt Playground"],
+    default_response_class=ORJSONResponse,
+)
 
 
 # =============================================================================
@@ -62,6 +73,7 @@ class PlaygroundResponse(BaseModel):
     # Metadata
     created_at: str
     custom_properties: Optional[Dict[str, Any]] = None
+    cached: bool = False
 
 
 class CompareRequest(BaseModel):
@@ -82,6 +94,10 @@ class SaveAsTemplateRequest(BaseModel):
     default_provider: Optional[str] = None
 
 
+# Prompts larger than this are stored once in prompt_blobs and referenced by hash
+PROMPT_BLOB_THRESHOLD_BYTES = 4096
+
+
 # =============================================================================
 # PRICING
 # =============================================================================
@@ -228,6 +244,64 @@ async def call_google(api_key: str, model: str, messages: list, temperature: flo
     return text, prompt_tokens, completion_tokens, "stop"
 
 
+# Provider name -> client coroutine, shared by /run and /compare
+PROVIDERS = {
+    "openai": call_openai,
+    "anthropic": call_anthropic,
+    "google": call_google,
+}
+
+# In-flight deterministic calls, keyed "{org_id}:{request hash}"
+_inflight_llm: Dict[str, asyncio.Task] = {}
+
+
+def _request_hash(provider: str, model: str, messages: list, max_tokens: int) -> str:
+    """Hash a deterministic (temperature=0) call for caching and coalescing."""
+    # Qualify the model so identical names under different providers differ
+    return request_hasher.hash_openai_request(
+        model=f"{provider}/{model}",
+        messages=messages,
+        temperature=0,
+        max_tokens=max_tokens,
+    )
+
+
+def _release_inflight(key: str, task: asyncio.Task) -> None:
+    """Remove a finished call from the in-flight map."""
+    _inflight_llm.pop(key, None)
+    if not task.cancelled():
+        task.exception()  # Mark retrieved even if every waiter went away
+
+
+async def dispatch(
+    org_id: str,
+    provider: str,
+    api_key: str,
+    model: str,
+    messages: list,
+    temperature: float,
+    max_tokens: int,
+) -> tuple:
+    """
+    Call a provider, coalescing identical concurrent deterministic calls.
+    
+    At temperature=0, callers sending the same prompt while a matching call
+    is already running await that call instead of issuing their own.
+    """
+    call_provider = PROVIDERS[provider]
+    if temperature != 0:
+        return await call_provider(api_key, model, messages, temperature, max_tokens)
+    
+    key = f"{org_id}:{_request_hash(provider, model, messages, max_tokens)}"
+    task = _inflight_llm.get(key)
+    if task is None:
+        task = asyncio.create_task(call_provider(api_key, model, messages, temperature, max_tokens))
+        _inflight_llm[key] = task
+        task.add_done_callback(lambda t: _release_inflight(key, t))
+    # Shield so one caller disconnecting doesn't cancel the shared call
+    return await asyncio.shield(task)
+
+
 # =============================================================================
 # ENDPOINTS
 # =============================================================================
@@ -245,7 +319,6 @@ async def run_playground(
     user_id = current_user["user"]["id"]
     
     # Get stored credentials
-    from app.core.secrets import get_llm_credentials
     credentials = await get_llm_credentials(org_id)
     
     if not credentials:
@@ -275,47 +348,80 @@ async def run_playground(
     logger.info(f"Playground using provider={provider}, model={model}")
     
     t0 = time.time()
-    
-    try:
-        if provider == "openai":
-            text, prompt_tokens, completion_tokens, finish_reason = await call_openai(
-                api_key, model, messages, request.temperature, request.max_tokens
-            )
-        elif provider == "anthropic":
-            text, prompt_tokens, completion_tokens, finish_reason = await call_anthropic(
-                api_key, model, messages, request.temperature, request.max_tokens
+    now = datetime.now(timezone.utc)
+    
+    # Deterministic runs are served from cache when the same prompt repeats
+    request_hash = None
+    cached = None
+    if request.temperature == 0:
+        request_hash = _request_hash(provider, model, messages, request.max_tokens)
+        _, cached = await playground_cache.get(org_id, request_hash)
+    
+    if cached is not None:
+        body = orjson.loads(cached.response_body)
+        text = body["content"]
+        finish_reason = body.get("finish_reason")
+        prompt_tokens = cached.prompt_tokens
+        completion_tokens = cached.completion_tokens
+        latency_ms = int((time.time() - t0) * 1000)
+        cost = calculate_cost(model, 0, 0)
+    else:
+        if provider not in PROVIDERS:
+            raise HTTPException(400, f"Unsupported provider: {provider}")
+        
+        try:
+            text, prompt_tokens, completion_tokens, finish_reason = await dispatch(
+                org_id, provider, api_key, model, messages, request.temperature, request.max_tokens
             )
-        elif provider == "google":
-            text, prompt_tokens, completion_tokens, finish_reason = await call_google(
-                api_key, model, messages, request.temperature, request.max_tokens
+        except Exception as e:
+            logger.error(f"Playground error: {e}")
+            raise HTTPException(500, f"LLM API error: {str(e)[:200]}")
+        
+        latency_ms = int((time.time() - t0) * 1000)
+        cost = calculate_cost(model, prompt_tokens, completion_tokens)
+        
+        if request_hash:
+            await playground_cache.set(
+                org_id,
+                request_hash,
+                response_body=orjson.dumps({"content": text, "finish_reason": finish_reason}),
+                status_code=200,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                model=model,
+                cost_usd=cost["total_cost_usd"],
             )
-        else:
-            raise HTTPException(400, f"Unsupported provider: {provider}")
-            
-    except Exception as e:
-        logger.error(f"Playground error: {e}")
-        raise HTTPException(500, f"LLM API error: {str(e)[:200]}")
-    
-    latency_ms = int((time.time() - t0) * 1000)
-    cost = calculate_cost(model, prompt_tokens, completion_tokens)
     
     # Log to Firestore for history
-    db = get_db()
+    db = get_async_db()
     if db:
         try:
-            db.collection("playground_history").add({
+            history_entry = {
                 "org_id": org_id,
                 "user_id": user_id,
-                "messages": messages,
                 "response": text,
                 "model": model,
                 "provider": provider,
                 "tokens": {"prompt": prompt_tokens, "completion": completion_tokens},
                 "cost": cost,
                 "latency_ms": latency_ms,
+                "cached": cached is not None,
                 "custom_properties": request.custom_properties,
-                "created_at": datetime.now(timezone.utc),
-            })
+                "created_at": now,
+            }
+            
+            # Large prompts are deduplicated across repeat runs
+            serialized = orjson.dumps(messages, option=orjson.OPT_SORT_KEYS)
+            if len(serialized) > PROMPT_BLOB_THRESHOLD_BYTES:
+                content_key = hashlib.sha256(serialized).hexdigest()
+                await db.collection("prompt_blobs").document(content_key).set(
+                    {"messages": messages}, merge=True
+                )
+                history_entry["messages_ref"] = content_key
+            else:
+                history_entry["messages"] = messages
+            
+            await db.collection("playground_history").add(history_entry)
         except Exception as e:
             logger.warning(f"Failed to log playground history: {e}")
     
@@ -332,8 +438,9 @@ async def run_playground(
         cost=cost,
         latency_ms=latency_ms,
         finish_reason=finish_reason,
-        created_at=datetime.now(timezone.utc).isoformat(),
+        created_at=now.isoformat(),
         custom_properties=request.custom_properties,
+        cached=cached is not None,
     )
 
 
@@ -349,7 +456,6 @@ async def compare_models(
     org_id = current_user["org_id"]
     
     # Get stored credentials
-    from app.core.secrets import get_llm_credentials
     credentials = await get_llm_credentials(org_id)
     
     if not credentials:
@@ -364,17 +470,10 @@ async def compare_models(
         
         t0 = time.time()
         try:
-            if provider == "openai":
-                text, prompt_tokens, completion_tokens, finish_reason = await call_openai(
-                    credentials.api_key, model, messages, request.temperature, request.max_tokens
-                )
-            elif provider == "anthropic":
-                text, prompt_tokens, completion_tokens, finish_reason = await call_anthropic(
-                    credentials.api_key, model, messages, request.temperature, request.max_tokens
-                )
-            elif provider == "google":
-                text, prompt_tokens, completion_tokens, finish_reason = await call_google(
-                    credentials.api_key, model, messages, request.temperature, request.max_tokens
+            if provider in PROVIDERS:
+                text, prompt_tokens, completion_tokens, finish_reason = await dispatch(
+                    org_id, provider, credentials.api_key, model, messages,
+                    request.temperature, request.max_tokens,
                 )
             else:
                 text = f"Unsupported provider: {provider}"
@@ -421,32 +520,45 @@ async def get_playground_history(
     org_id = current_user["org_id"]
     user_id = current_user["user"]["id"]
     
-    db = get_db()
+    db = get_async_db()
     if not db:
         return {"history": []}
     
-    try:
-        query = (
-            db.collection("playground_history")
-            .where("org_id", "==", org_id)
-            .where("user_id", "==", user_id)
-            .order_by("created_at", direction="DESCENDING")
-            .limit(limit)
-        )
-        
-        history = []
-        for doc in query.stream():
-            data = doc.to_dict()
-            data["id"] = doc.id
-            if data.get("created_at"):
-                data["created_at"] = data["created_at"].isoformat()
-            history.append(data)
-        
-        return {"history": history}
-        
-    except Exception as e:
-        logger.error(f"Failed to get playground history: {e}")
-        return {"history": [], "error": str(e)}
+    query = (
+        db.collection("playground_history")
+        .where("org_id", "==", org_id)
+        .where("user_id", "==", user_id)
+        .order_by("created_at", direction="DESCENDING")
+        .limit(limit)
+    )
+    
+    async def stream_history():
+        # Emit each entry as it arrives from Firestore instead of buffering the page
+        blobs: Dict[str, list] = {}
+        yield b'{"history":['
+        first = True
+        try:
+            async for doc in query.stream():
+                data = doc.to_dict()
+                data["id"] = doc.id
+                if data.get("created_at"):
+                    data["created_at"] = data["created_at"].isoformat()
+                
+                # Hydrate deduplicated prompts, fetching each blob once per response
+                blob_key = data.get("messages_ref")
+                if blob_key:
+                    if blob_key not in blobs:
+                        blob = await db.collection("prompt_blobs").document(blob_key).get()
+                        blobs[blob_key] = blob.to_dict().get("messages", []) if blob.exists else []
+                    data["messages"] = blobs[blob_key]
+                
+                yield (b"" if first else b",") + orjson.dumps(data, default=str)
+                first = False
+        except Exception as e:
+            logger.error(f"Failed to get playground history: {e}")
+        yield b"]}"
+    
+    return StreamingResponse(stream_history(), media_type="application/json")
 
 
 @router.post("/save-as-template")
@@ -460,72 +572,81 @@ async def save_as_template(
     org_id = current_user["org_id"]
     user_id = current_user["user"]["id"]
     
-    db = get_db()
+    db = get_async_db()
     if not db:
         raise HTTPException(503, "Database not available")
     
+    now = datetime.now(timezone.utc)
     template_data = {
         "org_id": org_id,
         "created_by": user_id,
         "name": request.name,
+        "name_lower": request.name.lower(),
         "description": request.description,
         "messages": [{"role": m.role, "content": m.content} for m in request.messages],
+        "message_count": len(request.messages),
         "variables": request.variables or [],
+        "variable_count": len(request.variables or []),
         "default_model": request.default_model,
         "default_provider": request.default_provider,
         "version": 1,
+        "usage_count": 0,
         "is_active": True,
-        "created_at": datetime.now(timezone.utc),
-        "updated_at": datetime.now(timezone.utc),
+        "created_at": now,
+        "updated_at": now,
     }
     
-    template_ref = db.collection("prompt_templates").add(template_data)
+    template_ref = new_template_ref(db, org_id)
+    await template_ref.set(template_data)
     
     return {
         "success": True,
-        "template_id": template_ref[1].id,
+        "template_id": template_ref.id,
         "name": request.name,
     }
 
 
+# Static payload for GET /models, built once at import
+_MODELS_PAYLOAD = {
+    "providers": [
+        {
+            "id": "openai",
+            "name": "OpenAI",
+            "models": [
+                {"id": "gpt-4o", "name": "GPT-4o", "context": 128000},
+                {"id": "gpt-4o-mini", "name": "GPT-4o Mini", "context": 128000},
+                {"id": "gpt-4-turbo", "name": "GPT-4 Turbo", "context": 128000},
+                {"id": "gpt-3.5-turbo", "name": "GPT-3.5 Turbo", "context": 16385},
+            ],
+        },
+        {
+            "id": "anthropic",
+            "name": "Anthropic",
+            "models": [
+                {"id": "claude-3-5-sonnet-20241022", "name": "Claude 3.5 Sonnet", "context": 200000},
+                {"id": "claude-3-opus-20240229", "name": "Claude 3 Opus", "context": 200000},
+                {"id": "claude-3-sonnet-20240229", "name": "Claude 3 Sonnet", "context": 200000},
+                {"id": "claude-3-haiku-20240307", "name": "Claude 3 Haiku", "context": 200000},
+            ],
+        },
+        {
+            "id": "google",
+            "name": "Google",
+            "models": [
+                {"id": "gemini-2.0-flash-exp", "name": "Gemini 2.0 Flash (Exp)", "context": 1000000},
+                {"id": "gemini-1.5-flash-latest", "name": "Gemini 1.5 Flash", "context": 1000000},
+                {"id": "gemini-1.5-pro-latest", "name": "Gemini 1.5 Pro", "context": 1000000},
+                {"id": "gemini-pro", "name": "Gemini Pro", "context": 32000},
+            ],
+        },
+    ],
+    "pricing": PRICING,
+}
+
+
 @router.get("/models")
 async def get_available_models():
     """
     Get list of available models for the playground.
     """
-    return {
-        "providers": [
-            {
-                "id": "openai",
-                "name": "OpenAI",
-                "models": [
-                    {"id": "gpt-4o", "name": "GPT-4o", "context": 128000},
-                    {"id": "gpt-4o-mini", "name": "GPT-4o Mini", "context": 128000},
-                    {"id": "gpt-4-turbo", "name": "GPT-4 Turbo", "context": 128000},
-                    {"id": "gpt-3.5-turbo", "name": "GPT-3.5 Turbo", "context": 16385},
-                ],
-            },
-            {
-                "id": "anthropic",
-                "name": "Anthropic",
-                "models": [
-                    {"id": "claude-3-5-sonnet-20241022", "name": "Claude 3.5 Sonnet", "context": 200000},
-                    {"id": "claude-3-opus-20240229", "name": "Claude 3 Opus", "context": 200000},
-                    {"id": "claude-3-sonnet-20240229", "name": "Claude 3 Sonnet", "context": 200000},
-                    {"id": "claude-3-haiku-20240307", "name": "Claude 3 Haiku", "context": 200000},
-                ],
-            },
-            {
-                "id": "google",
-                "name": "Google",
-                "models": [
-                    {"id": "gemini-2.0-flash-exp", "name": "Gemini 2.0 Flash (Exp)", "context": 1000000},
-                    {"id": "gemini-1.5-flash-latest", "name": "Gemini 1.5 Flash", "context": 1000000},
-                    {"id": "gemini-1.5-pro-latest", "name": "Gemini 1.5 Pro", "context": 1000000},
-                    {"id": "gemini-pro", "name": "Gemini Pro", "context": 32000},
-                ],
-            },
-        ],
-        "pricing": PRICING,
-    }
-
+    return _MODELS_PAYLOAD
@@ -11,41 +11,112 @@ Enterprise Single Sign-On support:
 from __future__ import annotations
 import os
 import logging
+import time
+import json
+import base64
+import asyncio
 import secrets
 import hashlib
 from datetime import datetime, timezone, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from enum import Enum
+from functools import lru_cache
 from urllib.parse import urlencode
 
+import httpx
+import orjson
 from fastapi import APIRouter, Depends, HTTPException, Request, Response
-from fastapi.responses import RedirectResponse
+from fastapi.responses import ORJSONResponse, RedirectResponse
 from pydantic import BaseModel, Field, HttpUrl
 
 from app.api.auth import require_auth, get_org_by_id, update_org
 
 logger = logging.getLogger("llmobs.sso")
-router = APIRouter(prefix="/sso", tags=["SSO"])
+router = APIRouter(prefix="/sso", tags=["SSO"], default_response_class=ORJSONResponse)
 
-# Firestore client
+# Firestore client (async, so SSO round-trips don't block the event loop)
 _db = None
 
 def get_db():
-    """Get Firestore client."""
+    """Get async Firestore client."""
     global _db
     if _db is None:
         try:
             from google.cloud import firestore
-            _db = firestore.Client()
+            _db = firestore.AsyncClient()
         except Exception as e:
             logger.error(f"Failed to init Firestore: {e}")
     return _db
 
 
+# Fields read for the safe config view; skips IdP certificates and other blobs
+SAFE_CONFIG_FIELDS = [
+    "provider",
+    "name",
+    "enabled",
+    "enforce",
+    "allowed_domains",
+    "auto_provision",
+    "default_role",
+    "created_at",
+    "saml_config.idp_entity_id",
+    "saml_config.idp_sso_url",
+    "oidc_config.issuer",
+    "oidc_config.client_id",
+    "oidc_config.client_secret",
+]
+
+# Shared HTTP client for IdP calls - created lazily, reuses TLS connections
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get or create the shared IdP HTTP client."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=30.0,
+            limits=httpx.Limits(
+                max_connections=200,
+                max_keepalive_connections=100,
+                keepalive_expiry=60.0,
+            ),
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Close the shared IdP HTTP client."""
+    global _http_client
+    if _http_client:
+        await _http_client.aclose()
+        _http_client = None
+
+
+# OIDC discovery documents per issuer; failed lookups are retried sooner
+OIDC_DISCOVERY_TTL_SECONDS = 3600
+OIDC_DISCOVERY_RETRY_SECONDS = 60
+_oidc_discovery_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+# Short-lived cache + single-flight map for the safe SSO config view
+SAFE_CONFIG_TTL_SECONDS = 5
+_safe_config_cache: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {}
+_safe_config_inflight: Dict[str, asyncio.Task] = {}
+
+# Login-path caches; SSO settings change far less often than users log in
+LOGIN_CACHE_TTL_SECONDS = 60
+_org_id_by_slug: Dict[str, Tuple[float, str]] = {}
+_login_config_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+
 # =============================================================================
 # MODELS
 # =============================================================================
 
+DEFAULT_OIDC_SCOPES = ("openid", "email", "profile")
+DEFAULT_OIDC_SCOPE_STR = " ".join(DEFAULT_OIDC_SCOPES)
+
+
 class SSOProvider(str, Enum):
     """Supported SSO providers."""
     SAML = "saml"
@@ -79,7 +150,7 @@ class OIDCConfig(BaseModel):
     issuer: str = Field(..., description="OIDC Issuer URL (e.g., https://accounts.google.com)")
     client_id: str = Field(..., description="OAuth2 Client ID")
     client_secret: str = Field(..., description="OAuth2 Client Secret")
-    scopes: List[str] = Field(default=["openid", "email", "profile"], description="OAuth2 scopes")
+    scopes: List[str] = Field(default=list(DEFAULT_OIDC_SCOPES), description="OAuth2 scopes")
     authorization_endpoint: Optional[str] = Field(None, description="Override authorization endpoint")
     token_endpoint: Optional[str] = Field(None, description="Override token endpoint")
     userinfo_endpoint: Optional[str] = Field(None, description="Override userinfo endpoint")
@@ -114,28 +185,56 @@ class SSOConfigUpdate(BaseModel):
 # HELPER FUNCTIONS
 # =============================================================================
 
+# Public base URLs are fixed for the life of the process
+_APP_URL = os.getenv("APP_URL", "https://tracevox.ai")
+_API_URL = os.getenv("API_URL", "https://api.tracevox.ai")
+
+
+@lru_cache(maxsize=1024)
 def generate_sp_entity_id(org_id: str) -> str:
     """Generate Service Provider Entity ID."""
-    base_url = os.getenv("APP_URL", "https://tracevox.ai")
-    return f"{base_url}/sso/saml/{org_id}"
+    return f"{_APP_URL}/sso/saml/{org_id}"
 
 
+@lru_cache(maxsize=1024)
 def generate_acs_url(org_id: str) -> str:
     """Generate Assertion Consumer Service URL."""
-    base_url = os.getenv("API_URL", "https://api.tracevox.ai")
-    return f"{base_url}/sso/saml/{org_id}/acs"
+    return f"{_API_URL}/sso/saml/{org_id}/acs"
 
 
+@lru_cache(maxsize=1024)
 def generate_slo_url(org_id: str) -> str:
     """Generate Single Logout URL."""
-    base_url = os.getenv("API_URL", "https://api.tracevox.ai")
-    return f"{base_url}/sso/saml/{org_id}/slo"
+    return f"{_API_URL}/sso/saml/{org_id}/slo"
 
 
+@lru_cache(maxsize=1024)
 def generate_oidc_callback_url(org_id: str) -> str:
     """Generate OIDC callback URL."""
-    base_url = os.getenv("API_URL", "https://api.tracevox.ai")
-    return f"{base_url}/sso/oidc/{org_id}/callback"
+    return f"{_API_URL}/sso/oidc/{org_id}/callback"
+
+
+def decode_id_token_claims(id_token: str, client_id: Optional[str]) -> Dict[str, Any]:
+    """
+    Read the claims from an OIDC id_token.
+    
+    The token comes straight from the token endpoint over TLS, so the
+    signature check can be skipped (OIDC Core 3.1.3.7). Tokens issued for
+    a different audience are ignored.
+    """
+    try:
+        payload = id_token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+    except (IndexError, ValueError) as e:
+        logger.warning(f"Could not decode id_token: {e}")
+        return {}
+    
+    audience = claims.get("aud")
+    audiences = audience if isinstance(audience, list) else [audience]
+    if client_id not in audiences:
+        return {}
+    return claims
 
 
 async def create_sso_session(user_id: str, org_id: str, provider: str) -> str:
@@ -155,62 +254,304 @@ async def create_sso_session(user_id: str, org_id: str, provider: str) -> str:
         "provider": provider,
         "created_at": now,
         "expires_at": now + timedelta(days=7),
+        "is_active": True,
         "sso_session": True,
     }
     
-    db.collection("sessions").add(session_data)
+    # Keyed by token hash, matching auth.get_session's point lookup
+    await db.collection("sessions").document(session_hash).set(session_data)
     
     return session_token
 
 
-async def provision_user(email: str, name: str, org_id: str, role: str) -> str:
-    """Auto-provision a new user from SSO."""
-    db = get_db()
-    if not db:
-        raise HTTPException(503, "Database not available")
-    
+def normalize_domains(domains: List[str]) -> List[str]:
+    """Lower-case and de-duplicate allowed email domains for storage."""
+    return sorted({d.strip().lower() for d in domains if d.strip()})
+
+
+def sso_user_doc_id(email: str) -> str:
+    """Deterministic user document ID for SSO-provisioned users."""
+    return hashlib.sha256(email.lower().encode()).hexdigest()[:20]
+
+
+async def _provision_user_txn(
+    transaction, db, email: str, name: str, org_id: str, role: str, auto_provision: bool,
+) -> str:
+    """Read and upsert the user + membership inside a single transaction."""
     now = datetime.now(timezone.utc)
+    users = db.collection("users")
+    memberships = db.collection("memberships")
     
-    # Check if user exists
-    existing = db.collection("users").where("email", "==", email.lower()).limit(1)
-    existing_docs = list(existing.stream())
+    user_ref = users.document(sso_user_doc_id(email))
+    membership_ref = memberships.document(f"{user_ref.id}_{org_id}")
     
-    if existing_docs:
-        user_id = existing_docs[0].id
-        # Update org_id if not set
-        user_data = existing_docs[0].to_dict()
-        if not user_data.get("org_id"):
-            db.collection("users").document(user_id).update({"org_id": org_id})
-    else:
-        # Create new user
-        user_data = {
-            "email": email.lower(),
+    # One batched read covers the common case of a returning SSO user
+    snaps = {
+        snap.id: snap
+        async for snap in db.get_all([user_ref, membership_ref], transaction=transaction)
+    }
+    user_snap = snaps[user_ref.id]
+    membership_snap = snaps[membership_ref.id]
+    
+    user_data = user_snap.to_dict() if user_snap.exists else None
+    if user_data is None:
+        # Accounts created by password/OAuth signup use random document IDs
+        legacy_docs = await users.where("email", "==", email).limit(1).get(transaction=transaction)
+        if legacy_docs:
+            user_ref = legacy_docs[0].reference
+            user_data = legacy_docs[0].to_dict()
+            membership_ref = memberships.document(f"{user_ref.id}_{org_id}")
+            membership_snap = await membership_ref.get(transaction=transaction)
+    
+    if not auto_provision:
+        if user_data is None:
+            raise HTTPException(403, "User not found. Contact your administrator.")
+        return user_ref.id
+    
+    has_membership = membership_snap.exists
+    if not has_membership and user_data is not None:
+        # Memberships created from invites use auto-generated IDs
+        existing = memberships.where("org_id", "==", org_id).where("user_id", "==", user_ref.id).limit(1)
+        has_membership = bool(await existing.get(transaction=transaction))
+    
+    if user_data is None:
+        transaction.set(user_ref, {
+            "email": email,
             "name": name,
             "org_id": org_id,
             "created_at": now,
             "created_via": "sso",
-        }
-        user_ref = db.collection("users").document()
-        user_ref.set(user_data)
-        user_id = user_ref.id
-    
-    # Create/update membership
-    membership_query = db.collection("memberships").where("org_id", "==", org_id).where("user_id", "==", user_id).limit(1)
-    membership_docs = list(membership_query.stream())
+        })
+    elif not user_data.get("org_id"):
+        transaction.update(user_ref, {"org_id": org_id})
     
-    if not membership_docs:
-        membership_data = {
+    if not has_membership:
+        transaction.set(membership_ref, {
             "org_id": org_id,
-            "user_id": user_id,
-            "email": email.lower(),
+            "user_id": user_ref.id,
+            "email": email,
+            "name": name,
             "role": role,
             "status": "active",
             "joined_at": now,
             "joined_via": "sso",
+        })
+    
+    return user_ref.id
+
+
+async def _consume_sso_state_txn(transaction, state_ref, org_id: str) -> Dict[str, Any]:
+    """Read and delete a login state in one transaction."""
+    state_doc = await state_ref.get(transaction=transaction)
+    if not state_doc.exists:
+        raise HTTPException(400, "Invalid state parameter")
+    
+    state_data = state_doc.to_dict()
+    if state_data.get("org_id") != org_id:
+        raise HTTPException(400, "Invalid state parameter")
+    
+    transaction.delete(state_ref)
+    return state_data
+
+
+async def consume_sso_state(db, state: str, org_id: str) -> Dict[str, Any]:
+    """
+    Atomically verify and consume a login state.
+    
+    Two concurrent callbacks with the same state cannot both succeed.
+    """
+    from google.cloud import firestore
+    
+    consume = firestore.async_transactional(_consume_sso_state_txn)
+    return await consume(db.transaction(), db.collection("sso_states").document(state), org_id)
+
+
+async def provision_user(email: str, name: str, org_id: str, role: str, auto_provision: bool = True) -> str:
+    """
+    Resolve the user for an SSO login, provisioning them if allowed.
+    
+    With auto_provision disabled, unknown users are rejected with 403.
+    """
+    db = get_db()
+    if not db:
+        raise HTTPException(503, "Database not available")
+    
+    from google.cloud import firestore
+    
+    provision = firestore.async_transactional(_provision_user_txn)
+    return await provision(db.transaction(), db, email.lower(), name, org_id, role, auto_provision)
+
+
+async def _fetch_safe_sso_configs(db, org_id: str) -> List[Dict[str, Any]]:
+    """Read the org's SSO configs and strip secrets."""
+    configs_ref = db.collection("sso_configs").where("org_id", "==", org_id).select(SAFE_CONFIG_FIELDS)
+    result = []
+    async for config in configs_ref.stream():
+        data = config.to_dict()
+        
+        # Build safe config (no secrets)
+        safe_config = {
+            "id": config.id,
+            "provider": data.get("provider"),
+            "name": data.get("name"),
+            "enabled": data.get("enabled", False),
+            "enforce": data.get("enforce", False),
+            "allowed_domains": data.get("allowed_domains", []),
+            "auto_provision": data.get("auto_provision", True),
+            "default_role": data.get("default_role", "member"),
+            "created_at": data.get("created_at").isoformat() if data.get("created_at") else None,
         }
-        db.collection("memberships").add(membership_data)
+        
+        # Add provider-specific info
+        if data.get("provider") == "saml":
+            saml = data.get("saml_config", {})
+            safe_config["saml"] = {
+                "idp_entity_id": saml.get("idp_entity_id"),
+                "idp_sso_url": saml.get("idp_sso_url"),
+                "sp_entity_id": generate_sp_entity_id(org_id),
+                "acs_url": generate_acs_url(org_id),
+                "slo_url": generate_slo_url(org_id),
+            }
+        elif data.get("provider") in ("oidc", "okta", "azure_ad", "google_workspace", "onelogin"):
+            oidc = data.get("oidc_config", {})
+            safe_config["oidc"] = {
+                "issuer": oidc.get("issuer"),
+                "client_id": oidc.get("client_id"),
+                "has_client_secret": bool(oidc.get("client_secret")),
+                "callback_url": generate_oidc_callback_url(org_id),
+            }
+        
+        result.append(safe_config)
+    
+    return result
+
+
+async def _load_safe_sso_configs(db, org_id: str) -> List[Dict[str, Any]]:
+    result = await _fetch_safe_sso_configs(db, org_id)
+    _safe_config_cache[org_id] = (time.monotonic() + SAFE_CONFIG_TTL_SECONDS, result)
+    return result
+
+
+def _release_safe_config_inflight(org_id: str, task: asyncio.Task) -> None:
+    """Remove a finished read from the in-flight map."""
+    if _safe_config_inflight.get(org_id) is task:
+        del _safe_config_inflight[org_id]
+    if not task.cancelled():
+        task.exception()  # Mark retrieved even if every waiter went away
+
+
+async def get_safe_sso_configs(db, org_id: str) -> List[Dict[str, Any]]:
+    """
+    Get the safe SSO config view for an org.
+    
+    Results are cached briefly and concurrent callers for the same org
+    share a single in-flight Firestore read.
+    """
+    cached = _safe_config_cache.get(org_id)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    
+    task = _safe_config_inflight.get(org_id)
+    if task is None:
+        task = asyncio.create_task(_load_safe_sso_configs(db, org_id))
+        _safe_config_inflight[org_id] = task
+        task.add_done_callback(lambda t: _release_safe_config_inflight(org_id, t))
+    # Shield so one caller disconnecting doesn't cancel the shared read
+    return await asyncio.shield(task)
+
+
+async def resolve_org_id_by_slug(db, org_slug: str) -> Optional[str]:
+    """Resolve an org slug to its ID, cached for the login path."""
+    slug = org_slug.lower()
+    cached = _org_id_by_slug.get(slug)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    
+    index_doc = await db.collection("slug_index").document(slug).get()
+    if index_doc.exists:
+        org_id = index_doc.get("org_id")
+    else:
+        # Orgs created before the slug index existed; backfill on first lookup
+        orgs = db.collection("organizations").where("slug", "==", slug).select([]).limit(1)
+        org_docs = await orgs.get()
+        if not org_docs:
+            return None
+        org_id = org_docs[0].id
+        try:
+            await db.collection("slug_index").document(slug).create({"org_id": org_id})
+        except Exception as e:
+            logger.debug(f"Slug {slug} already indexed: {e}")
+    
+    _org_id_by_slug[slug] = (time.monotonic() + LOGIN_CACHE_TTL_SECONDS, org_id)
+    return org_id
+
+
+async def get_enabled_sso_config(db, org_id: str) -> Optional[Dict[str, Any]]:
+    """Get the org's enabled SSO config, cached for the login path."""
+    cached = _login_config_cache.get(org_id)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    
+    config_doc = await db.collection("sso_configs").document(org_id).get()
+    if config_doc.exists:
+        config_data = config_doc.to_dict()
+        if not config_data.get("enabled"):
+            return None
+    else:
+        # Configs created before sso_configs was keyed by org_id
+        configs = db.collection("sso_configs").where("org_id", "==", org_id).where("enabled", "==", True).limit(1)
+        config_docs = await configs.get()
+        if not config_docs:
+            return None
+        config_data = config_docs[0].to_dict()
+    
+    # Set form for O(1) domain checks; also normalizes configs written before lower-casing
+    config_data["allowed_domains"] = frozenset(d.lower() for d in config_data.get("allowed_domains", []))
+    _login_config_cache[org_id] = (time.monotonic() + LOGIN_CACHE_TTL_SECONDS, config_data)
+    return config_data
+
+
+async def get_oidc_discovery(issuer: str) -> Dict[str, Any]:
+    """Fetch and cache an issuer's /.well-known/openid-configuration."""
+    cached = _oidc_discovery_cache.get(issuer)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    
+    discovery: Dict[str, Any] = {}
+    ttl = OIDC_DISCOVERY_RETRY_SECONDS
+    try:
+        response = await get_http_client().get(f"{issuer}/.well-known/openid-configuration")
+        if response.status_code == 200:
+            discovery = response.json()
+            ttl = OIDC_DISCOVERY_TTL_SECONDS
+        else:
+            logger.warning(f"OIDC discovery for {issuer} returned {response.status_code}")
+    except (httpx.RequestError, ValueError) as e:
+        logger.warning(f"OIDC discovery for {issuer} failed: {e}")
+    
+    _oidc_discovery_cache[issuer] = (time.monotonic() + ttl, discovery)
+    return discovery
+
+
+async def get_oidc_endpoint(oidc_config: Dict[str, Any], name: str, default_path: str) -> str:
+    """
+    Resolve an OIDC endpoint.
     
-    return user_id
+    Explicit config overrides win, then the issuer's discovery document,
+    then the issuer-relative default path.
+    """
+    if oidc_config.get(name):
+        return oidc_config[name]
+    
+    issuer = oidc_config.get("issuer", "").rstrip("/")
+    discovery = await get_oidc_discovery(issuer) if issuer else {}
+    return discovery.get(name) or f"{issuer}/{default_path}"
+
+
+def invalidate_sso_config_cache(org_id: str) -> None:
+    """Drop cached SSO configs after an admin change."""
+    _safe_config_cache.pop(org_id, None)
+    _login_config_cache.pop(org_id, None)
 
 
 # =============================================================================
@@ -233,48 +574,7 @@ async def get_sso_config(
         return {"sso_configs": []}
     
     try:
-        configs_ref = db.collection("sso_configs").where("org_id", "==", org_id)
-        configs = list(configs_ref.stream())
-        
-        result = []
-        for config in configs:
-            data = config.to_dict()
-            
-            # Build safe config (no secrets)
-            safe_config = {
-                "id": config.id,
-                "provider": data.get("provider"),
-                "name": data.get("name"),
-                "enabled": data.get("enabled", False),
-                "enforce": data.get("enforce", False),
-                "allowed_domains": data.get("allowed_domains", []),
-                "auto_provision": data.get("auto_provision", True),
-                "default_role": data.get("default_role", "member"),
-                "created_at": data.get("created_at").isoformat() if data.get("created_at") else None,
-            }
-            
-            # Add provider-specific info
-            if data.get("provider") == "saml":
-                saml = data.get("saml_config", {})
-                safe_config["saml"] = {
-                    "idp_entity_id": saml.get("idp_entity_id"),
-                    "idp_sso_url": saml.get("idp_sso_url"),
-                    "sp_entity_id": generate_sp_entity_id(org_id),
-                    "acs_url": generate_acs_url(org_id),
-                    "slo_url": generate_slo_url(org_id),
-                }
-            elif data.get("provider") in ("oidc", "okta", "azure_ad", "google_workspace", "onelogin"):
-                oidc = data.get("oidc_config", {})
-                safe_config["oidc"] = {
-                    "issuer": oidc.get("issuer"),
-                    "client_id": oidc.get("client_id"),
-                    "has_client_secret": bool(oidc.get("client_secret")),
-                    "callback_url": generate_oidc_callback_url(org_id),
-                }
-            
-            result.append(safe_config)
-        
-        return {"sso_configs": result}
+        return {"sso_configs": await get_safe_sso_configs(db, org_id)}
     
     except Exception as e:
         logger.error(f"Failed to get SSO config: {e}")
@@ -314,7 +614,7 @@ async def create_sso_config(
         "name": request.name,
         "enabled": request.enabled,
         "enforce": request.enforce,
-        "allowed_domains": request.allowed_domains,
+        "allowed_domains": normalize_domains(request.allowed_domains),
         "auto_provision": request.auto_provision,
         "default_role": request.default_role,
         "created_at": now,
@@ -327,11 +627,13 @@ async def create_sso_config(
     if request.oidc_config:
         config_data["oidc_config"] = request.oidc_config.dict()
     
-    config_ref = db.collection("sso_configs").document()
-    config_ref.set(config_data)
+    # One SSO config per org, keyed by org_id so logins can do a direct get
+    config_ref = db.collection("sso_configs").document(org_id)
+    await config_ref.set(config_data)
     
     # Update org to indicate SSO is configured
     update_org(org_id, {"sso_enabled": True})
+    invalidate_sso_config_cache(org_id)
     
     logger.info(f"Created SSO config for org {org_id}: {request.provider}")
     
@@ -374,7 +676,7 @@ async def update_sso_config(
     if not db:
         raise HTTPException(503, "Database not available")
     
-    config_doc = db.collection("sso_configs").document(config_id).get()
+    config_doc = await db.collection("sso_configs").document(config_id).get()
     if not config_doc.exists:
         raise HTTPException(404, "SSO configuration not found")
     
@@ -389,12 +691,16 @@ async def update_sso_config(
         if value is not None:
             updates[field] = value
     
+    if request.allowed_domains is not None:
+        updates["allowed_domains"] = normalize_domains(request.allowed_domains)
+    
     if request.saml_config:
         updates["saml_config"] = request.saml_config.dict()
     if request.oidc_config:
         updates["oidc_config"] = request.oidc_config.dict()
     
-    db.collection("sso_configs").document(config_id).update(updates)
+    await db.collection("sso_configs").document(config_id).update(updates)
+    invalidate_sso_config_cache(org_id)
     
     return {"success": True, "config_id": config_id}
 
@@ -413,7 +719,7 @@ async def delete_sso_config(
     if not db:
         raise HTTPException(503, "Database not available")
     
-    config_doc = db.collection("sso_configs").document(config_id).get()
+    config_doc = await db.collection("sso_configs").document(config_id).get()
     if not config_doc.exists:
         raise HTTPException(404, "SSO configuration not found")
     
@@ -421,11 +727,13 @@ async def delete_sso_config(
     if config_data.get("org_id") != org_id:
         raise HTTPException(404, "SSO configuration not found")
     
-    db.collection("sso_configs").document(config_id).delete()
+    await db.collection("sso_configs").document(config_id).delete()
+    invalidate_sso_config_cache(org_id)
     
     # Check if any SSO configs remain
-    remaining = db.collection("sso_configs").where("org_id", "==", org_id).limit(1)
-    if not list(remaining.stream()):
+    # Key-only projection: we only need to know whether a document exists
+    remaining = db.collection("sso_configs").where("org_id", "==", org_id).select([]).limit(1)
+    if not await remaining.get():
         update_org(org_id, {"sso_enabled": False})
     
     return {"success": True, "message": "SSO configuration deleted"}
@@ -449,24 +757,18 @@ async def initiate_sso_login(
     if not db:
         raise HTTPException(503, "Database not available")
     
-    # Find org by slug
-    orgs = db.collection("organizations").where("slug", "==", org_slug.lower()).limit(1)
-    org_docs = list(orgs.stream())
+    now = datetime.now(timezone.utc)
     
-    if not org_docs:
+    # Find org by slug
+    org_id = await resolve_org_id_by_slug(db, org_slug)
+    if not org_id:
         raise HTTPException(404, "Organization not found")
     
-    org_id = org_docs[0].id
-    org_data = org_docs[0].to_dict()
-    
     # Get SSO config
-    configs = db.collection("sso_configs").where("org_id", "==", org_id).where("enabled", "==", True).limit(1)
-    config_docs = list(configs.stream())
-    
-    if not config_docs:
+    config_data = await get_enabled_sso_config(db, org_id)
+    if not config_data:
         raise HTTPException(400, "SSO is not configured for this organization")
     
-    config_data = config_docs[0].to_dict()
     provider = config_data.get("provider")
     
     if provider == "saml":
@@ -478,12 +780,11 @@ async def initiate_sso_login(
         # For now, we'll just redirect with a RelayState
         relay_state = secrets.token_urlsafe(16)
         
-        # Store relay state for verification
-        db.collection("sso_states").add({
-            "state": relay_state,
+        # Store relay state for verification, keyed by the token itself
+        await db.collection("sso_states").document(relay_state).set({
             "org_id": org_id,
-            "created_at": datetime.now(timezone.utc),
-            "expires_at": datetime.now(timezone.utc) + timedelta(minutes=10),
+            "created_at": now,
+            "expires_at": now + timedelta(minutes=10),
         })
         
         redirect_url = f"{idp_sso_url}?RelayState={relay_state}"
@@ -496,26 +797,22 @@ async def initiate_sso_login(
         # Generate state for CSRF protection
         state = secrets.token_urlsafe(32)
         
-        # Store state
-        db.collection("sso_states").add({
-            "state": state,
+        # Store state, keyed by the token itself
+        await db.collection("sso_states").document(state).set({
             "org_id": org_id,
-            "created_at": datetime.now(timezone.utc),
-            "expires_at": datetime.now(timezone.utc) + timedelta(minutes=10),
+            "created_at": now,
+            "expires_at": now + timedelta(minutes=10),
         })
         
         # Build authorization URL
-        auth_endpoint = oidc_config.get("authorization_endpoint")
-        if not auth_endpoint:
-            # Discover from issuer
-            issuer = oidc_config.get("issuer", "").rstrip("/")
-            auth_endpoint = f"{issuer}/authorize"
+        auth_endpoint = await get_oidc_endpoint(oidc_config, "authorization_endpoint", "authorize")
         
+        scopes = oidc_config.get("scopes")
         params = {
             "response_type": "code",
             "client_id": oidc_config.get("client_id"),
             "redirect_uri": generate_oidc_callback_url(org_id),
-            "scope": " ".join(oidc_config.get("scopes", ["openid", "email", "profile"])),
+            "scope": " ".join(scopes) if scopes else DEFAULT_OIDC_SCOPE_STR,
             "state": state,
         }
         
@@ -546,13 +843,10 @@ async def saml_acs(
         raise HTTPException(400, "Missing SAML Response")
     
     # Get SSO config
-    configs = db.collection("sso_configs").where("org_id", "==", org_id).where("provider", "==", "saml").where("enabled", "==", True).limit(1)
-    config_docs = list(configs.stream())
-    
-    if not config_docs:
+    config_data = await get_enabled_sso_config(db, org_id)
+    if not config_data or config_data.get("provider") != "saml":
         raise HTTPException(400, "SAML is not configured for this organization")
     
-    config_data = config_docs[0].to_dict()
     saml_config = config_data.get("saml_config", {})
     
     # In production, you'd validate the SAML Response here:
@@ -570,28 +864,20 @@ async def saml_acs(
     user_email = "sso_user@example.com"
     user_name = "SSO User"
     
-    # Provision user if needed
-    if config_data.get("auto_provision", True):
-        user_id = await provision_user(
-            email=user_email,
-            name=user_name,
-            org_id=org_id,
-            role=config_data.get("default_role", "member"),
-        )
-    else:
-        # Check if user exists
-        existing = db.collection("users").where("email", "==", user_email.lower()).limit(1)
-        existing_docs = list(existing.stream())
-        if not existing_docs:
-            raise HTTPException(403, "User not found. Contact your administrator.")
-        user_id = existing_docs[0].id
+    # Resolve the user, provisioning them if the config allows it
+    user_id = await provision_user(
+        email=user_email,
+        name=user_name,
+        org_id=org_id,
+        role=config_data.get("default_role", "member"),
+        auto_provision=config_data.get("auto_provision", True),
+    )
     
     # Create session
     token = await create_sso_session(user_id, org_id, "saml")
     
     # Redirect to frontend with token
-    frontend_url = os.getenv("APP_URL", "https://tracevox.ai")
-    return RedirectResponse(url=f"{frontend_url}/dashboard?token={token}")
+    return RedirectResponse(url=f"{_APP_URL}/dashboard?token={token}")
 
 
 @router.get("/oidc/{org_id}/callback")
@@ -606,22 +892,18 @@ async def oidc_callback(
     
     Handles the authorization code flow callback.
     """
-    import httpx
-    
     db = get_db()
     if not db:
         raise HTTPException(503, "Database not available")
     
-    # Verify state
-    states = db.collection("sso_states").where("state", "==", state).where("org_id", "==", org_id).limit(1)
-    state_docs = list(states.stream())
-    
-    if not state_docs:
-        raise HTTPException(400, "Invalid state parameter")
-    
-    state_data = state_docs[0].to_dict()
+    # State verification and config lookup are independent round-trips
+    state_data, config_data = await asyncio.gather(
+        consume_sso_state(db, state, org_id),
+        get_enabled_sso_config(db, org_id),
+    )
     
-    # Check expiry
+    # Check expiry. The sso_states TTL policy on expires_at (see deploy.sh setup)
+    # garbage-collects abandoned states, but deletion can lag, so keep the guard.
     expires_at = state_data.get("expires_at")
     if expires_at:
         if hasattr(expires_at, 'replace'):
@@ -629,50 +911,42 @@ async def oidc_callback(
         if datetime.now(timezone.utc) > expires_at:
             raise HTTPException(400, "State expired")
     
-    # Delete used state
-    db.collection("sso_states").document(state_docs[0].id).delete()
-    
-    # Get SSO config
-    configs = db.collection("sso_configs").where("org_id", "==", org_id).where("enabled", "==", True).limit(1)
-    config_docs = list(configs.stream())
-    
-    if not config_docs:
+    if not config_data:
         raise HTTPException(400, "SSO is not configured for this organization")
     
-    config_data = config_docs[0].to_dict()
     oidc_config = config_data.get("oidc_config", {})
     
     # Exchange code for tokens
-    token_endpoint = oidc_config.get("token_endpoint")
-    if not token_endpoint:
-        issuer = oidc_config.get("issuer", "").rstrip("/")
-        token_endpoint = f"{issuer}/token"
+    token_endpoint = await get_oidc_endpoint(oidc_config, "token_endpoint", "token")
     
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            token_response = await client.post(
-                token_endpoint,
-                data={
-                    "grant_type": "authorization_code",
-                    "code": code,
-                    "redirect_uri": generate_oidc_callback_url(org_id),
-                    "client_id": oidc_config.get("client_id"),
-                    "client_secret": oidc_config.get("client_secret"),
-                },
-            )
-            
-            if token_response.status_code != 200:
-                logger.error(f"Token exchange failed: {token_response.text}")
-                raise HTTPException(400, "Failed to exchange authorization code")
-            
-            tokens = token_response.json()
-            access_token = tokens.get("access_token")
-            
-            # Get user info
-            userinfo_endpoint = oidc_config.get("userinfo_endpoint")
-            if not userinfo_endpoint:
-                issuer = oidc_config.get("issuer", "").rstrip("/")
-                userinfo_endpoint = f"{issuer}/userinfo"
+        client = get_http_client()
+        token_response = await client.post(
+            token_endpoint,
+            data={
+                "grant_type": "authorization_code",
+                "code": code,
+                "redirect_uri": generate_oidc_callback_url(org_id),
+                "client_id": oidc_config.get("client_id"),
+                "client_secret": oidc_config.get("client_secret"),
+            },
+        )
+        
+        if token_response.status_code != 200:
+            logger.error(f"Token exchange failed: {token_response.text}")
+            raise HTTPException(400, "Failed to exchange authorization code")
+        
+        tokens = token_response.json()
+        access_token = tokens.get("access_token")
+        
+        # The id_token usually carries the profile claims already
+        userinfo = {}
+        if tokens.get("id_token"):
+            userinfo = decode_id_token_claims(tokens["id_token"], oidc_config.get("client_id"))
+        
+        # Fall back to the userinfo endpoint only when the email claim is missing
+        if not userinfo.get("email"):
+            userinfo_endpoint = await get_oidc_endpoint(oidc_config, "userinfo_endpoint", "userinfo")
             
             userinfo_response = await client.get(
                 userinfo_endpoint,
@@ -696,67 +970,132 @@ async def oidc_callback(
         raise HTTPException(400, "Email not provided by identity provider")
     
     # Check domain restriction
-    allowed_domains = config_data.get("allowed_domains", [])
+    allowed_domains = config_data["allowed_domains"]
     if allowed_domains:
         email_domain = user_email.split("@")[-1].lower()
-        if email_domain not in [d.lower() for d in allowed_domains]:
+        if email_domain not in allowed_domains:
             raise HTTPException(403, f"Email domain {email_domain} is not allowed for this organization")
     
-    # Provision user if needed
-    if config_data.get("auto_provision", True):
-        user_id = await provision_user(
-            email=user_email,
-            name=user_name,
-            org_id=org_id,
-            role=config_data.get("default_role", "member"),
-        )
-    else:
-        # Check if user exists
-        existing = db.collection("users").where("email", "==", user_email.lower()).limit(1)
-        existing_docs = list(existing.stream())
-        if not existing_docs:
-            raise HTTPException(403, "User not found. Contact your administrator.")
-        user_id = existing_docs[0].id
+    # Resolve the user, provisioning them if the config allows it
+    user_id = await provision_user(
+        email=user_email,
+        name=user_name,
+        org_id=org_id,
+        role=config_data.get("default_role", "member"),
+        auto_provision=config_data.get("auto_provision", True),
+    )
     
     # Create session
     token = await create_sso_session(user_id, org_id, config_data.get("provider", "oidc"))
     
     # Redirect to frontend with token
-    frontend_url = os.getenv("APP_URL", "https://tracevox.ai")
-    return RedirectResponse(url=f"{frontend_url}/dashboard?token={token}")
+    return RedirectResponse(url=f"{_APP_URL}/dashboard?token={token}")
 
 
 @router.get("/metadata/{org_id}")
-async def get_saml_metadata(org_id: str):
+async def get_saml_metadata(org_id: str, request: Request):
     """
     Get SAML Service Provider metadata XML.
     
     This can be imported into your Identity Provider.
     """
-    db = get_db()
-    if not db:
-        raise HTTPException(503, "Database not available")
-    
-    # Verify org exists
-    org_doc = db.collection("organizations").document(org_id).get()
-    if not org_doc.exists:
-        raise HTTPException(404, "Organization not found")
-    
-    sp_entity_id = generate_sp_entity_id(org_id)
-    acs_url = generate_acs_url(org_id)
-    slo_url = generate_slo_url(org_id)
-    
-    # Generate basic SAML SP metadata
-    metadata = f"""<?xml version="1.0" encoding="UTF-8"?>
-<EntityDescriptor xmlns="urn:oasis:names:tc:SAML:2.0:metadata" entityID="{sp_entity_id}">
+    # Metadata is deterministic per org, so serve rendered bytes once the org is known
+    cached = _metadata_cache.get(org_id)
+    if cached is None:
+        db = get_db()
+        if not db:
+            raise HTTPException(503, "Database not available")
+        
+        # Verify org exists
+        org_doc = await db.collection("organizations").document(org_id).get()
+        if not org_doc.exists:
+            raise HTTPException(404, "Organization not found")
+        
+        cached = _render_saml_metadata(org_id)
+        _metadata_cache[org_id] = cached
+    
+    content, etag = cached
+    headers = {"Cache-Control": "public, max-age=3600", "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=content, media_type="application/xml", headers=headers)
+
+
+# Basic SAML SP metadata; only the per-org URLs vary
+_SAML_METADATA_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<EntityDescriptor xmlns="urn:oasis:names:tc:SAML:2.0:metadata" entityID="{entity_id}">
   <SPSSODescriptor AuthnRequestsSigned="false" WantAssertionsSigned="true" protocolSupportEnumeration="urn:oasis:names:tc:SAML:2.0:protocol">
     <NameIDFormat>urn:oasis:names:tc:SAML:1.1:nameid-format:emailAddress</NameIDFormat>
     <AssertionConsumerService Binding="urn:oasis:names:tc:SAML:2.0:bindings:HTTP-POST" Location="{acs_url}" index="0" isDefault="true"/>
     <SingleLogoutService Binding="urn:oasis:names:tc:SAML:2.0:bindings:HTTP-POST" Location="{slo_url}"/>
   </SPSSODescriptor>
 </EntityDescriptor>"""
-    
-    return Response(content=metadata, media_type="application/xml")
+
+
+def _render_saml_metadata(org_id: str) -> Tuple[bytes, str]:
+    """Render SP metadata XML for an org, returning (bytes, etag)."""
+    metadata = _SAML_METADATA_TEMPLATE.format_map({
+        "entity_id": generate_sp_entity_id(org_id),
+        "acs_url": generate_acs_url(org_id),
+        "slo_url": generate_slo_url(org_id),
+    })
+    
+    content = metadata.encode("utf-8")
+    return content, f'"{hashlib.sha256(content).hexdigest()[:32]}"'
+
+
+# Static payload for GET /providers, built once at import
+_SUPPORTED_PROVIDERS = {
+    "providers": [
+        {
+            "id": "saml",
+            "name": "SAML 2.0",
+            "description": "Generic SAML 2.0 Identity Provider",
+            "type": "saml",
+            "docs_url": "https://docs.tracevox.ai/sso/saml",
+        },
+        {
+            "id": "okta",
+            "name": "Okta",
+            "description": "Okta Identity Cloud",
+            "type": "oidc",
+            "docs_url": "https://docs.tracevox.ai/sso/okta",
+        },
+        {
+            "id": "azure_ad",
+            "name": "Azure Active Directory",
+            "description": "Microsoft Azure AD / Entra ID",
+            "type": "oidc",
+            "docs_url": "https://docs.tracevox.ai/sso/azure-ad",
+        },
+        {
+            "id": "google_workspace",
+            "name": "Google Workspace",
+            "description": "Google Workspace SSO",
+            "type": "oidc",
+            "docs_url": "https://docs.tracevox.ai/sso/google-workspace",
+        },
+        {
+            "id": "onelogin",
+            "name": "OneLogin",
+            "description": "OneLogin Identity Management",
+            "type": "oidc",
+            "docs_url": "https://docs.tracevox.ai/sso/onelogin",
+        },
+        {
+            "id": "oidc",
+            "name": "Custom OIDC",
+            "description": "Any OpenID Connect compatible provider",
+            "type": "oidc",
+            "docs_url": "https://docs.tracevox.ai/sso/oidc",
+        },
+    ]
+}
+
+_SUPPORTED_PROVIDERS_JSON = orjson.dumps(_SUPPORTED_PROVIDERS)
+
+# Rendered SP metadata per org: (xml bytes, etag)
+_metadata_cache: Dict[str, Tuple[bytes, str]] = {}
 
 
 @router.get("/providers")
@@ -764,50 +1103,8 @@ async def get_supported_providers():
     """
     Get list of supported SSO providers.
     """
-    return {
-        "providers": [
-            {
-                "id": "saml",
-                "name": "SAML 2.0",
-                "description": "Generic SAML 2.0 Identity Provider",
-                "type": "saml",
-                "docs_url": "https://docs.tracevox.ai/sso/saml",
-            },
-            {
-                "id": "okta",
-                "name": "Okta",
-                "description": "Okta Identity Cloud",
-                "type": "oidc",
-                "docs_url": "https://docs.tracevox.ai/sso/okta",
-            },
-            {
-                "id": "azure_ad",
-                "name": "Azure Active Directory",
-                "description": "Microsoft Azure AD / Entra ID",
-                "type": "oidc",
-                "docs_url": "https://docs.tracevox.ai/sso/azure-ad",
-            },
-            {
-                "id": "google_workspace",
-                "name": "Google Workspace",
-                "description": "Google Workspace SSO",
-                "type": "oidc",
-                "docs_url": "https://docs.tracevox.ai/sso/google-workspace",
-            },
-            {
-                "id": "onelogin",
-                "name": "OneLogin",
-                "description": "OneLogin Identity Management",
-                "type": "oidc",
-                "docs_url": "https://docs.tracevox.ai/sso/onelogin",
-            },
-            {
-                "id": "oidc",
-                "name": "Custom OIDC",
-                "description": "Any OpenID Connect compatible provider",
-                "type": "oidc",
-                "docs_url": "https://docs.tracevox.ai/sso/oidc",
-            },
-        ]
-    }
-
+    return Response(
+        content=_SUPPORTED_PROVIDERS_JSON,
+        media_type="application/json",
+        headers={"Cache-Control": "public, max-age=300"},
+    )
@@ -10,30 +10,47 @@ Enterprise-grade team management with:
 
 from __future__ import annotations
 import os
+import base64
+import asyncio
 import logging
 import secrets
 from datetime import datetime, timezone, timedelta
+from functools import lru_cache
 from typing import Optional, List
 from enum import Enum
 
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, EmailStr, Field
 
-from app.api.auth import require_auth, get_org_by_id, update_org
+from app.api.auth import require_auth, get_org_by_id, update_org, org_request_cache
+from app.core import email_queue, member_count_cache, response_cache
+from app.core.config import TierLimits, PricingTier
+from app.core.permissions import PERM_BY_NAME, to_mask
+
+try:
+    from google.cloud.firestore import SERVER_TIMESTAMP
+except ImportError:
+    SERVER_TIMESTAMP = None
 
 logger = logging.getLogger("llmobs.team")
-router = APIRouter(prefix="/team", tags=["Team"])
+router = APIRouter(
+    prefix="/team",
+    tags=["Team"],
+    default_response_class=ORJSONResponse,
+    dependencies=[Depends(org_request_cache)],
+)
 
 # Firestore client
 _db = None
 
 def get_db():
-    """Get Firestore client."""
+    """Get async Firestore client."""
     global _db
     if _db is None:
         try:
             from google.cloud import firestore
-            _db = firestore.Client()
+            _db = firestore.AsyncClient()
         except Exception as e:
             logger.error(f"Failed to init Firestore: {e}")
     return _db
@@ -52,22 +69,27 @@ class TeamRole(str, Enum):
 
 
 ROLE_PERMISSIONS = {
-    TeamRole.OWNER: [
+    TeamRole.OWNER: frozenset({
         "org.delete", "org.manage", "billing.manage", "team.manage", 
         "api_keys.manage", "dashboard.view", "settings.manage", "alerts.manage"
-    ],
-    TeamRole.ADMIN: [
+    }),
+    TeamRole.ADMIN: frozenset({
         "org.manage", "billing.manage", "team.manage", 
         "api_keys.manage", "dashboard.view", "settings.manage", "alerts.manage"
-    ],
-    TeamRole.MEMBER: [
+    }),
+    TeamRole.MEMBER: frozenset({
         "api_keys.manage", "dashboard.view", "alerts.view"
-    ],
-    TeamRole.VIEWER: [
+    }),
+    TeamRole.VIEWER: frozenset({
         "dashboard.view"
-    ],
+    }),
 }
 
+_NO_PERMISSIONS: frozenset = frozenset()
+
+# Bitmask form of ROLE_PERMISSIONS used by check_permission
+ROLE_BITS = {role: to_mask(perms) for role, perms in ROLE_PERMISSIONS.items()}
+
 
 class InviteRequest(BaseModel):
     """Request to invite a team member."""
@@ -88,9 +110,9 @@ class TeamMember(BaseModel):
     name: Optional[str]
     role: TeamRole
     status: str  # active, pending, suspended
-    joined_at: Optional[str]
+    joined_at: Optional[int]  # epoch ms
     invited_by: Optional[str]
-    last_active: Optional[str]
+    last_active: Optional[int]  # epoch ms
 
 
 class TeamInvite(BaseModel):
@@ -99,8 +121,8 @@ class TeamInvite(BaseModel):
     email: str
     role: TeamRole
     invited_by: str
-    invited_at: str
-    expires_at: str
+    invited_at: Optional[int]  # epoch ms
+    expires_at: Optional[int]  # epoch ms
     status: str  # pending, accepted, expired, revoked
 
 
@@ -108,20 +130,81 @@ class TeamInvite(BaseModel):
 # HELPER FUNCTIONS
 # =============================================================================
 
+def _to_ms(dt: datetime) -> int:
+    """Unix epoch milliseconds for a datetime."""
+    return int(dt.timestamp() * 1000)
+
+
+def _epoch_ms(data: dict, field: str) -> Optional[int]:
+    """
+    Read a timestamp as epoch milliseconds for JSON output.
+    
+    Writes store an integer `<field>_ms` next to the native timestamp (which
+    queries and TTL policies still use); older rows fall back to converting
+    the native value.
+    """
+    ms = data.get(f"{field}_ms")
+    if ms is not None:
+        return ms
+    value = data.get(field)
+    if not value:
+        return None
+    try:
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        return _to_ms(value)
+    except (TypeError, ValueError):
+        return None
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def _encode_cursor(doc_id: str) -> str:
+    """Opaque page cursor for the last document on a page."""
+    return base64.urlsafe_b64encode(doc_id.encode()).decode()
+
+
+def _paginate(query, limit: int, cursor: Optional[str]):
+    """Order a query by document ID and resume after the cursor, if any."""
+    query = query.order_by("__name__").limit(limit)
+    if cursor:
+        try:
+            doc_id = base64.urlsafe_b64decode(cursor.encode()).decode()
+        except Exception:
+            raise HTTPException(400, "Invalid cursor")
+        query = query.start_after({"__name__": doc_id})
+    return query
+
+
+LIST_CACHE_TTL_SECONDS = 60
+
+
+@lru_cache(maxsize=8)
+def _limits_for(tier_str: str) -> TierLimits:
+    """Resolve tier limits from an org's stored tier string."""
+    return TierLimits.for_tier(PricingTier(tier_str))
+
+
+async def invalidate_team_lists(org_id: str) -> None:
+    """Drop cached member/invite list pages after a team change."""
+    await asyncio.gather(
+        response_cache.invalidate_prefix(f"members:{org_id}:"),
+        response_cache.invalidate_prefix(f"invites:{org_id}:"),
+    )
+
+
 def check_permission(user_role: TeamRole, permission: str) -> bool:
     """Check if a role has a specific permission."""
-    role_perms = ROLE_PERMISSIONS.get(user_role, [])
-    return permission in role_perms
+    return (ROLE_BITS.get(user_role, 0) & PERM_BY_NAME.get(permission, 0)) != 0
 
 
 def require_permission(permission: str):
     """Decorator to require a specific permission."""
     async def check(current_user: dict = Depends(require_auth)):
         user_role_str = current_user.get("role", "viewer")
-        try:
-            user_role = TeamRole(user_role_str)
-        except ValueError:
-            user_role = TeamRole.VIEWER
+        user_role = TeamRole._value2member_map_.get(user_role_str, TeamRole.VIEWER)
         
         if not check_permission(user_role, permission):
             raise HTTPException(
@@ -132,18 +215,55 @@ def require_permission(permission: str):
     return check
 
 
+GET_ALL_CHUNK_SIZE = 100
+
+
+async def _get_all_dicts(db, refs) -> dict:
+    """Read a batch of document refs in one get_all call, keyed by doc id."""
+    return {doc.id: doc.to_dict() async for doc in db.get_all(refs) if doc.exists}
+
+
+async def get_users_by_id(db, user_ids: List[str]) -> dict:
+    """
+    Batch-fetch user documents.
+    
+    Refs are split into chunks of GET_ALL_CHUNK_SIZE and read concurrently,
+    so a team of N costs ceil(N / 100) round-trips rather than N.
+    """
+    users = db.collection("users")
+    refs = [users.document(uid) for uid in user_ids]
+    chunks = [refs[i:i + GET_ALL_CHUNK_SIZE] for i in range(0, len(refs), GET_ALL_CHUNK_SIZE)]
+    
+    users_by_id = {}
+    for chunk in await asyncio.gather(*(_get_all_dicts(db, c) for c in chunks)):
+        users_by_id.update(chunk)
+    return users_by_id
+
+
+async def query_exists(query) -> bool:
+    """Check whether a query matches any document via a COUNT aggregation."""
+    result = await query.count().get()
+    return result[0][0].value > 0
+
+
+async def first_doc(query):
+    """Return the first document a query matches, or None."""
+    docs = await query.limit(1).get()
+    return docs[0] if docs else None
+
+
 async def send_invite_email(email: str, org_name: str, invite_token: str, inviter_name: str, message: str = None):
-    """Send invitation email (uses Resend via notifications service)."""
-    # TODO: Integrate with email service
+    """Queue an invitation email for batched delivery via the email worker."""
     invite_url = f"{os.getenv('APP_URL', 'https://tracevox.ai')}/invite/{invite_token}"
     
-    logger.info(f"Sending invite to {email} for org {org_name}")
-    logger.info(f"Invite URL: {invite_url}")
+    logger.info(f"Queueing invite to {email} for org {org_name}")
     
-    # For now, just log. In production, send actual email via Resend:
-    # from app.core.notifications import send_email
-    # sg = sendgrid.SendGridAPIClient(os.getenv('SENDGRID_API_KEY'))
-    # ...
+    await email_queue.enqueue(email, "invite", {
+        "org_name": org_name,
+        "invite_url": invite_url,
+        "inviter_name": inviter_name,
+        "message": message,
+    })
 
 
 # =============================================================================
@@ -152,34 +272,42 @@ async def send_invite_email(email: str, org_name: str, invite_token: str, invite
 
 @router.get("/members")
 async def list_members(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     current_user: dict = Depends(require_auth),
 ):
     """
-    List all team members in the organization.
+    List team members in the organization, one page at a time.
+    
+    Pass the returned next_cursor back as cursor to fetch the next page;
+    total counts every member, not just this page.
     """
     org_id = current_user["org_id"]
     db = get_db()
     
     if not db:
-        return {"members": [], "total": 0}
+        return {"members": [], "total": 0, "next_cursor": None}
     
-    try:
-        # Get all memberships for this org
+    async def produce():
         memberships_ref = db.collection("memberships").where("org_id", "==", org_id)
-        memberships = list(memberships_ref.stream())
+        memberships, total = await asyncio.gather(
+            _paginate(memberships_ref, limit, cursor).get(),
+            member_count_cache.get_member_count(db, org_id),
+        )
+        membership_data = [m.to_dict() for m in memberships]
+        
+        # Name/email are denormalized onto memberships; only rows written
+        # before that need the user doc
+        legacy_ids = list({
+            m["user_id"] for m in membership_data
+            if m.get("user_id") and not ("email" in m and "name" in m)
+        })
+        users_by_id = await get_users_by_id(db, legacy_ids) if legacy_ids else {}
         
         members = []
-        for membership in memberships:
-            m_data = membership.to_dict()
+        for m_data in membership_data:
             user_id = m_data.get("user_id")
-            
-            # Get user details
-            user_doc = db.collection("users").document(user_id).get()
-            user_data = user_doc.to_dict() if user_doc.exists else {}
-            
-            # Format timestamps
-            joined_at = m_data.get("joined_at")
-            last_active = m_data.get("last_active")
+            user_data = users_by_id.get(user_id) or m_data
             
             members.append({
                 "id": user_id,
@@ -187,16 +315,24 @@ async def list_members(
                 "name": user_data.get("name", ""),
                 "role": m_data.get("role", "member"),
                 "status": m_data.get("status", "active"),
-                "joined_at": joined_at.isoformat() if hasattr(joined_at, 'isoformat') else str(joined_at) if joined_at else None,
+                "joined_at": _epoch_ms(m_data, "joined_at"),
                 "invited_by": m_data.get("invited_by"),
-                "last_active": last_active.isoformat() if hasattr(last_active, 'isoformat') else str(last_active) if last_active else None,
+                "last_active": _epoch_ms(m_data, "last_active"),
             })
         
         return {
             "members": members,
-            "total": len(members),
+            "total": total,
+            "next_cursor": _encode_cursor(memberships[-1].id) if len(memberships) == limit else None,
         }
     
+    try:
+        return await response_cache.cached(
+            f"members:{org_id}:{limit}:{cursor or ''}", LIST_CACHE_TTL_SECONDS, produce
+        )
+    
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to list members: {e}")
         return {"members": [], "total": 0, "error": str(e)}
@@ -204,43 +340,54 @@ async def list_members(
 
 @router.get("/invites")
 async def list_invites(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     current_user: dict = Depends(require_auth),
 ):
     """
-    List pending team invitations.
+    List pending team invitations, one page at a time.
+    
+    total counts every pending invite, not just this page.
     """
     org_id = current_user["org_id"]
     db = get_db()
     
     if not db:
-        return {"invites": [], "total": 0}
+        return {"invites": [], "total": 0, "next_cursor": None}
     
-    try:
+    async def produce():
         invites_ref = db.collection("team_invites").where("org_id", "==", org_id).where("status", "==", "pending")
-        invites = list(invites_ref.stream())
+        invites, counts = await asyncio.gather(
+            _paginate(invites_ref, limit, cursor).get(),
+            invites_ref.count().get(),
+        )
         
         result = []
         for invite in invites:
             i_data = invite.to_dict()
-            
-            invited_at = i_data.get("invited_at")
-            expires_at = i_data.get("expires_at")
-            
             result.append({
                 "id": invite.id,
                 "email": i_data.get("email"),
                 "role": i_data.get("role", "member"),
                 "invited_by": i_data.get("invited_by_email", ""),
-                "invited_at": invited_at.isoformat() if hasattr(invited_at, 'isoformat') else str(invited_at) if invited_at else None,
-                "expires_at": expires_at.isoformat() if hasattr(expires_at, 'isoformat') else str(expires_at) if expires_at else None,
+                "invited_at": _epoch_ms(i_data, "invited_at"),
+                "expires_at": _epoch_ms(i_data, "expires_at"),
                 "status": i_data.get("status", "pending"),
             })
         
         return {
             "invites": result,
-            "total": len(result),
+            "total": int(counts[0][0].value),
+            "next_cursor": _encode_cursor(invites[-1].id) if len(invites) == limit else None,
         }
     
+    try:
+        return await response_cache.cached(
+            f"invites:{org_id}:{limit}:{cursor or ''}", LIST_CACHE_TTL_SECONDS, produce
+        )
+    
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to list invites: {e}")
         return {"invites": [], "total": 0, "error": str(e)}
@@ -249,7 +396,6 @@ async def list_invites(
 @router.post("/invite")
 async def invite_member(
     request: InviteRequest,
-    background_tasks: BackgroundTasks,
     current_user: dict = Depends(require_auth),
 ):
     """
@@ -275,26 +421,25 @@ async def invite_member(
     if not db:
         raise HTTPException(503, "Database not available")
     
-    org = get_org_by_id(org_id)
+    # Existing member, pending invite, org and member count are independent reads
+    existing = db.collection("memberships").where("org_id", "==", org_id).where("email", "==", request.email).limit(1)
+    pending = db.collection("team_invites").where("org_id", "==", org_id).where("email", "==", request.email).where("status", "==", "pending").limit(1)
+    org, already_member, already_invited, current_members = await asyncio.gather(
+        asyncio.to_thread(get_org_by_id, org_id),
+        query_exists(existing),
+        query_exists(pending),
+        member_count_cache.get_member_count(db, org_id),
+    )
+    
     if not org:
         raise HTTPException(404, "Organization not found")
-    
-    # Check if user already exists in org
-    existing = db.collection("memberships").where("org_id", "==", org_id).where("email", "==", request.email).limit(1)
-    if list(existing.stream()):
+    if already_member:
         raise HTTPException(400, f"{request.email} is already a member of this organization")
-    
-    # Check for pending invite
-    pending = db.collection("team_invites").where("org_id", "==", org_id).where("email", "==", request.email).where("status", "==", "pending").limit(1)
-    if list(pending.stream()):
+    if already_invited:
         raise HTTPException(400, f"An invitation is already pending for {request.email}")
     
     # Check team member limits
-    from app.core.config import TierLimits, PricingTier
-    tier = PricingTier(org.get("tier", "free"))
-    limits = TierLimits.for_tier(tier)
-    
-    current_members = len(list(db.collection("memberships").where("org_id", "==", org_id).stream()))
+    limits = _limits_for(org.get("tier", "free"))
     if limits.team_members > 0 and current_members >= limits.team_members:
         raise HTTPException(
             400, 
@@ -317,17 +462,19 @@ async def invite_member(
         "invited_by_email": inviter.get("email", ""),
         "invited_by_name": inviter.get("name", ""),
         "message": request.message,
-        "invited_at": now,
+        "invited_at": SERVER_TIMESTAMP,
+        "invited_at_ms": _to_ms(now),
         "expires_at": expires_at,
+        "expires_at_ms": _to_ms(expires_at),
         "status": "pending",
     }
     
     invite_ref = db.collection("team_invites").document()
-    invite_ref.set(invite_data)
+    await invite_ref.set(invite_data)
+    await invalidate_team_lists(org_id)
     
-    # Send invitation email in background
-    background_tasks.add_task(
-        send_invite_email,
+    # Queue invitation email for the batched email worker
+    await send_invite_email(
         request.email,
         org.get("name", "Tracevox"),
         invite_token,
@@ -342,7 +489,7 @@ async def invite_member(
         "invite_id": invite_ref.id,
         "email": request.email,
         "role": request.role.value,
-        "expires_at": expires_at.isoformat(),
+        "expires_at": _to_ms(expires_at),
         "message": f"Invitation sent to {request.email}",
     }
 
@@ -350,7 +497,6 @@ async def invite_member(
 @router.post("/invite/{invite_id}/resend")
 async def resend_invite(
     invite_id: str,
-    background_tasks: BackgroundTasks,
     current_user: dict = Depends(require_auth),
 ):
     """
@@ -366,7 +512,7 @@ async def resend_invite(
     if not db:
         raise HTTPException(503, "Database not available")
     
-    invite_doc = db.collection("team_invites").document(invite_id).get()
+    invite_doc = await db.collection("team_invites").document(invite_id).get()
     if not invite_doc.exists:
         raise HTTPException(404, "Invitation not found")
     
@@ -379,13 +525,14 @@ async def resend_invite(
     
     # Update expiry and resend
     new_expires = datetime.now(timezone.utc) + timedelta(days=7)
-    db.collection("team_invites").document(invite_id).update({
+    await db.collection("team_invites").document(invite_id).update({
         "expires_at": new_expires,
+        "expires_at_ms": _to_ms(new_expires),
     })
+    await invalidate_team_lists(org_id)
     
-    org = get_org_by_id(org_id)
-    background_tasks.add_task(
-        send_invite_email,
+    org = await asyncio.to_thread(get_org_by_id, org_id)
+    await send_invite_email(
         invite_data.get("email"),
         org.get("name", "Tracevox") if org else "Tracevox",
         invite_data.get("token"),
@@ -414,7 +561,7 @@ async def revoke_invite(
     if not db:
         raise HTTPException(503, "Database not available")
     
-    invite_doc = db.collection("team_invites").document(invite_id).get()
+    invite_doc = await db.collection("team_invites").document(invite_id).get()
     if not invite_doc.exists:
         raise HTTPException(404, "Invitation not found")
     
@@ -422,90 +569,112 @@ async def revoke_invite(
     if invite_data.get("org_id") != org_id:
         raise HTTPException(404, "Invitation not found")
     
-    db.collection("team_invites").document(invite_id).update({
+    now = datetime.now(timezone.utc)
+    await db.collection("team_invites").document(invite_id).update({
         "status": "revoked",
-        "revoked_at": datetime.now(timezone.utc),
+        "revoked_at": SERVER_TIMESTAMP,
+        "revoked_at_ms": _to_ms(now),
     })
+    await invalidate_team_lists(org_id)
     
     return {"success": True, "message": "Invitation revoked"}
 
 
-@router.post("/accept-invite/{token}")
-async def accept_invite(
-    token: str,
-    current_user: dict = Depends(require_auth),
-):
+async def _accept_invite_txn(transaction, db, token: str, user: dict, now: datetime) -> dict:
     """
-    Accept a team invitation.
+    Validate an invite and record its acceptance inside one transaction.
     
-    The user must be logged in. If they don't have an account, they should sign up first.
+    The invite lookup and already-member check are transactional reads, so
+    two concurrent accepts of the same token cannot both succeed.
     """
-    db = get_db()
-    if not db:
-        raise HTTPException(503, "Database not available")
-    
-    # Find invite by token
-    invites = db.collection("team_invites").where("token", "==", token).where("status", "==", "pending").limit(1)
-    invite_docs = list(invites.stream())
-    
+    # Find invite by token; expired invites are filtered out server-side
+    invites = (
+        db.collection("team_invites")
+        .where("token", "==", token)
+        .where("status", "==", "pending")
+        .where("expires_at", ">", now)
+        .limit(1)
+    )
+    invite_docs = await invites.get(transaction=transaction)
     if not invite_docs:
         raise HTTPException(404, "Invalid or expired invitation")
     
     invite_doc = invite_docs[0]
     invite_data = invite_doc.to_dict()
     
-    # Check expiry
-    expires_at = invite_data.get("expires_at")
-    if expires_at:
-        if hasattr(expires_at, 'replace'):
-            expires_at = expires_at.replace(tzinfo=timezone.utc)
-        if datetime.now(timezone.utc) > expires_at:
-            db.collection("team_invites").document(invite_doc.id).update({"status": "expired"})
-            raise HTTPException(400, "Invitation has expired")
-    
     # Check email matches
-    user = current_user.get("user", {})
     if user.get("email", "").lower() != invite_data.get("email", "").lower():
         raise HTTPException(400, f"This invitation was sent to {invite_data.get('email')}. Please log in with that email.")
     
-    user_id = current_user["user"]["id"]
+    user_id = user["id"]
     org_id = invite_data.get("org_id")
     
-    # Check if already a member
+    # Check if already a member, loading the user doc alongside
     existing = db.collection("memberships").where("org_id", "==", org_id).where("user_id", "==", user_id).limit(1)
-    if list(existing.stream()):
+    user_ref = db.collection("users").document(user_id)
+    existing_docs, user_doc = await asyncio.gather(
+        existing.get(transaction=transaction),
+        user_ref.get(transaction=transaction),
+    )
+    if existing_docs:
         raise HTTPException(400, "You are already a member of this organization")
     
-    # Create membership
-    now = datetime.now(timezone.utc)
-    membership_data = {
+    # Create membership, mark invite accepted and set the user's org_id
+    # (if they don't have one)
+    transaction.set(db.collection("memberships").document(), {
         "org_id": org_id,
         "user_id": user_id,
-        "email": user.get("email"),
+        "email": user.get("email", ""),
+        "name": user.get("name", ""),
         "role": invite_data.get("role", "member"),
         "status": "active",
-        "joined_at": now,
+        "joined_at": SERVER_TIMESTAMP,
+        "joined_at_ms": _to_ms(now),
         "invited_by": invite_data.get("invited_by"),
-        "last_active": now,
-    }
-    
-    db.collection("memberships").add(membership_data)
-    
-    # Mark invite as accepted
-    db.collection("team_invites").document(invite_doc.id).update({
+        "last_active": SERVER_TIMESTAMP,
+        "last_active_ms": _to_ms(now),
+    })
+    transaction.update(invite_doc.reference, {
         "status": "accepted",
-        "accepted_at": now,
+        "accepted_at": SERVER_TIMESTAMP,
+        "accepted_at_ms": _to_ms(now),
         "accepted_by": user_id,
     })
+    if user_doc.exists and not user_doc.to_dict().get("org_id"):
+        transaction.update(user_ref, {"org_id": org_id})
     
-    # Update user's org_id if they don't have one
-    user_doc = db.collection("users").document(user_id).get()
-    if user_doc.exists:
-        user_data = user_doc.to_dict()
-        if not user_data.get("org_id"):
-            db.collection("users").document(user_id).update({"org_id": org_id})
+    return invite_data
+
+
+@router.post("/accept-invite/{token}")
+async def accept_invite(
+    token: str,
+    current_user: dict = Depends(require_auth),
+):
+    """
+    Accept a team invitation.
+    
+    The user must be logged in. If they don't have an account, they should sign up first.
+    """
+    db = get_db()
+    if not db:
+        raise HTTPException(503, "Database not available")
+    
+    user = current_user.get("user", {})
+    user_id = user["id"]
+    now = datetime.now(timezone.utc)
+    
+    from google.cloud import firestore
     
-    org = get_org_by_id(org_id)
+    accept = firestore.async_transactional(_accept_invite_txn)
+    invite_data = await accept(db.transaction(), db, token, user, now)
+    org_id = invite_data.get("org_id")
+    
+    org, *_ = await asyncio.gather(
+        asyncio.to_thread(get_org_by_id, org_id),
+        member_count_cache.invalidate(org_id),
+        invalidate_team_lists(org_id),
+    )
     
     logger.info(f"User {user_id} accepted invite to org {org_id}")
     
@@ -550,24 +719,26 @@ async def update_member(
         raise HTTPException(503, "Database not available")
     
     # Find membership
-    memberships = db.collection("memberships").where("org_id", "==", org_id).where("user_id", "==", member_id).limit(1)
-    membership_docs = list(memberships.stream())
+    memberships = db.collection("memberships").where("org_id", "==", org_id).where("user_id", "==", member_id)
+    membership_doc = await first_doc(memberships)
     
-    if not membership_docs:
+    if membership_doc is None:
         raise HTTPException(404, "Member not found")
     
-    membership_doc = membership_docs[0]
     membership_data = membership_doc.to_dict()
     
     # Can't change owner's role
     if membership_data.get("role") == "owner":
         raise HTTPException(400, "Cannot change owner's role")
     
-    db.collection("memberships").document(membership_doc.id).update({
+    now = datetime.now(timezone.utc)
+    await db.collection("memberships").document(membership_doc.id).update({
         "role": request.role.value,
-        "updated_at": datetime.now(timezone.utc),
+        "updated_at": SERVER_TIMESTAMP,
+        "updated_at_ms": _to_ms(now),
         "updated_by": user_id,
     })
+    await invalidate_team_lists(org_id)
     
     logger.info(f"Updated member {member_id} role to {request.role} in org {org_id}")
     
@@ -601,14 +772,14 @@ async def remove_member(
     if not db:
         raise HTTPException(503, "Database not available")
     
-    # Find membership
-    memberships = db.collection("memberships").where("org_id", "==", org_id).where("user_id", "==", member_id).limit(1)
-    membership_docs = list(memberships.stream())
+    # Find membership, loading the member's user doc alongside
+    memberships = db.collection("memberships").where("org_id", "==", org_id).where("user_id", "==", member_id)
+    member_ref = db.collection("users").document(member_id)
+    membership_doc, member_doc = await asyncio.gather(first_doc(memberships), member_ref.get())
     
-    if not membership_docs:
+    if membership_doc is None:
         raise HTTPException(404, "Member not found")
     
-    membership_doc = membership_docs[0]
     membership_data = membership_doc.to_dict()
     
     # Can't remove owner
@@ -619,8 +790,13 @@ async def remove_member(
     if membership_data.get("role") == "admin" and user_role != TeamRole.OWNER:
         raise HTTPException(400, "Only owners can remove admins")
     
-    # Delete membership
-    db.collection("memberships").document(membership_doc.id).delete()
+    # Delete membership and clear the member's org_id if it points here
+    batch = db.batch()
+    batch.delete(db.collection("memberships").document(membership_doc.id))
+    if member_doc.exists and member_doc.to_dict().get("org_id") == org_id:
+        batch.update(member_ref, {"org_id": None})
+    await batch.commit()
+    await asyncio.gather(member_count_cache.invalidate(org_id), invalidate_team_lists(org_id))
     
     logger.info(f"Removed member {member_id} from org {org_id}")
     
@@ -651,14 +827,15 @@ async def leave_organization(
         raise HTTPException(503, "Database not available")
     
     # Find and delete membership
-    memberships = db.collection("memberships").where("org_id", "==", org_id).where("user_id", "==", user_id).limit(1)
-    membership_docs = list(memberships.stream())
+    memberships = db.collection("memberships").where("org_id", "==", org_id).where("user_id", "==", user_id)
+    membership_doc = await first_doc(memberships)
     
-    if membership_docs:
-        db.collection("memberships").document(membership_docs[0].id).delete()
+    if membership_doc is not None:
+        await membership_doc.reference.delete()
+        await asyncio.gather(member_count_cache.invalidate(org_id), invalidate_team_lists(org_id))
     
     # Clear org_id from user
-    db.collection("users").document(user_id).update({"org_id": None})
+    await db.collection("users").document(user_id).update({"org_id": None})
     
     logger.info(f"User {user_id} left org {org_id}")
     
@@ -668,32 +845,31 @@ async def leave_organization(
     }
 
 
+_ROLE_DESCRIPTIONS = {
+    TeamRole.OWNER: "Full control over the organization",
+    TeamRole.ADMIN: "Manage team members, billing, and settings",
+    TeamRole.MEMBER: "Create API keys and view dashboard",
+    TeamRole.VIEWER: "Read-only access to dashboard",
+}
+
+# Static payload for GET /roles, built once at import
+_ROLES_RESPONSE = {
+    "roles": [
+        {
+            "id": role.value,
+            "name": role.value.title(),
+            "description": _ROLE_DESCRIPTIONS.get(role, ""),
+            "permissions": sorted(ROLE_PERMISSIONS.get(role, _NO_PERMISSIONS)),
+        }
+        for role in TeamRole
+        if role != TeamRole.OWNER  # Owner is not assignable
+    ]
+}
+
+
 @router.get("/roles")
 async def get_roles():
     """
     Get available team roles and their permissions.
     """
-    return {
-        "roles": [
-            {
-                "id": role.value,
-                "name": role.value.title(),
-                "description": _get_role_description(role),
-                "permissions": ROLE_PERMISSIONS.get(role, []),
-            }
-            for role in TeamRole
-            if role != TeamRole.OWNER  # Owner is not assignable
-        ]
-    }
-
-
-def _get_role_description(role: TeamRole) -> str:
-    """Get human-readable role description."""
-    descriptions = {
-        TeamRole.OWNER: "Full control over the organization",
-        TeamRole.ADMIN: "Manage team members, billing, and settings",
-        TeamRole.MEMBER: "Create API keys and view dashboard",
-        TeamRole.VIEWER: "Read-only access to dashboard",
-    }
-    return descriptions.get(role, "")
-
+    return _ROLES_RESPONSE
@@ -10,17 +10,59 @@ Store, version, and manage prompt templates:
 """
 
 from __future__ import annotations
+import zlib
+import uuid
+import base64
+import asyncio
 import logging
 from datetime import datetime, timezone
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Union
 
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel, Field
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, Field, computed_field, model_validator
 
-from app.api.auth import require_auth, get_db
+import orjson
+
+try:
+    import zstandard as zstd
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+    zstd = None
+
+from app.api.auth import require_auth, get_async_db
+from app.core import response_cache
 
 logger = logging.getLogger("tracevox.templates")
-router = APIRouter(prefix="/templates", tags=["Prompt Templates"])
+router = APIRouter(prefix="/templates", tags=["Prompt Templates"], default_response_class=ORJSONResponse)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Fields read by the template listing; messages/variables stay server-side.
+# Every LIST_ORDER/SEARCH_ORDER field must be projected too, since page
+# cursors are built from the last document's sort values.
+LIST_FIELDS = [
+    "name", "name_lower", "description", "category", "tags", "message_count",
+    "variable_count", "default_model", "default_provider", "is_public", "version",
+    "created_by", "usage_count", "created_at", "updated_at",
+]
+
+# get_template payloads only change when a template is written
+TEMPLATE_CACHE_TTL_SECONDS = 300
+
+# Per-org {category: active template count}, maintained on every write
+CATEGORY_INDEX_COLLECTION = "prompt_template_category_index"
+
+# Template content tracked by version history. History entries store only
+# the prior values of the fields a change touched, compressed; derived
+# fields (name_lower, message_count, variable_count) are recomputed.
+VERSIONED_FIELDS = (
+    "name", "description", "category", "tags", "messages", "variables",
+    "default_model", "default_provider", "default_temperature",
+    "default_max_tokens", "is_public",
+)
 
 
 # =============================================================================
@@ -66,6 +108,64 @@ class TemplateUpdate(BaseModel):
     is_public: Optional[bool] = None
 
 
+class TemplateDoc(BaseModel):
+    """
+    Stored shape of a prompt_templates document.
+    
+    Holds the write-time defaults and derived listing fields in one place;
+    unknown keys from a source document are dropped. Accepts what older
+    writers stored: playground templates keep variables as plain names, and
+    legacy documents may hold null for fields that now have defaults.
+    """
+    org_id: str
+    created_by: str
+    name: str
+    description: Optional[str] = None
+    category: Optional[str] = None
+    tags: List[str] = Field(default_factory=list)
+    messages: List[Dict[str, Any]] = Field(default_factory=list)
+    variables: List[Union[str, Dict[str, Any]]] = Field(default_factory=list)
+    default_model: Optional[str] = None
+    default_provider: Optional[str] = None
+    default_temperature: float = 0.7
+    default_max_tokens: int = 1024
+    is_public: bool = False
+    is_active: bool = True
+    version: int = 1
+    usage_count: int = 0
+    created_at: datetime
+    updated_at: datetime
+    
+    @model_validator(mode="before")
+    @classmethod
+    def _drop_legacy_nulls(cls, data: Any) -> Any:
+        """Let stored nulls fall back to the field default."""
+        if not isinstance(data, dict):
+            return data
+        return {
+            key: value for key, value in data.items()
+            if value is not None
+            or key not in cls.model_fields
+            or cls.model_fields[key].is_required()
+            or cls.model_fields[key].get_default(call_default_factory=True) is None
+        }
+    
+    @computed_field
+    @property
+    def name_lower(self) -> str:
+        return self.name.lower()
+    
+    @computed_field
+    @property
+    def message_count(self) -> int:
+        return len(self.messages)
+    
+    @computed_field
+    @property
+    def variable_count(self) -> int:
+        return len(self.variables)
+
+
 class TemplateResponse(BaseModel):
     """Template response."""
     id: str
@@ -82,11 +182,130 @@ class TemplateResponse(BaseModel):
     is_public: bool
     version: int
     created_by: str
-    created_at: str
-    updated_at: str
+    created_at: datetime
+    updated_at: datetime
     usage_count: int
 
 
+# =============================================================================
+# HELPERS
+# =============================================================================
+
+# Listing sort orders: (field, direction) pairs, always ending on doc ID
+LIST_ORDER = (("usage_count", "DESCENDING"), ("name", "ASCENDING"))
+# Prefix search needs its range field ordered first
+SEARCH_ORDER = (("name_lower", "ASCENDING"),)
+
+
+def _encode_cursor(doc, order) -> str:
+    """Opaque cursor holding the sort values of the last document on a page."""
+    data = doc.to_dict()
+    values = [data.get(field) for field, _ in order] + [doc.id]
+    return base64.urlsafe_b64encode(orjson.dumps(values)).decode()
+
+
+def _decode_cursor(cursor: str, order) -> list:
+    try:
+        values = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise HTTPException(400, "Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(order) + 1:
+        raise HTTPException(400, "Invalid cursor")
+    return values
+
+
+def _pack_changes(changes: Dict[str, Any]) -> Dict[str, Any]:
+    """Serialize and compress a history delta (zstd when installed, else zlib)."""
+    raw = orjson.dumps(changes)
+    if ZSTD_AVAILABLE:
+        return {"codec": "zstd", "changes": zstd.ZstdCompressor().compress(raw)}
+    return {"codec": "zlib", "changes": zlib.compress(raw)}
+
+
+def _unpack_changes(record: Dict[str, Any]) -> Dict[str, Any]:
+    blob = record.get("changes")
+    if not blob:
+        return {}
+    if record.get("codec") == "zstd":
+        if not ZSTD_AVAILABLE:
+            raise HTTPException(500, "zstandard is required to read this template version")
+        return orjson.loads(zstd.ZstdDecompressor().decompress(blob))
+    return orjson.loads(zlib.decompress(blob))
+
+
+def _version_record(template_id: str, data: Dict[str, Any], changed: List[str], now: datetime) -> Dict[str, Any]:
+    """History entry for the version in data, before the fields in changed are overwritten."""
+    return {
+        "template_id": template_id,
+        "version": data.get("version", 1),
+        "name": data.get("name"),
+        "created_at": now,
+        **_pack_changes({k: data.get(k) for k in changed if k in VERSIONED_FIELDS}),
+    }
+
+
+def _state_at_version(current: Dict[str, Any], records: List[Dict[str, Any]], version: int) -> Optional[Dict[str, Any]]:
+    """
+    Rebuild a template's versioned fields as of version.
+    
+    records are the history entries at or above version, newest first;
+    each delta is replayed backwards from the current document. Legacy
+    entries holding a full "data" snapshot are used as-is.
+    """
+    state = {k: current.get(k) for k in VERSIONED_FIELDS}
+    for record in records:
+        if "data" in record:
+            state = {k: record["data"].get(k) for k in VERSIONED_FIELDS}
+        else:
+            state.update(_unpack_changes(record))
+        if record.get("version") == version:
+            return state
+    return None
+
+
+def new_template_ref(db, org_id: str):
+    """
+    Document ref for a new template.
+    
+    The ID embeds the owning org ("{org_id}_{hex}") so ownership can be
+    checked without reading the document.
+    """
+    return db.collection("prompt_templates").document(f"{org_id}_{uuid.uuid4().hex}")
+
+
+def _template_org(template_id: str) -> Optional[str]:
+    """Owning org encoded in a template ID, or None for legacy auto-IDs."""
+    org_id, sep, suffix = template_id.rpartition("_")
+    if sep and len(suffix) == 32:
+        return org_id
+    return None
+
+
+def _template_cache_key(org_id: str, template_id: str) -> str:
+    return f"template:{org_id}:{template_id}"
+
+
+def _etag(payload: Dict[str, Any]) -> str:
+    return f'W/"v{payload.get("version", 1)}"'
+
+
+def _stage_category_change(batch, db, org_id: str, old: Optional[str], new: Optional[str]) -> None:
+    """Add the category counter adjustment for a template write to batch (or transaction)."""
+    if old == new:
+        return
+    from google.cloud.firestore import Increment
+    deltas = {}
+    if old:
+        deltas[old] = Increment(-1)
+    if new:
+        deltas[new] = Increment(1)
+    batch.set(
+        db.collection(CATEGORY_INDEX_COLLECTION).document(org_id),
+        {"categories": deltas},
+        merge=True,
+    )
+
+
 # =============================================================================
 # ENDPOINTS
 # =============================================================================
@@ -97,39 +316,53 @@ async def list_templates(
     tag: Optional[str] = None,
     search: Optional[str] = None,
     include_public: bool = True,
+    page_size: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     current_user: dict = Depends(require_auth),
 ):
     """
-    List all templates for the organization.
+    List templates for the organization, most used first.
+    
+    Results are paged; pass the returned next_cursor back as cursor.
     """
     org_id = current_user["org_id"]
     user_id = current_user["user"]["id"]
     
-    db = get_db()
+    db = get_async_db()
     if not db:
-        return {"templates": []}
+        return {"templates": [], "next_cursor": None}
     
     try:
-        # Get user's own templates
-        own_query = db.collection("prompt_templates").where("org_id", "==", org_id).where("is_active", "==", True)
+        query = (
+            db.collection("prompt_templates")
+            .where("org_id", "==", org_id)
+            .where("is_active", "==", True)
+        )
+        if category:
+            query = query.where("category", "==", category)
+        if tag:
+            query = query.where("tags", "array_contains", tag)
+        order = LIST_ORDER
+        if search:
+            prefix = search.lower()
+            query = query.where("name_lower", ">=", prefix).where("name_lower", "<", prefix + "\uf8ff")
+            order = SEARCH_ORDER
         
-        templates = []
-        seen_ids = set()
+        for field, direction in order:
+            query = query.order_by(field, direction=direction)
+        query = query.order_by("__name__").limit(page_size).select(LIST_FIELDS)
+        if cursor:
+            query = query.start_after(_decode_cursor(cursor, order))
         
-        for doc in own_query.stream():
-            if doc.id in seen_ids:
-                continue
-            seen_ids.add(doc.id)
-            
+        # Firestore returns the page already ranked; rows are built as they stream
+        templates = []
+        last_doc = None
+        fetched = 0
+        async for doc in query.stream():
+            last_doc = doc
+            fetched += 1
             data = doc.to_dict()
             
-            # Apply filters
-            if category and data.get("category") != category:
-                continue
-            if tag and tag not in data.get("tags", []):
-                continue
-            if search and search.lower() not in data.get("name", "").lower():
-                continue
             if not include_public and data.get("created_by") != user_id:
                 if not data.get("is_public"):
                     continue
@@ -140,8 +373,8 @@ async def list_templates(
                 "description": data.get("description"),
                 "category": data.get("category"),
                 "tags": data.get("tags", []),
-                "variable_count": len(data.get("variables", [])),
-                "message_count": len(data.get("messages", [])),
+                "variable_count": data.get("variable_count", 0),
+                "message_count": data.get("message_count", 0),
                 "default_model": data.get("default_model"),
                 "default_provider": data.get("default_provider"),
                 "is_public": data.get("is_public", False),
@@ -149,15 +382,17 @@ async def list_templates(
                 "created_by": data.get("created_by"),
                 "is_owner": data.get("created_by") == user_id,
                 "usage_count": data.get("usage_count", 0),
-                "created_at": data.get("created_at").isoformat() if data.get("created_at") else None,
-                "updated_at": data.get("updated_at").isoformat() if data.get("updated_at") else None,
+                "created_at": data.get("created_at"),
+                "updated_at": data.get("updated_at"),
             })
         
-        # Sort by usage count and name
-        templates.sort(key=lambda x: (-x.get("usage_count", 0), x.get("name", "")))
-        
-        return {"templates": templates}
+        return {
+            "templates": templates,
+            "next_cursor": _encode_cursor(last_doc, order) if fetched == page_size else None,
+        }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to list templates: {e}")
         return {"templates": [], "error": str(e)}
@@ -174,40 +409,31 @@ async def create_template(
     org_id = current_user["org_id"]
     user_id = current_user["user"]["id"]
     
-    db = get_db()
+    db = get_async_db()
     if not db:
         raise HTTPException(503, "Database not available")
     
     now = datetime.now(timezone.utc)
     
-    template_data = {
-        "org_id": org_id,
-        "created_by": user_id,
-        "name": request.name,
-        "description": request.description,
-        "category": request.category,
-        "tags": request.tags,
-        "messages": [{"role": m.role, "content": m.content} for m in request.messages],
-        "variables": request.variables,
-        "default_model": request.default_model,
-        "default_provider": request.default_provider,
-        "default_temperature": request.default_temperature,
-        "default_max_tokens": request.default_max_tokens,
-        "is_public": request.is_public,
-        "is_active": True,
-        "version": 1,
-        "usage_count": 0,
-        "created_at": now,
-        "updated_at": now,
-    }
+    template_data = TemplateDoc(
+        **request.model_dump(),
+        org_id=org_id,
+        created_by=user_id,
+        created_at=now,
+        updated_at=now,
+    ).model_dump()
     
-    template_ref = db.collection("prompt_templates").add(template_data)
+    template_ref = new_template_ref(db, org_id)
+    batch = db.batch()
+    batch.set(template_ref, template_data)
+    _stage_category_change(batch, db, org_id, None, request.category)
+    await batch.commit()
     
     logger.info(f"Created template '{request.name}' for org {org_id}")
     
     return {
         "success": True,
-        "template_id": template_ref[1].id,
+        "template_id": template_ref.id,
         "name": request.name,
         "version": 1,
     }
@@ -222,18 +448,29 @@ async def get_categories(
     """
     org_id = current_user["org_id"]
     
-    db = get_db()
+    db = get_async_db()
     if not db:
         return {"categories": []}
     
     try:
-        query = db.collection("prompt_templates").where("org_id", "==", org_id).where("is_active", "==", True)
+        index_ref = db.collection(CATEGORY_INDEX_COLLECTION).document(org_id)
+        index_doc = await index_ref.get()
+        index = index_doc.to_dict() if index_doc.exists else {}
         
-        categories = set()
-        for doc in query.stream():
-            data = doc.to_dict()
-            if data.get("category"):
-                categories.add(data["category"])
+        if index.get("seeded"):
+            counts = index.get("categories", {})
+        else:
+            # First read for this org: build the index from a one-off scan
+            query = db.collection("prompt_templates").where("org_id", "==", org_id).where("is_active", "==", True)
+            counts = {}
+            async for doc in query.select(["category"]).stream():
+                cat = doc.to_dict().get("category")
+                if cat:
+                    counts[cat] = counts.get(cat, 0) + 1
+            await index_ref.set({"categories": counts, "seeded": True})
+        
+        # Zero counts are left in place by decrements and skipped here
+        categories = {cat for cat, count in counts.items() if count > 0}
         
         # Add default categories
         default_categories = [
@@ -261,44 +498,59 @@ async def get_categories(
 @router.get("/{template_id}")
 async def get_template(
     template_id: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     current_user: dict = Depends(require_auth),
 ):
     """
     Get a specific template with all details.
+    
+    Served from the response cache; supports If-None-Match on the version ETag.
     """
     org_id = current_user["org_id"]
     
-    db = get_db()
+    db = get_async_db()
     if not db:
         raise HTTPException(503, "Database not available")
     
-    doc = db.collection("prompt_templates").document(template_id).get()
-    if not doc.exists:
-        raise HTTPException(404, "Template not found")
-    
-    data = doc.to_dict()
-    if data.get("org_id") != org_id:
-        raise HTTPException(404, "Template not found")
+    async def produce():
+        doc = await db.collection("prompt_templates").document(template_id).get()
+        if not doc.exists:
+            raise HTTPException(404, "Template not found")
+        
+        data = doc.to_dict()
+        if data.get("org_id") != org_id:
+            raise HTTPException(404, "Template not found")
+        
+        return {
+            "id": template_id,
+            "name": data.get("name"),
+            "description": data.get("description"),
+            "category": data.get("category"),
+            "tags": data.get("tags", []),
+            "messages": data.get("messages", []),
+            "variables": data.get("variables", []),
+            "default_model": data.get("default_model"),
+            "default_provider": data.get("default_provider"),
+            "default_temperature": data.get("default_temperature", 0.7),
+            "default_max_tokens": data.get("default_max_tokens", 1024),
+            "is_public": data.get("is_public", False),
+            "version": data.get("version", 1),
+            "created_by": data.get("created_by"),
+            "usage_count": data.get("usage_count", 0),
+            "created_at": data.get("created_at"),
+            "updated_at": data.get("updated_at"),
+        }
+    
+    payload = await response_cache.cached(
+        _template_cache_key(org_id, template_id), TEMPLATE_CACHE_TTL_SECONDS, produce
+    )
     
-    return {
-        "id": template_id,
-        "name": data.get("name"),
-        "description": data.get("description"),
-        "category": data.get("category"),
-        "tags": data.get("tags", []),
-        "messages": data.get("messages", []),
-        "variables": data.get("variables", []),
-        "default_model": data.get("default_model"),
-        "default_provider": data.get("default_provider"),
-        "default_temperature": data.get("default_temperature", 0.7),
-        "default_max_tokens": data.get("default_max_tokens", 1024),
-        "is_public": data.get("is_public", False),
-        "version": data.get("version", 1),
-        "created_by": data.get("created_by"),
-        "usage_count": data.get("usage_count", 0),
-        "created_at": data.get("created_at").isoformat() if data.get("created_at") else None,
-        "updated_at": data.get("updated_at").isoformat() if data.get("updated_at") else None,
-    }
+    etag = _etag(payload)
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return payload
 
 
 @router.patch("/{template_id}")
@@ -313,12 +565,12 @@ async def update_template(
     org_id = current_user["org_id"]
     user_id = current_user["user"]["id"]
     
-    db = get_db()
+    db = get_async_db()
     if not db:
         raise HTTPException(503, "Database not available")
     
     doc_ref = db.collection("prompt_templates").document(template_id)
-    doc = doc_ref.get()
+    doc = await doc_ref.get()
     
     if not doc.exists:
         raise HTTPException(404, "Template not found")
@@ -330,23 +582,18 @@ async def update_template(
     if data.get("created_by") != user_id and not data.get("is_public"):
         raise HTTPException(403, "Only the template owner can edit it")
     
-    # Save current version to history
+    now = datetime.now(timezone.utc)
     current_version = data.get("version", 1)
-    db.collection("prompt_template_versions").add({
-        "template_id": template_id,
-        "version": current_version,
-        "data": data,
-        "created_at": datetime.now(timezone.utc),
-    })
     
     # Build updates
     updates = {
-        "updated_at": datetime.now(timezone.utc),
+        "updated_at": now,
         "version": current_version + 1,
     }
     
     if request.name is not None:
         updates["name"] = request.name
+        updates["name_lower"] = request.name.lower()
     if request.description is not None:
         updates["description"] = request.description
     if request.category is not None:
@@ -355,8 +602,10 @@ async def update_template(
         updates["tags"] = request.tags
     if request.messages is not None:
         updates["messages"] = [{"role": m.role, "content": m.content} for m in request.messages]
+        updates["message_count"] = len(request.messages)
     if request.variables is not None:
         updates["variables"] = request.variables
+        updates["variable_count"] = len(request.variables)
     if request.default_model is not None:
         updates["default_model"] = request.default_model
     if request.default_provider is not None:
@@ -368,7 +617,17 @@ async def update_template(
     if request.is_public is not None:
         updates["is_public"] = request.is_public
     
-    doc_ref.update(updates)
+    # Save current version to history in the same commit as the update
+    batch = db.batch()
+    batch.set(
+        db.collection("prompt_template_versions").document(),
+        _version_record(template_id, data, list(updates), now),
+    )
+    batch.update(doc_ref, updates)
+    if data.get("is_active", True):
+        _stage_category_change(batch, db, org_id, data.get("category"), updates.get("category", data.get("category")))
+    await batch.commit()
+    await response_cache.invalidate(_template_cache_key(org_id, template_id))
     
     return {
         "success": True,
@@ -387,12 +646,28 @@ async def get_template_versions(
     """
     org_id = current_user["org_id"]
     
-    db = get_db()
+    db = get_async_db()
     if not db:
         return {"versions": []}
     
+    query = (
+        db.collection("prompt_template_versions")
+        .where("template_id", "==", template_id)
+        .order_by("version", direction="DESCENDING")
+        .select(["version", "name", "created_at", "data.name"])
+    )
+    
+    # Fetch history alongside the access check; it is discarded if access fails
+    try:
+        doc, version_docs = await asyncio.gather(
+            db.collection("prompt_templates").document(template_id).get(),
+            query.get(),
+        )
+    except Exception as e:
+        logger.error(f"Failed to get template versions: {e}")
+        return {"versions": [], "error": str(e)}
+    
     # Verify access
-    doc = db.collection("prompt_templates").document(template_id).get()
     if not doc.exists:
         raise HTTPException(404, "Template not found")
     
@@ -401,20 +676,14 @@ async def get_template_versions(
         raise HTTPException(404, "Template not found")
     
     try:
-        query = (
-            db.collection("prompt_template_versions")
-            .where("template_id", "==", template_id)
-            .order_by("version", direction="DESCENDING")
-        )
-        
         versions = []
-        for version_doc in query.stream():
+        for version_doc in version_docs:
             version_data = version_doc.to_dict()
             versions.append({
                 "id": version_doc.id,
                 "version": version_data.get("version"),
-                "name": version_data.get("data", {}).get("name"),
-                "created_at": version_data.get("created_at").isoformat() if version_data.get("created_at") else None,
+                "name": version_data.get("name") or version_data.get("data", {}).get("name"),
+                "created_at": version_data.get("created_at"),
             })
         
         # Add current version
@@ -422,7 +691,7 @@ async def get_template_versions(
             "id": template_id,
             "version": data.get("version", 1),
             "name": data.get("name"),
-            "created_at": data.get("updated_at").isoformat() if data.get("updated_at") else None,
+            "created_at": data.get("updated_at"),
             "is_current": True,
         })
         
@@ -433,25 +702,31 @@ async def get_template_versions(
         return {"versions": [], "error": str(e)}
 
 
-@router.post("/{template_id}/rollback/{version}")
-async def rollback_template(
+@router.get("/{template_id}/versions/{version}")
+async def get_template_version(
     template_id: str,
     version: int,
     current_user: dict = Depends(require_auth),
 ):
     """
-    Rollback a template to a previous version.
+    Get the full content of a template as of a previous version.
     """
     org_id = current_user["org_id"]
-    user_id = current_user["user"]["id"]
     
-    db = get_db()
+    db = get_async_db()
     if not db:
         raise HTTPException(503, "Database not available")
     
-    # Verify access
-    doc_ref = db.collection("prompt_templates").document(template_id)
-    doc = doc_ref.get()
+    query = (
+        db.collection("prompt_template_versions")
+        .where("template_id", "==", template_id)
+        .where("version", ">=", version)
+        .order_by("version", direction="DESCENDING")
+    )
+    doc, version_docs = await asyncio.gather(
+        db.collection("prompt_templates").document(template_id).get(),
+        query.get(),
+    )
     
     if not doc.exists:
         raise HTTPException(404, "Template not found")
@@ -460,50 +735,115 @@ async def rollback_template(
     if data.get("org_id") != org_id:
         raise HTTPException(404, "Template not found")
     
-    if data.get("created_by") != user_id:
-        raise HTTPException(403, "Only the template owner can rollback")
+    records = [version_doc.to_dict() for version_doc in version_docs]
+    state = _state_at_version(data, records, version)
+    if state is None:
+        raise HTTPException(404, f"Version {version} not found")
     
-    # Find the version
+    created_at = next(record.get("created_at") for record in records if record.get("version") == version)
+    return {
+        "id": template_id,
+        "version": version,
+        **state,
+        "tags": state.get("tags") or [],
+        "messages": state.get("messages") or [],
+        "variables": state.get("variables") or [],
+        "created_at": created_at,
+    }
+
+
+async def _rollback_template_txn(
+    transaction, db, template_id: str, version: int, org_id: str, user_id: str
+) -> int:
+    """
+    Restore a stored version inside one transaction and return the new version.
+    
+    Reading the template transactionally makes the version bump race-free;
+    the history entry, restore and category count commit together.
+    """
+    doc_ref = db.collection("prompt_templates").document(template_id)
+    # Every entry from the target up is needed to replay deltas back to it
     query = (
         db.collection("prompt_template_versions")
         .where("template_id", "==", template_id)
-        .where("version", "==", version)
-        .limit(1)
+        .where("version", ">=", version)
+        .order_by("version", direction="DESCENDING")
     )
     
-    version_docs = list(query.stream())
-    if not version_docs:
-        raise HTTPException(404, f"Version {version} not found")
+    # Look up the target version while verifying access
+    doc, version_docs = await asyncio.gather(
+        doc_ref.get(transaction=transaction),
+        query.get(transaction=transaction),
+    )
     
-    version_data = version_docs[0].to_dict().get("data", {})
+    if not doc.exists:
+        raise HTTPException(404, "Template not found")
+    
+    data = doc.to_dict()
+    if data.get("org_id") != org_id:
+        raise HTTPException(404, "Template not found")
+    
+    if data.get("created_by") != user_id:
+        raise HTTPException(403, "Only the template owner can rollback")
+    
+    state = _state_at_version(data, [version_doc.to_dict() for version_doc in version_docs], version)
+    if state is None:
+        raise HTTPException(404, f"Version {version} not found")
     
-    # Save current as new version first
+    now = datetime.now(timezone.utc)
     current_version = data.get("version", 1)
-    db.collection("prompt_template_versions").add({
-        "template_id": template_id,
-        "version": current_version,
-        "data": data,
-        "created_at": datetime.now(timezone.utc),
-    })
     
-    # Restore the old version
-    restore_data = {
-        **version_data,
-        "version": current_version + 1,
-        "updated_at": datetime.now(timezone.utc),
-    }
-    # Remove fields that shouldn't be overwritten
-    restore_data.pop("org_id", None)
-    restore_data.pop("created_by", None)
-    restore_data.pop("created_at", None)
+    # Restore only the fields that differ from the current version
+    changed = [k for k in VERSIONED_FIELDS if state.get(k) != data.get(k)]
+    restore_data = {k: state.get(k) for k in changed}
+    restore_data["version"] = current_version + 1
+    restore_data["updated_at"] = now
+    if restore_data.get("name"):
+        restore_data["name_lower"] = restore_data["name"].lower()
+    if "messages" in restore_data:
+        restore_data["message_count"] = len(restore_data["messages"] or [])
+    if "variables" in restore_data:
+        restore_data["variable_count"] = len(restore_data["variables"] or [])
+    
+    # Save current as a history entry, then restore
+    transaction.set(
+        db.collection("prompt_template_versions").document(),
+        _version_record(template_id, data, changed, now),
+    )
+    transaction.update(doc_ref, restore_data)
+    if data.get("is_active", True):
+        _stage_category_change(transaction, db, org_id, data.get("category"), restore_data.get("category", data.get("category")))
+    
+    return current_version + 1
+
+
+@router.post("/{template_id}/rollback/{version}")
+async def rollback_template(
+    template_id: str,
+    version: int,
+    current_user: dict = Depends(require_auth),
+):
+    """
+    Rollback a template to a previous version.
+    """
+    org_id = current_user["org_id"]
+    user_id = current_user["user"]["id"]
+    
+    db = get_async_db()
+    if not db:
+        raise HTTPException(503, "Database not available")
+    
+    from google.cloud import firestore
     
-    doc_ref.update(restore_data)
+    rollback = firestore.async_transactional(_rollback_template_txn)
+    new_version = await rollback(db.transaction(), db, template_id, version, org_id, user_id)
+    await response_cache.invalidate(_template_cache_key(org_id, template_id))
     
     return {
         "success": True,
         "template_id": template_id,
         "restored_from_version": version,
-        "new_version": current_version + 1,
+        "new_version": new_version,
     }
 
 
@@ -518,12 +858,12 @@ async def delete_template(
     org_id = current_user["org_id"]
     user_id = current_user["user"]["id"]
     
-    db = get_db()
+    db = get_async_db()
     if not db:
         raise HTTPException(503, "Database not available")
     
     doc_ref = db.collection("prompt_templates").document(template_id)
-    doc = doc_ref.get()
+    doc = await doc_ref.get()
     
     if not doc.exists:
         raise HTTPException(404, "Template not found")
@@ -535,10 +875,15 @@ async def delete_template(
     if data.get("created_by") != user_id:
         raise HTTPException(403, "Only the template owner can delete it")
     
-    doc_ref.update({
+    batch = db.batch()
+    batch.update(doc_ref, {
         "is_active": False,
         "deleted_at": datetime.now(timezone.utc),
     })
+    if data.get("is_active", True):
+        _stage_category_change(batch, db, org_id, data.get("category"), None)
+    await batch.commit()
+    await response_cache.invalidate(_template_cache_key(org_id, template_id))
     
     return {"success": True, "message": "Template deleted"}
 
@@ -555,11 +900,11 @@ async def duplicate_template(
     org_id = current_user["org_id"]
     user_id = current_user["user"]["id"]
     
-    db = get_db()
+    db = get_async_db()
     if not db:
         raise HTTPException(503, "Database not available")
     
-    doc = db.collection("prompt_templates").document(template_id).get()
+    doc = await db.collection("prompt_templates").document(template_id).get()
     if not doc.exists:
         raise HTTPException(404, "Template not found")
     
@@ -569,7 +914,7 @@ async def duplicate_template(
     
     now = datetime.now(timezone.utc)
     
-    new_template = {
+    new_template = TemplateDoc(**{
         **data,
         "name": name or f"{data.get('name')} (Copy)",
         "created_by": user_id,
@@ -578,13 +923,18 @@ async def duplicate_template(
         "usage_count": 0,
         "created_at": now,
         "updated_at": now,
-    }
+    }).model_dump()
     
-    template_ref = db.collection("prompt_templates").add(new_template)
+    template_ref = new_template_ref(db, org_id)
+    batch = db.batch()
+    batch.set(template_ref, new_template)
+    if new_template.get("is_active", True):
+        _stage_category_change(batch, db, org_id, None, new_template.get("category"))
+    await batch.commit()
     
     return {
         "success": True,
-        "template_id": template_ref[1].id,
+        "template_id": template_ref.id,
         "name": new_template["name"],
     }
 
@@ -599,23 +949,31 @@ async def record_template_usage(
     """
     org_id = current_user["org_id"]
     
-    db = get_db()
+    db = get_async_db()
     if not db:
         return {"success": True}
     
     doc_ref = db.collection("prompt_templates").document(template_id)
-    doc = doc_ref.get()
     
-    if not doc.exists:
-        return {"success": False}
-    
-    data = doc.to_dict()
-    if data.get("org_id") != org_id:
+    owner = _template_org(template_id)
+    if owner is None:
+        # Legacy auto-ID template: ownership needs a read
+        doc = await doc_ref.get()
+        if not doc.exists or doc.to_dict().get("org_id") != org_id:
+            return {"success": False}
+    elif owner != org_id:
         return {"success": False}
     
     # Increment usage count
     from google.cloud.firestore import Increment
-    doc_ref.update({"usage_count": Increment(1)})
+    from google.api_core.exceptions import NotFound
+    try:
+        await doc_ref.update({
+            "usage_count": Increment(1),
+            "last_used_at": datetime.now(timezone.utc),
+        })
+    except NotFound:
+        return {"success": False}
     
     return {"success": True}
 
@@ -8,30 +8,57 @@ REST API for distributed tracing:
 - Session management
 """
 
+import asyncio
+import base64
+import copy
+import heapq
+import itertools
 import logging
+import uuid
 from datetime import datetime, timezone, timedelta
-from typing import Optional, List, Dict, Any
-from fastapi import APIRouter, Depends, HTTPException, Header, Query
-from pydantic import BaseModel, Field
+from typing import Optional, List, Dict, Any, Tuple, Container
+
+import orjson
+from fastapi import APIRouter, Body, Depends, HTTPException, Header, Query, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
 
 from app.api.auth import require_auth
+from app.core import response_cache
 from app.core.tracing import (
     Trace, Span, Session,
     SpanKind, SpanStatus, TraceStatus,
     SpanInput, SpanOutput, SpanMetrics,
-    trace_store, create_trace, create_span,
+    trace_store, create_trace, create_span, parse_iso,
 )
 
 logger = logging.getLogger(__name__)
-router = APIRouter(prefix="/api/tracing", tags=["Tracing"])
+router = APIRouter(prefix="/api/tracing", tags=["Tracing"], default_response_class=ORJSONResponse)
 
 
 # =============================================================================
 # REQUEST/RESPONSE MODELS
 # =============================================================================
 
+# Shared by all request models
+REQUEST_MODEL_CONFIG = ConfigDict(extra="ignore", str_strip_whitespace=True)
+
+# Spans accepted per POST /spans/batch call
+MAX_SPAN_BATCH = 1000
+
+# Stats responses are cached per org write version, so this only bounds
+# how long an unchanged org's entry lives; browsers may reuse it as long
+STATS_CACHE_TTL_SECONDS = 30
+
+# trace_store version counters are per process and restart at zero, while
+# response_cache and clients' ETags outlive it; versions are scoped to this boot
+BOOT_ID = uuid.uuid4().hex[:12]
+
+
 class CreateTraceRequest(BaseModel):
     """Request to create a new trace."""
+    model_config = REQUEST_MODEL_CONFIG
+    
     name: str = Field(..., description="Name of the trace")
     session_id: Optional[str] = Field(None, description="Session ID to group traces")
     user_id: Optional[str] = Field(None, description="User ID for attribution")
@@ -44,6 +71,8 @@ class CreateTraceRequest(BaseModel):
 
 class UpdateTraceRequest(BaseModel):
     """Request to update a trace."""
+    model_config = REQUEST_MODEL_CONFIG
+    
     name: Optional[str] = None
     status: Optional[str] = None
     output: Optional[Dict[str, Any]] = None
@@ -53,6 +82,8 @@ class UpdateTraceRequest(BaseModel):
 
 class CreateSpanRequest(BaseModel):
     """Request to create a span."""
+    model_config = REQUEST_MODEL_CONFIG
+    
     name: str = Field(..., description="Name of the span")
     trace_id: str = Field(..., description="Parent trace ID")
     parent_span_id: Optional[str] = Field(None, description="Parent span ID for nesting")
@@ -90,6 +121,8 @@ class CreateSpanRequest(BaseModel):
 
 class UpdateSpanRequest(BaseModel):
     """Request to update a span."""
+    model_config = REQUEST_MODEL_CONFIG
+    
     output: Optional[Dict[str, Any]] = None
     status: Optional[str] = None
     error: Optional[str] = None
@@ -109,6 +142,8 @@ class UpdateSpanRequest(BaseModel):
 
 class CreateSessionRequest(BaseModel):
     """Request to create a session."""
+    model_config = REQUEST_MODEL_CONFIG
+    
     name: Optional[str] = Field(None, description="Session name")
     user_id: Optional[str] = Field(None, description="User ID")
     metadata: Optional[Dict[str, Any]] = Field(None, description="Session metadata")
@@ -133,6 +168,30 @@ class TraceResponse(BaseModel):
     metadata: Dict[str, Any]
     input: Optional[Dict[str, Any]]
     output: Optional[Dict[str, Any]]
+    
+    @classmethod
+    def from_trace(cls, t: Trace, **extra: Any) -> "TraceResponse":
+        """Build from a stored trace without re-validating its fields."""
+        return cls.model_construct(
+            id=t.id,
+            name=t.name,
+            status=t.status_value,
+            start_time=t.start_time_iso,
+            end_time=t.end_time_iso,
+            duration_ms=t.duration_ms,
+            org_id=t.org_id,
+            user_id=t.user_id,
+            session_id=t.session_id,
+            span_count=t.span_count,
+            error_count=t.error_count,
+            total_tokens=t.total_tokens,
+            total_cost_usd=t.total_cost_usd,
+            tags=t.tags,
+            metadata=t.metadata,
+            input=t.input,
+            output=t.output,
+            **extra,
+        )
 
 
 class TraceDetailResponse(TraceResponse):
@@ -220,31 +279,98 @@ async def create_trace_endpoint(
     
     await trace_store.save_trace(trace)
     
-    return TraceResponse(
-        id=trace.id,
-        name=trace.name,
-        status=trace.status.value,
-        start_time=trace.start_time.isoformat(),
-        end_time=trace.end_time.isoformat() if trace.end_time else None,
-        duration_ms=trace.duration_ms,
-        org_id=trace.org_id,
-        user_id=trace.user_id,
-        session_id=trace.session_id,
-        span_count=trace.span_count,
-        error_count=trace.error_count,
-        total_tokens=trace.total_tokens,
-        total_cost_usd=trace.total_cost_usd,
-        tags=trace.tags,
-        metadata=trace.metadata,
-        input=trace.input,
-        output=trace.output,
-    )
+    return TraceResponse.from_trace(trace)
+
+
+def _parse_date_param(value: Optional[str], name: str, end: bool = False) -> Optional[datetime]:
+    """Parse an ISO date/datetime query param as UTC; a bare end date covers that whole day."""
+    if not value:
+        return None
+    try:
+        parsed = parse_iso(value)
+    except ValueError:
+        raise HTTPException(400, f"Invalid {name}")
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+
+def _encode_trace_cursor(start_time: str, trace_id: str) -> str:
+    """Opaque cursor for the (start_time, id) position of the last trace on a page."""
+    return base64.urlsafe_b64encode(orjson.dumps([start_time, trace_id])).decode()
+
+
+def _decode_trace_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, str]]:
+    if not cursor:
+        return None
+    try:
+        start_time, trace_id = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return parse_iso(start_time), trace_id
+    except Exception:
+        raise HTTPException(400, "Invalid cursor")
+
+
+def _set_next_cursor(response: Response, page: List[TraceResponse], limit: int) -> None:
+    """Expose the next page cursor as X-Next-Cursor, keeping the list body unchanged."""
+    if len(page) == limit:
+        response.headers["X-Next-Cursor"] = _encode_trace_cursor(page[-1].start_time, page[-1].id)
+
+
+def _trace_responses(traces: List[Trace]):
+    """Yield list-view responses for stored traces."""
+    for t in traces:
+        yield TraceResponse.from_trace(t)
+
+
+def _gateway_trace_responses(
+    logs: List[Dict[str, Any]],
+    org_id: str,
+    skip_ids: Container[str],
+    before: Optional[Tuple[datetime, str]],
+):
+    """
+    Yield list-view responses for gateway request logs, skipping stored traces.
+    
+    Expects rows from FirestoreDB.get_requests_page, which always carry flat
+    token/cost totals and the timestamp pre-formatted in "ts".
+    """
+    for log in logs:
+        if not log:
+            continue
+        req_id = log["request_id"] or ""
+        if req_id in skip_ids:
+            continue
+        ts = log["timestamp"]
+        if before and isinstance(ts, datetime) and (ts, req_id) >= before:
+            continue
+        
+        ok = log["ok"]
+        yield TraceResponse.model_construct(
+            id=req_id,
+            name=f"generation: {log['model']}",
+            status="completed" if ok else "error",
+            start_time=log["ts"],
+            end_time=log["ts"],
+            duration_ms=int(log["latency_ms"] or 0),
+            org_id=org_id,
+            user_id=None,
+            session_id=log["session_id"],
+            span_count=1,
+            error_count=0 if ok else 1,
+            total_tokens=int(log["total_tokens"] or 0),
+            total_cost_usd=float(log["total_cost_usd"] or 0),
+            tags=["gateway", "llm"],
+            metadata={"model": log["model"], "route": log["route"]},
+            input=None,
+            output=None,
+        )
 
 
 @router.get("/traces", response_model=List[TraceResponse])
 async def list_traces(
     limit: int = Query(50, ge=1, le=200),
-    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    offset: int = Query(0, ge=0, deprecated=True),
     session_id: Optional[str] = Query(None),
     user_id: Optional[str] = Query(None),
     status: Optional[str] = Query(None),
@@ -257,9 +383,11 @@ async def list_traces(
     List traces for the organization.
     
     Supports filtering by session, user, status, tags, and date range.
-    Also includes gateway requests as traces.
+    Also includes gateway requests as traces. Page with the cursor
+    returned in the X-Next-Cursor header; offset is kept for older clients.
     """
     org_id = current_user["org_id"]
+    before = _decode_trace_cursor(cursor)
     
     tag_list = tags.split(",") if tags else None
     
@@ -271,111 +399,97 @@ async def list_traces(
         except ValueError:
             pass  # Invalid status, ignore filter
     
-    # Get traces from trace_store
+    since = _parse_date_param(start_date, "start_date")
+    until = _parse_date_param(end_date, "end_date", end=True)
+    
+    # Both sources return their newest offset + limit matches; the merged
+    # page is cut from those
+    window = offset + limit
     traces = await trace_store.list_traces(
         org_id=org_id,
-        limit=limit,
-        offset=offset,
+        limit=window,
         session_id=session_id,
         user_id=user_id,
         status=status_enum,
         tags=tag_list,
+        since=since,
+        until=until,
+        before=before,
     )
     
-    result = [
-        TraceResponse(
-            id=t.id,
-            name=t.name,
-            status=t.status.value if isinstance(t.status, TraceStatus) else t.status,
-            start_time=t.start_time.isoformat(),
-            end_time=t.end_time.isoformat() if t.end_time else None,
-            duration_ms=t.duration_ms,
-            org_id=t.org_id,
-            user_id=t.user_id,
-            session_id=t.session_id,
-            span_count=t.span_count,
-            error_count=t.error_count,
-            total_tokens=t.total_tokens,
-            total_cost_usd=t.total_cost_usd,
-            tags=t.tags,
-            metadata=t.metadata,
-            input=t.input,
-            output=t.output,
-        )
-        for t in traces
-    ]
-    
     # Also fetch gateway requests from Firestore and convert to traces
+    firestore_logs = []
     try:
         from app.database import db as firestore_db
+        
+        # Gateway requests have no user, carry fixed tags and only end
+        # completed or errored; skip the query when filters exclude them
+        include_gateway = (
+            not user_id
+            and status_enum in (None, TraceStatus.COMPLETED, TraceStatus.ERROR)
+            and (not tag_list or any(tag in ("gateway", "llm") for tag in tag_list))
+        )
+        
+        gateway_until = until
+        if before:
+            # Include rows sharing the cursor's timestamp; they are trimmed by ID below
+            cursor_until = before[0] + timedelta(microseconds=1)
+            gateway_until = min(until, cursor_until) if until else cursor_until
+        
         logger.info(f"Checking Firestore for gateway requests for org {org_id}")
-        if firestore_db and firestore_db.is_available:
-            firestore_logs = firestore_db.get_requests(limit=limit, since_minutes=60*24*7)
+        if include_gateway and firestore_db and firestore_db.is_available:
+            firestore_logs, _ = firestore_db.get_requests_page(
+                org_id=org_id,
+                limit=window,
+                since=since,
+                until=gateway_until,
+                session_id=session_id,
+                ok=None if status_enum is None else status_enum == TraceStatus.COMPLETED,
+            )
             logger.info(f"Firestore returned {len(firestore_logs)} logs for tracing")
-            
-            existing_ids = {tr.id for tr in result}
-            
-            for log in firestore_logs:
-                if not log:
-                    continue
-                req_id = log.get("request_id", "")
-                if req_id in existing_ids:
-                    continue
-                    
-                # Get timestamp
-                ts = log.get("timestamp")
-                if hasattr(ts, 'isoformat'):
-                    ts_str = ts.isoformat()
-                elif ts:
-                    ts_str = str(ts)
-                else:
-                    ts_str = datetime.now(timezone.utc).isoformat()
-                
-                # Get cost from nested structure
-                cost_dict = log.get("cost") or {}
-                cost_usd = log.get("total_cost_usd", 0) or cost_dict.get("total_cost_usd", 0) or 0
-                
-                # Get tokens from nested structure
-                tokens_dict = log.get("tokens") or {}
-                total_tokens = log.get("total_tokens", 0) or tokens_dict.get("total_tokens", 0) or 0
-                
-                result.append(TraceResponse(
-                    id=req_id,
-                    name=f"generation: {log.get('model', 'unknown')}",
-                    status="completed" if log.get("ok", True) else "error",
-                    start_time=ts_str,
-                    end_time=ts_str,
-                    duration_ms=log.get("latency_ms", 0) or 0,
-                    org_id=org_id,
-                    user_id=None,
-                    session_id=log.get("session_id"),
-                    span_count=1,
-                    error_count=0 if log.get("ok", True) else 1,
-                    total_tokens=total_tokens,
-                    total_cost_usd=cost_usd,
-                    tags=["gateway", "llm"],
-                    metadata={"model": log.get("model"), "route": log.get("route")},
-                    input=None,
-                    output=None,
-                ))
     except Exception as e:
         logger.warning(f"Failed to fetch gateway requests for traces: {e}")
     
-    # Sort by start_time descending
-    result.sort(key=lambda x: x.start_time or "", reverse=True)
-    
-    return result[:limit]
+    # Both sources are already newest first; merge them lazily and stop
+    # once the page is filled
+    merged = heapq.merge(
+        _trace_responses(traces),
+        # Gateway requests and stored traces share IDs; any stored trace,
+        # listed on this page or filtered out, wins over its gateway row
+        _gateway_trace_responses(firestore_logs, org_id, trace_store.trace_ids(), before),
+        key=lambda x: (x.start_time or "", x.id),
+        reverse=True,
+    )
+    page = list(itertools.islice(merged, offset, offset + limit))
+    
+    async def stream_page():
+        # Serialize row by row instead of building the whole body at once
+        yield b"["
+        first = True
+        for row in page:
+            yield (b"" if first else b",") + orjson.dumps(row.model_dump(), default=str)
+            first = False
+        yield b"]"
+    
+    # The cursor depends only on the page's last row, so it is known
+    # before the first byte is sent
+    response = StreamingResponse(stream_page(), media_type="application/json")
+    _set_next_cursor(response, page, limit)
+    return response
 
 
 @router.get("/traces/{trace_id}", response_model=TraceDetailResponse)
 async def get_trace(
     trace_id: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     current_user: dict = Depends(require_auth),
 ):
     """
     Get a trace by ID with all spans.
     
-    Returns the full trace with span tree structure.
+    Returns the full trace with span tree structure. Supports If-None-Match
+    on the trace's write-version ETag.
     """
     org_id = current_user["org_id"]
     
@@ -387,24 +501,13 @@ async def get_trace(
     if trace.org_id != org_id:
         raise HTTPException(403, "Access denied")
     
-    return TraceDetailResponse(
-        id=trace.id,
-        name=trace.name,
-        status=trace.status.value if isinstance(trace.status, TraceStatus) else trace.status,
-        start_time=trace.start_time.isoformat(),
-        end_time=trace.end_time.isoformat() if trace.end_time else None,
-        duration_ms=trace.duration_ms,
-        org_id=trace.org_id,
-        user_id=trace.user_id,
-        session_id=trace.session_id,
-        span_count=trace.span_count,
-        error_count=trace.error_count,
-        total_tokens=trace.total_tokens,
-        total_cost_usd=trace.total_cost_usd,
-        tags=trace.tags,
-        metadata=trace.metadata,
-        input=trace.input,
-        output=trace.output,
+    etag = f'W/"t{BOOT_ID}-{trace_store.trace_version(trace_id)}"'
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    
+    return TraceDetailResponse.from_trace(
+        trace,
         spans=[s.to_dict() for s in trace.spans],
         span_tree=trace.get_span_tree(),
     )
@@ -431,69 +534,30 @@ async def update_trace(
     if trace.org_id != org_id:
         raise HTTPException(403, "Access denied")
     
-    # Update fields
+    # Only the provided fields are written
+    fields: Dict[str, Any] = {}
     if request.name:
-        trace.name = request.name
+        fields["name"] = request.name
     if request.status:
-        trace.status = TraceStatus(request.status)
-        if trace.status in [TraceStatus.COMPLETED, TraceStatus.ERROR]:
-            trace.end()
+        fields["status"] = TraceStatus(request.status)
     if request.output:
-        trace.output = request.output
-    if request.metadata:
-        trace.metadata.update(request.metadata)
+        fields["output"] = request.output
     if request.tags:
-        trace.tags = request.tags
+        fields["tags"] = request.tags
     
-    await trace_store.save_trace(trace)
+    trace = await trace_store.update_trace_fields(trace_id, org_id, fields, metadata=request.metadata)
+    if not trace:
+        raise HTTPException(404, "Trace not found")
     
-    return TraceResponse(
-        id=trace.id,
-        name=trace.name,
-        status=trace.status.value if isinstance(trace.status, TraceStatus) else trace.status,
-        start_time=trace.start_time.isoformat(),
-        end_time=trace.end_time.isoformat() if trace.end_time else None,
-        duration_ms=trace.duration_ms,
-        org_id=trace.org_id,
-        user_id=trace.user_id,
-        session_id=trace.session_id,
-        span_count=trace.span_count,
-        error_count=trace.error_count,
-        total_tokens=trace.total_tokens,
-        total_cost_usd=trace.total_cost_usd,
-        tags=trace.tags,
-        metadata=trace.metadata,
-        input=trace.input,
-        output=trace.output,
-    )
+    return TraceResponse.from_trace(trace)
 
 
 # =============================================================================
 # SPAN ENDPOINTS
 # =============================================================================
 
-@router.post("/spans", response_model=SpanResponse)
-async def create_span_endpoint(
-    request: CreateSpanRequest,
-    current_user: dict = Depends(require_auth),
-):
-    """
-    Create a new span within a trace.
-    
-    Spans represent individual operations like LLM calls, tool executions, etc.
-    """
-    org_id = current_user["org_id"]
-    
-    # Get the trace
-    trace = await trace_store.get_trace(request.trace_id)
-    
-    if not trace:
-        raise HTTPException(404, "Trace not found")
-    
-    if trace.org_id != org_id:
-        raise HTTPException(403, "Access denied")
-    
-    # Create the span
+def _build_span(request: CreateSpanRequest, org_id: str) -> Span:
+    """Build a Span from a create request."""
     span = Span(
         trace_id=request.trace_id,
         parent_span_id=request.parent_span_id,
@@ -537,23 +601,48 @@ async def create_span_endpoint(
     
     # Set timing
     if request.start_time:
-        span.start_time = datetime.fromisoformat(request.start_time.replace("Z", "+00:00"))
+        span.start_time = parse_iso(request.start_time)
     if request.end_time:
-        span.end_time = datetime.fromisoformat(request.end_time.replace("Z", "+00:00"))
+        span.end_time = parse_iso(request.end_time)
     elif span.status != SpanStatus.PENDING:
         span.end_time = datetime.now(timezone.utc)
     
+    return span
+
+
+@router.post("/spans", response_model=SpanResponse)
+async def create_span_endpoint(
+    request: CreateSpanRequest,
+    current_user: dict = Depends(require_auth),
+):
+    """
+    Create a new span within a trace.
+    
+    Spans represent individual operations like LLM calls, tool executions, etc.
+    """
+    org_id = current_user["org_id"]
+    
+    # Get the trace
+    trace = await trace_store.get_trace(request.trace_id)
+    
+    if not trace:
+        raise HTTPException(404, "Trace not found")
+    
+    if trace.org_id != org_id:
+        raise HTTPException(403, "Access denied")
+    
+    span = _build_span(request, org_id)
+    
     # Add to trace
-    trace.add_span(span)
-    await trace_store.save_trace(trace)
+    await trace_store.upsert_span(trace.id, span)
     
     return SpanResponse(
         id=span.id,
         trace_id=span.trace_id,
         parent_span_id=span.parent_span_id,
         name=span.name,
-        kind=span.kind.value if isinstance(span.kind, SpanKind) else span.kind,
-        status=span.status.value if isinstance(span.status, SpanStatus) else span.status,
+        kind=span.kind.value,
+        status=span.status.value,
         start_time=span.start_time.isoformat(),
         end_time=span.end_time.isoformat() if span.end_time else None,
         duration_ms=span.duration_ms,
@@ -598,11 +687,14 @@ async def update_span(
         raise HTTPException(403, "Access denied")
     
     # Find the span
-    span = next((s for s in trace.spans if s.id == span_id), None)
+    existing = trace.get_span(span_id)
     
-    if not span:
+    if not existing:
         raise HTTPException(404, "Span not found")
     
+    # Edit a copy so the store can swap the old span's rollup contribution out
+    span = copy.deepcopy(existing)
+    
     # Update fields
     if request.output:
         span.output = SpanOutput(
@@ -639,19 +731,19 @@ async def update_span(
         span.tags = request.tags
     
     if request.end_time:
-        span.end_time = datetime.fromisoformat(request.end_time.replace("Z", "+00:00"))
+        span.end_time = parse_iso(request.end_time)
     elif span.status != SpanStatus.PENDING and not span.end_time:
         span.end_time = datetime.now(timezone.utc)
     
-    await trace_store.save_trace(trace)
+    await trace_store.upsert_span(trace_id, span)
     
     return SpanResponse(
         id=span.id,
         trace_id=span.trace_id,
         parent_span_id=span.parent_span_id,
         name=span.name,
-        kind=span.kind.value if isinstance(span.kind, SpanKind) else span.kind,
-        status=span.status.value if isinstance(span.status, SpanStatus) else span.status,
+        kind=span.kind.value,
+        status=span.status.value,
         start_time=span.start_time.isoformat(),
         end_time=span.end_time.isoformat() if span.end_time else None,
         duration_ms=span.duration_ms,
@@ -673,6 +765,51 @@ async def update_span(
     )
 
 
+@router.post("/spans/batch")
+async def create_spans_batch(
+    spans: List[CreateSpanRequest] = Body(..., max_length=MAX_SPAN_BATCH),
+    current_user: dict = Depends(require_auth),
+):
+    """
+    Create many spans in one call.
+    
+    Each trace touched is loaded and saved once.
+    """
+    org_id = current_user["org_id"]
+    
+    by_trace: Dict[str, List[int]] = {}
+    for i, span_request in enumerate(spans):
+        by_trace.setdefault(span_request.trace_id, []).append(i)
+    
+    processed = 0
+    errors = []
+    traces = await trace_store.get_traces_bulk(list(by_trace))
+    modified = []
+    
+    for trace_id, indexes in by_trace.items():
+        trace = traces.get(trace_id)
+        if not trace or trace.org_id != org_id:
+            errors.extend({"index": i, "error": "Trace not found"} for i in indexes)
+            continue
+        
+        for i in indexes:
+            try:
+                trace.add_span(_build_span(spans[i], org_id))
+                processed += 1
+            except Exception as e:
+                errors.append({"index": i, "error": str(e)})
+        modified.append(trace)
+    
+    await trace_store.save_traces_bulk(modified)
+    errors.sort(key=lambda e: e["index"])
+    
+    return {
+        "success": len(errors) == 0,
+        "processed": processed,
+        "errors": errors,
+    }
+
+
 # =============================================================================
 # SESSION ENDPOINTS
 # =============================================================================
@@ -720,7 +857,11 @@ async def get_session(
     """Get a session by ID."""
     org_id = current_user["org_id"]
     
-    session = await trace_store.get_session(session_id)
+    # Counts come from the store's session rollup rather than the traces
+    session, (trace_count, total_tokens, total_cost_usd) = await asyncio.gather(
+        trace_store.get_session(session_id),
+        trace_store.session_aggregate(session_id),
+    )
     
     if not session:
         raise HTTPException(404, "Session not found")
@@ -728,12 +869,9 @@ async def get_session(
     if session.org_id != org_id:
         raise HTTPException(403, "Access denied")
     
-    # Get traces for session to update counts
-    traces = await trace_store.list_traces(org_id=org_id, session_id=session_id, limit=1000)
-    
-    session.trace_count = len(traces)
-    session.total_tokens = sum(t.total_tokens for t in traces)
-    session.total_cost_usd = sum(t.total_cost_usd for t in traces)
+    session.trace_count = trace_count
+    session.total_tokens = total_tokens
+    session.total_cost_usd = total_cost_usd
     
     return SessionResponse(
         id=session.id,
@@ -751,11 +889,13 @@ async def get_session(
 @router.get("/sessions/{session_id}/traces", response_model=List[TraceResponse])
 async def list_session_traces(
     session_id: str,
+    response: Response,
     limit: int = Query(50, ge=1, le=200),
-    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    offset: int = Query(0, ge=0, deprecated=True),
     current_user: dict = Depends(require_auth),
 ):
-    """List all traces in a session."""
+    """List all traces in a session, paged by the X-Next-Cursor header."""
     org_id = current_user["org_id"]
     
     traces = await trace_store.list_traces(
@@ -763,55 +903,24 @@ async def list_session_traces(
         session_id=session_id,
         limit=limit,
         offset=offset,
+        before=_decode_trace_cursor(cursor),
     )
     
-    return [
-        TraceResponse(
-            id=t.id,
-            name=t.name,
-            status=t.status.value if isinstance(t.status, TraceStatus) else t.status,
-            start_time=t.start_time.isoformat(),
-            end_time=t.end_time.isoformat() if t.end_time else None,
-            duration_ms=t.duration_ms,
-            org_id=t.org_id,
-            user_id=t.user_id,
-            session_id=t.session_id,
-            span_count=t.span_count,
-            error_count=t.error_count,
-            total_tokens=t.total_tokens,
-            total_cost_usd=t.total_cost_usd,
-            tags=t.tags,
-            metadata=t.metadata,
-            input=t.input,
-            output=t.output,
-        )
-        for t in traces
-    ]
+    page = [TraceResponse.from_trace(t) for t in traces]
+    _set_next_cursor(response, page, limit)
+    return page
 
 
 # =============================================================================
 # STATS ENDPOINTS
 # =============================================================================
 
-@router.get("/stats", response_model=TracingStatsResponse)
-async def get_tracing_stats(
-    days: int = Query(7, ge=1, le=90),
-    current_user: dict = Depends(require_auth),
-):
-    """
-    Get tracing statistics for the organization.
-    
-    Provides aggregate metrics over the specified time period.
-    """
-    org_id = current_user["org_id"]
-    
-    # Get all traces for the period
-    traces = await trace_store.list_traces(org_id=org_id, limit=10000)
-    
-    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
-    traces = [t for t in traces if t.start_time >= cutoff]
+async def _compute_tracing_stats(org_id: str, days: int) -> Dict[str, Any]:
+    """Build the /stats payload from the store's rollups."""
+    # Everything comes from the store's daily rollups (whole UTC days)
+    totals = await trace_store.get_daily_stats(org_id, days)
     
-    if not traces:
+    if not totals["traces"]:
         return TracingStatsResponse(
             total_traces=0,
             total_spans=0,
@@ -822,55 +931,75 @@ async def get_tracing_stats(
             traces_by_status={},
             spans_by_kind={},
             top_models=[],
-        )
+        ).model_dump()
     
-    # Calculate stats
-    total_spans = sum(t.span_count for t in traces)
-    total_tokens = sum(t.total_tokens for t in traces)
-    total_cost = sum(t.total_cost_usd for t in traces)
-    avg_latency = sum(t.duration_ms for t in traces) / len(traces)
-    error_count = sum(1 for t in traces if t.status == TraceStatus.ERROR)
-    error_rate = error_count / len(traces) if traces else 0
+    total_traces = int(totals["traces"])
+    avg_latency = totals["latency_ms"] / total_traces
+    error_rate = totals["errors"] / total_traces
     
-    # Group by status
+    # Breakdowns live under tuple keys in the same rollups; status and kind
+    # counts can drop to zero as traces move between states
     traces_by_status = {}
-    for t in traces:
-        status = t.status.value if isinstance(t.status, TraceStatus) else t.status
-        traces_by_status[status] = traces_by_status.get(status, 0) + 1
-    
-    # Group spans by kind
     spans_by_kind = {}
     model_usage = {}
-    
-    for t in traces:
-        for s in t.spans:
-            kind = s.kind.value if isinstance(s.kind, SpanKind) else s.kind
-            spans_by_kind[kind] = spans_by_kind.get(kind, 0) + 1
-            
-            if s.model:
-                if s.model not in model_usage:
-                    model_usage[s.model] = {"count": 0, "tokens": 0, "cost": 0}
-                model_usage[s.model]["count"] += 1
-                model_usage[s.model]["tokens"] += s.metrics.total_tokens
-                model_usage[s.model]["cost"] += s.metrics.cost_usd
-    
-    top_models = sorted(
-        [{"model": k, **v} for k, v in model_usage.items()],
+    for key, value in totals.items():
+        if not isinstance(key, tuple) or value <= 0:
+            continue
+        if key[0] == "status":
+            traces_by_status[key[1]] = int(value)
+        elif key[0] == "kind":
+            spans_by_kind[key[1]] = int(value)
+        elif key[0] == "model":
+            model_usage.setdefault(key[1], {"count": 0, "tokens": 0, "cost": 0})[key[2]] = value
+    
+    top_models = heapq.nlargest(
+        10,
+        ({"model": k, **v} for k, v in model_usage.items() if v["count"] > 0),
         key=lambda x: x["count"],
-        reverse=True
-    )[:10]
+    )
     
     return TracingStatsResponse(
-        total_traces=len(traces),
-        total_spans=total_spans,
-        total_tokens=total_tokens,
-        total_cost_usd=total_cost,
+        total_traces=total_traces,
+        total_spans=int(totals["spans"]),
+        total_tokens=int(totals["tokens"]),
+        total_cost_usd=totals["cost_usd"],
         avg_latency_ms=avg_latency,
         error_rate=error_rate,
         traces_by_status=traces_by_status,
         spans_by_kind=spans_by_kind,
         top_models=top_models,
+    ).model_dump()
+
+
+@router.get("/stats", response_model=TracingStatsResponse)
+async def get_tracing_stats(
+    response: Response,
+    days: int = Query(7, ge=1, le=90),
+    if_none_match: Optional[str] = Header(None),
+    current_user: dict = Depends(require_auth),
+):
+    """
+    Get tracing statistics for the organization.
+    
+    Provides aggregate metrics over the specified time period. Responses are
+    cached until the org's traces change; supports If-None-Match.
+    """
+    org_id = current_user["org_id"]
+    
+    # The window moves at midnight UTC, so the day is part of the version
+    version = f"{BOOT_ID}-{trace_store.org_version(org_id)}-{days}-{datetime.now(timezone.utc).date().isoformat()}"
+    etag = f'W/"s{version}"'
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    payload = await response_cache.cached(
+        f"tracing_stats:{org_id}:{version}",
+        STATS_CACHE_TTL_SECONDS,
+        lambda: _compute_tracing_stats(org_id, days),
     )
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = f"private, max-age={STATS_CACHE_TTL_SECONDS}"
+    return payload
 
 
 # =============================================================================
@@ -926,35 +1055,32 @@ async def ingest_events(
     processed = 0
     errors = []
     
+    # Classify first so each trace is fetched and saved once per batch
+    new_traces: Dict[str, Trace] = {}
+    new_sessions: List[Session] = []
+    span_events: Dict[str, List[int]] = {}
+    
     for i, event in enumerate(request.batch):
         try:
             if event.type == "trace":
                 trace = Trace.from_dict({**event.body, "org_id": org_id})
-                await trace_store.save_trace(trace)
+                new_traces[trace.id] = trace
                 processed += 1
             
             elif event.type == "span":
                 trace_id = event.body.get("trace_id")
                 if trace_id:
-                    trace = await trace_store.get_trace(trace_id)
-                    if trace:
-                        span = Span.from_dict({**event.body, "org_id": org_id})
-                        trace.add_span(span)
-                        await trace_store.save_trace(trace)
-                        processed += 1
-                    else:
-                        errors.append({"index": i, "error": "Trace not found"})
+                    span_events.setdefault(trace_id, []).append(i)
                 else:
                     errors.append({"index": i, "error": "trace_id required"})
             
             elif event.type == "session":
-                session = Session(
+                new_sessions.append(Session(
                     org_id=org_id,
                     name=event.body.get("name", "Session"),
                     user_id=event.body.get("user_id"),
                     metadata=event.body.get("metadata", {}),
-                )
-                await trace_store.save_session(session)
+                ))
                 processed += 1
             
             else:
@@ -963,6 +1089,31 @@ async def ingest_events(
         except Exception as e:
             errors.append({"index": i, "error": str(e)})
     
+    traces = {
+        **await trace_store.get_traces_bulk([tid for tid in span_events if tid not in new_traces]),
+        **new_traces,
+    }
+    modified = dict(new_traces)
+    
+    for trace_id, indexes in span_events.items():
+        trace = traces.get(trace_id)
+        if not trace:
+            errors.extend({"index": i, "error": "Trace not found"} for i in indexes)
+            continue
+        for i in indexes:
+            try:
+                trace.add_span(Span.from_dict({**request.batch[i].body, "org_id": org_id}))
+                modified[trace_id] = trace
+                processed += 1
+            except Exception as e:
+                errors.append({"index": i, "error": str(e)})
+    
+    # One store write per kind for the whole batch
+    if new_sessions:
+        await trace_store.save_sessions_bulk(new_sessions)
+    await trace_store.save_traces_bulk(list(modified.values()))
+    errors.sort(key=lambda e: e["index"])
+    
     return IngestionResponse(
         success=len(errors) == 0,
         processed=processed,
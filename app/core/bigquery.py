@@ -18,11 +18,15 @@ from __future__ import annotations
 import os
 import asyncio
 import logging
-from datetime import datetime, timezone, timedelta
-from typing import Optional, List, Dict, Any
+import itertools
+import threading
+from datetime import date, datetime, timezone, timedelta
+from typing import Optional, List, Dict, Any, Callable, Tuple
 from dataclasses import dataclass, asdict
 from concurrent.futures import ThreadPoolExecutor
 
+import orjson
+
 logger = logging.getLogger("llmobs.bigquery")
 
 # BigQuery availability
@@ -34,11 +38,27 @@ except ImportError:
     BIGQUERY_AVAILABLE = False
     bigquery = None
 
+# Storage Write API (optional, falls back to insert_rows_json)
+try:
+    from google.cloud import bigquery_storage_v1
+    from google.cloud.bigquery_storage_v1 import types as bq_storage_types
+    from google.cloud.bigquery_storage_v1 import writer as bq_storage_writer
+    from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
+    BIGQUERY_STORAGE_AVAILABLE = True
+except ImportError:
+    BIGQUERY_STORAGE_AVAILABLE = False
+    bigquery_storage_v1 = None
+
 # Configuration
 BIGQUERY_PROJECT = os.getenv("GOOGLE_CLOUD_PROJECT", os.getenv("GCP_PROJECT", "llm-observability-copilot"))
 BIGQUERY_DATASET = os.getenv("BIGQUERY_DATASET", "llm_observability")
 BIGQUERY_TABLE = os.getenv("BIGQUERY_TABLE", "request_logs")
 
+# Storage Write API: batches are split into chunks of APPEND_CHUNK_ROWS and
+# appended concurrently, round-robin over this many default-stream connections
+APPEND_STREAM_POOL_SIZE = int(os.getenv("BIGQUERY_APPEND_STREAMS", "8"))
+APPEND_CHUNK_ROWS = 500
+
 
 # =============================================================================
 # SCHEMA DEFINITION
@@ -101,6 +121,101 @@ REQUEST_LOGS_SCHEMA = [
 ] if BIGQUERY_AVAILABLE else []
 
 
+# Defaults for the columns _prepare_row copies from a log; built once and
+# copied per row, then overlaid with the keys the log actually has
+_DEFAULT_ROW: Dict[str, Any] = {
+    "id": "",
+    "org_id": "",
+    "api_key_id": None,
+    "user_id": None,
+    "session_id": None,
+    "trace_id": None,
+    "provider": "unknown",
+    "model": "unknown",
+    "endpoint": None,
+    "latency_ms": 0,
+    "time_to_first_token_ms": None,
+    "prompt_tokens": 0,
+    "completion_tokens": 0,
+    "total_tokens": 0,
+    "cost_usd": 0.0,
+    "status": "unknown",
+    "status_code": 0,
+    "error_type": None,
+    "error_message": None,
+    "is_streaming": False,
+    "stream_chunks": 0,
+    "cached": False,
+    "cache_hit": False,
+    "tags": (),
+}
+_ROW_KEYS = frozenset(_DEFAULT_ROW)
+
+
+# =============================================================================
+# STORAGE WRITE API ROW ENCODING
+# =============================================================================
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _timestamp_micros(value: Any) -> int:
+    """TIMESTAMP columns are written as microseconds since the epoch."""
+    dt = value if isinstance(value, datetime) else datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - _EPOCH) // timedelta(microseconds=1)
+
+
+def _epoch_days(value: Any) -> int:
+    """DATE columns are written as days since the epoch."""
+    d = value if isinstance(value, date) else date.fromisoformat(value)
+    return d.toordinal() - _EPOCH_ORDINAL
+
+
+# BigQuery column type -> (proto field type name, value coercion)
+_PROTO_COLUMN_TYPES: Dict[str, Tuple[str, Callable[[Any], Any]]] = {
+    "STRING": ("TYPE_STRING", str),
+    "JSON": ("TYPE_STRING", str),
+    "INTEGER": ("TYPE_INT64", int),
+    "FLOAT": ("TYPE_DOUBLE", float),
+    "BOOLEAN": ("TYPE_BOOL", bool),
+    "TIMESTAMP": ("TYPE_INT64", _timestamp_micros),
+    "DATE": ("TYPE_INT32", _epoch_days),
+}
+
+
+def _build_row_proto(schema: List[Any]) -> Tuple[Any, Any]:
+    """
+    Build a proto2 message for rows of a BigQuery schema.
+    
+    Returns (DescriptorProto for the stream's writer schema, message class).
+    Every column is optional, so unset fields are written as NULL.
+    """
+    field_proto = descriptor_pb2.FieldDescriptorProto
+    file_proto = descriptor_pb2.FileDescriptorProto(
+        name="tracevox_request_log_row.proto", package="tracevox", syntax="proto2",
+    )
+    message = file_proto.message_type.add(name="RequestLogRow")
+    for number, column in enumerate(schema, start=1):
+        message.field.add(
+            name=column.name,
+            number=number,
+            type=getattr(field_proto, _PROTO_COLUMN_TYPES[column.field_type][0]),
+            label=field_proto.LABEL_REPEATED if column.mode == "REPEATED" else field_proto.LABEL_OPTIONAL,
+        )
+    
+    pool = descriptor_pool.DescriptorPool()
+    pool.AddSerializedFile(file_proto.SerializeToString())
+    descriptor = pool.FindMessageTypeByName("tracevox.RequestLogRow")
+    if hasattr(message_factory, "GetMessageClass"):
+        row_class = message_factory.GetMessageClass(descriptor)
+    else:
+        row_class = message_factory.MessageFactory(pool).GetPrototype(descriptor)
+    return message, row_class
+
+
 # =============================================================================
 # BIGQUERY CLIENT
 # =============================================================================
@@ -114,6 +229,10 @@ class BigQueryAnalytics:
     - Batch inserts
     - Analytics queries
     - Export to CSV/JSON
+    
+    Inserts go through the Storage Write API default stream (protobuf rows
+    over one long-lived gRPC stream) when google-cloud-bigquery-storage is
+    installed, and through insert_rows_json otherwise.
     """
     
     def __init__(
@@ -128,7 +247,16 @@ class BigQueryAnalytics:
         self._client: Optional[bigquery.Client] = None
         self._table_ref = None
         self._initialized = False
-        self._executor = ThreadPoolExecutor(max_workers=4)
+        self._executor = ThreadPoolExecutor(max_workers=max(4, APPEND_STREAM_POOL_SIZE))
+        
+        # Storage Write API state, set up in initialize()
+        self._writer = None
+        self._row_descriptor = None
+        self._row_class = None
+        self._row_coercers: Dict[str, Tuple[bool, Callable[[Any], Any]]] = {}
+        self._append_streams: List[Any] = [None] * APPEND_STREAM_POOL_SIZE
+        self._append_locks = [threading.Lock() for _ in range(APPEND_STREAM_POOL_SIZE)]
+        self._next_stream = itertools.count()
     
     @property
     def full_table_id(self) -> str:
@@ -156,6 +284,9 @@ class BigQueryAnalytics:
             # Ensure table exists with schema
             await self._ensure_table()
             
+            if BIGQUERY_STORAGE_AVAILABLE:
+                self._init_writer()
+            
             self._initialized = True
             logger.info(f"BigQuery initialized: {self.full_table_id}")
             return True
@@ -196,38 +327,36 @@ class BigQueryAnalytics:
         
         self._table_ref = table_ref
     
+    def _init_writer(self) -> None:
+        """Set up the Storage Write API client and row encoding."""
+        try:
+            self._row_descriptor, self._row_class = _build_row_proto(REQUEST_LOGS_SCHEMA)
+            self._row_coercers = {
+                column.name: (column.mode == "REPEATED", _PROTO_COLUMN_TYPES[column.field_type][1])
+                for column in REQUEST_LOGS_SCHEMA
+            }
+            self._writer = bigquery_storage_v1.BigQueryWriteClient()
+            logger.info("BigQuery Storage Write API enabled")
+        except Exception as e:
+            self._writer = None
+            logger.warning(f"Storage Write API unavailable, using insert_rows_json: {e}")
+    
+    async def close(self) -> None:
+        """Close the append streams (called on shutdown)."""
+        for slot, lock in enumerate(self._append_locks):
+            with lock:
+                if self._append_streams[slot] is not None:
+                    self._append_streams[slot].close()
+                    self._append_streams[slot] = None
+    
     # =========================================================================
     # INSERT
     # =========================================================================
     
     def _prepare_row(self, log: Dict[str, Any]) -> Dict[str, Any]:
         """Prepare a log entry for BigQuery insertion."""
-        row = {
-            "id": log.get("id", ""),
-            "org_id": log.get("org_id", ""),
-            "api_key_id": log.get("api_key_id"),
-            "user_id": log.get("user_id"),
-            "session_id": log.get("session_id"),
-            "trace_id": log.get("trace_id"),
-            "provider": log.get("provider", "unknown"),
-            "model": log.get("model", "unknown"),
-            "endpoint": log.get("endpoint"),
-            "latency_ms": log.get("latency_ms", 0),
-            "time_to_first_token_ms": log.get("time_to_first_token_ms"),
-            "prompt_tokens": log.get("prompt_tokens", 0),
-            "completion_tokens": log.get("completion_tokens", 0),
-            "total_tokens": log.get("total_tokens", 0),
-            "cost_usd": log.get("cost_usd", 0.0),
-            "status": log.get("status", "unknown"),
-            "status_code": log.get("status_code", 0),
-            "error_type": log.get("error_type"),
-            "error_message": log.get("error_message"),
-            "is_streaming": log.get("is_streaming", False),
-            "stream_chunks": log.get("stream_chunks", 0),
-            "cached": log.get("cached", False),
-            "cache_hit": log.get("cache_hit", False),
-            "tags": log.get("tags", []),
-        }
+        row = _DEFAULT_ROW.copy()
+        row.update({key: log[key] for key in _ROW_KEYS & log.keys()})
         
         # Handle timestamps
         created_at = log.get("created_at")
@@ -268,26 +397,100 @@ class BigQueryAnalytics:
         # Metadata as JSON
         metadata = log.get("metadata")
         if metadata:
-            import json
-            row["metadata"] = json.dumps(metadata)
+            row["metadata"] = orjson.dumps(metadata).decode()
         
         return row
     
+    def _encode_row(self, row: Dict[str, Any]) -> bytes:
+        """Serialize a prepared row as a RequestLogRow message."""
+        message = self._row_class()
+        for name, value in row.items():
+            if value is None:
+                continue
+            repeated, coerce = self._row_coercers[name]
+            if repeated:
+                getattr(message, name).extend(coerce(v) for v in value)
+            else:
+                setattr(message, name, coerce(value))
+        return message.SerializeToString()
+    
+    def _get_append_stream(self, slot: int):
+        if self._append_streams[slot] is None:
+            template = bq_storage_types.AppendRowsRequest(
+                write_stream=self._writer.table_path(self.project_id, self.dataset_id, self.table_id) + "/streams/_default",
+                proto_rows=bq_storage_types.AppendRowsRequest.ProtoData(
+                    writer_schema=bq_storage_types.ProtoSchema(proto_descriptor=self._row_descriptor),
+                ),
+            )
+            self._append_streams[slot] = bq_storage_writer.AppendRowsStream(self._writer, template)
+        return self._append_streams[slot]
+    
+    def _append_rows(self, rows: List[Dict[str, Any]], slot: int) -> int:
+        """Append rows on one pooled stream (blocking); returns rows written."""
+        request = bq_storage_types.AppendRowsRequest(
+            proto_rows=bq_storage_types.AppendRowsRequest.ProtoData(
+                rows=bq_storage_types.ProtoRows(serialized_rows=[self._encode_row(r) for r in rows]),
+            ),
+        )
+        with self._append_locks[slot]:
+            stream = self._get_append_stream(slot)
+            future = stream.send(request)
+        
+        try:
+            response = future.result()
+        except Exception:
+            # Drop the broken stream; the next append on this slot opens a new one
+            with self._append_locks[slot]:
+                if self._append_streams[slot] is stream:
+                    stream.close()
+                    self._append_streams[slot] = None
+            raise
+        
+        if response.row_errors:
+            # A request with row errors is rejected as a whole
+            logger.error(f"BigQuery append row errors: {list(response.row_errors)[:5]}")
+            return 0
+        return len(rows)
+    
+    async def _write_rows(self, rows: List[Dict[str, Any]]) -> int:
+        """Write prepared rows; returns the number written."""
+        if self._writer is not None:
+            loop = asyncio.get_running_loop()
+            chunks = [rows[i:i + APPEND_CHUNK_ROWS] for i in range(0, len(rows), APPEND_CHUNK_ROWS)]
+            results = await asyncio.gather(
+                *(
+                    loop.run_in_executor(
+                        self._executor,
+                        self._append_rows,
+                        chunk,
+                        next(self._next_stream) % APPEND_STREAM_POOL_SIZE,
+                    )
+                    for chunk in chunks
+                ),
+                return_exceptions=True,
+            )
+            
+            written = 0
+            for chunk, result in zip(chunks, results):
+                if isinstance(result, Exception):
+                    logger.error(f"BigQuery append of {len(chunk)} rows failed: {result}")
+                else:
+                    written += result
+            return written
+        
+        errors = self._client.insert_rows_json(self.full_table_id, rows)
+        if errors:
+            logger.error(f"BigQuery insert errors: {errors}")
+            return len(rows) - len(errors)
+        return len(rows)
+    
     async def insert(self, log: Dict[str, Any]) -> bool:
         """Insert a single log entry."""
         if not self.is_available:
             return False
         
         try:
-            row = self._prepare_row(log)
-            errors = self._client.insert_rows_json(self.full_table_id, [row])
-            
-            if errors:
-                logger.error(f"BigQuery insert errors: {errors}")
-                return False
-            
-            return True
-            
+            return await self._write_rows([self._prepare_row(log)]) == 1
         except Exception as e:
             logger.error(f"BigQuery insert failed: {e}")
             return False
@@ -303,14 +506,7 @@ class BigQueryAnalytics:
         
         try:
             rows = [self._prepare_row(log) for log in logs]
-            errors = self._client.insert_rows_json(self.full_table_id, rows)
-            
-            if errors:
-                logger.error(f"BigQuery batch insert errors: {errors}")
-                return len(rows) - len(errors)
-            
-            return len(rows)
-            
+            return await self._write_rows(rows)
         except Exception as e:
             logger.error(f"BigQuery batch insert failed: {e}")
             return 0
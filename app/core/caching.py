@@ -338,3 +338,7 @@ class ResponseCache:
 response_cache = ResponseCache()
 request_hasher = RequestHasher()
 
+# Deterministic playground runs; kept apart from the gateway cache since
+# entries hold rendered playground results rather than provider bodies
+playground_cache = ResponseCache(max_entries=5000)
+
@@ -0,0 +1,291 @@
+"""
+Outbound Email Queue
+
+Request handlers enqueue email jobs instead of sending inline; a worker
+drains them in batches of up to EMAIL_BATCH_SIZE and delivers each batch
+with a single Resend batch request.
+
+Jobs go to the Redis stream "emails:outbound" (consumer group
+"email-workers") when REDIS_URL is configured, so any API instance or a
+dedicated worker (`python -m app.core.email_queue`) can deliver them.
+Without Redis, jobs are held in an in-process queue drained by the API's
+own worker task.
+"""
+
+from __future__ import annotations
+import os
+import socket
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import orjson
+
+from app.core.notifications import EmailRejectedError, build_invite_email, send_email_batch
+from app.core.redis_client import ResponseError, get_redis
+
+logger = logging.getLogger("tracevox.email_queue")
+
+EMAIL_STREAM = "emails:outbound"
+# Jobs that were rejected or ran out of attempts, kept for inspection
+EMAIL_DEAD_STREAM = "emails:dead"
+EMAIL_GROUP = "email-workers"
+EMAIL_BATCH_SIZE = 50
+EMAIL_BATCH_WINDOW_SECONDS = 1.0
+# Stream entries left unacknowledged this long (failed delivery, or a
+# worker that died mid-batch) are claimed and retried
+EMAIL_PENDING_IDLE_SECONDS = 60
+# Deliveries attempted per job before it is dead-lettered
+EMAIL_MAX_ATTEMPTS = 5
+
+# Template name -> renderer(vars) returning (subject, html)
+TEMPLATES: Dict[str, Callable[..., Tuple[str, str]]] = {
+    "invite": build_invite_email,
+}
+
+_redis = get_redis()
+_memory_queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+_worker_task: Optional[asyncio.Task] = None
+# In-memory jobs waiting out their retry delay: id(job) -> (timer, job)
+_memory_retries: Dict[int, Tuple[asyncio.TimerHandle, Dict[str, Any]]] = {}
+
+
+async def enqueue(to: str, template: str, vars: Dict[str, Any]) -> None:
+    """Queue an email for batched delivery."""
+    job = {"to": to, "template": template, "vars": vars}
+    if _redis is not None:
+        try:
+            await _redis.xadd(EMAIL_STREAM, {"job": orjson.dumps(job)})
+            return
+        except Exception as e:
+            logger.warning(f"Email enqueue to Redis failed, queueing in memory: {e}")
+    _memory_queue.put_nowait(job)
+
+
+def _render(job: Dict[str, Any]) -> Optional[Dict[str, str]]:
+    """Render a queued job into a Resend message, or None if it can't be."""
+    renderer = TEMPLATES.get(job.get("template"))
+    if renderer is None:
+        logger.error(f"Unknown email template: {job.get('template')}")
+        return None
+    try:
+        subject, html_content = renderer(**job.get("vars", {}))
+    except Exception as e:
+        logger.error(f"Failed to render {job.get('template')} email: {e}")
+        return None
+    return {"to": job["to"], "subject": subject, "html": html_content}
+
+
+async def _deliver(jobs: List[Dict[str, Any]]) -> Tuple[List[int], List[int]]:
+    """
+    Send a batch of jobs.
+
+    Returns (failed, rejected) job indexes: failed jobs may go through on a
+    retry, rejected ones never will. A rejected batch is re-sent one message
+    at a time so only the bad messages are rejected.
+    """
+    rendered = []
+    rejected = []
+    for i, job in enumerate(jobs):
+        message = _render(job)
+        if message is None:
+            rejected.append(i)
+        else:
+            rendered.append((i, message))
+    if not rendered:
+        return [], rejected
+
+    try:
+        accepted = await send_email_batch([message for _, message in rendered])
+    except EmailRejectedError:
+        if len(rendered) == 1:
+            return [], rejected + [rendered[0][0]]
+        failed = []
+        for i, message in rendered:
+            try:
+                if await send_email_batch([message]) < 1:
+                    failed.append(i)
+            except EmailRejectedError:
+                rejected.append(i)
+        return failed, rejected
+
+    if accepted < len(rendered):
+        return [i for i, _ in rendered], rejected
+    return [], rejected
+
+
+def _requeue_memory(job: Dict[str, Any]) -> None:
+    """Put a job whose retry delay has passed back on the memory queue."""
+    _memory_retries.pop(id(job), None)
+    _memory_queue.put_nowait(job)
+
+
+async def _deliver_memory(batch: List[Dict[str, Any]], final: bool = False) -> None:
+    """Deliver in-memory jobs, scheduling failed ones for a bounded retry."""
+    failed, rejected = await _deliver(batch)
+    for i in rejected:
+        logger.error(f"Email to {batch[i]['to']} rejected, dropping it")
+    for i in failed:
+        job = batch[i]
+        attempts = job.get("attempts", 1)
+        if final or attempts >= EMAIL_MAX_ATTEMPTS:
+            logger.error(f"Email to {job['to']} failed after {attempts} attempts, dropping it")
+            continue
+        job = {**job, "attempts": attempts + 1}
+        timer = asyncio.get_running_loop().call_later(
+            EMAIL_PENDING_IDLE_SECONDS, _requeue_memory, job
+        )
+        _memory_retries[id(job)] = (timer, job)
+
+
+async def _drain_memory() -> None:
+    """Collect up to EMAIL_BATCH_SIZE jobs within the batch window and send them."""
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await _memory_queue.get()]
+        deadline = loop.time() + EMAIL_BATCH_WINDOW_SECONDS
+        while len(batch) < EMAIL_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(_memory_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        try:
+            await _deliver_memory(batch)
+        except Exception as e:
+            logger.error(f"Email batch delivery failed: {e}")
+
+
+async def _delivery_count(entry_id) -> int:
+    """How many times the group has handed out a pending stream entry."""
+    pending = await _redis.xpending_range(
+        EMAIL_STREAM, EMAIL_GROUP, min=entry_id, max=entry_id, count=1
+    )
+    return pending[0]["times_delivered"] if pending else 1
+
+
+async def _deliver_entries(entries) -> None:
+    """
+    Deliver stream entries, acknowledging them once delivered.
+
+    Failed entries stay pending for _reclaim_pending to retry until they
+    have been delivered EMAIL_MAX_ATTEMPTS times; those, and rejected
+    entries, are moved to EMAIL_DEAD_STREAM.
+    """
+    # Entries trimmed from the stream while pending come back without fields
+    live = [(entry_id, fields) for entry_id, fields in entries if fields]
+    done = [entry_id for entry_id, fields in entries if not fields]
+    failed, rejected = [], []
+    if live:
+        failed, rejected = await _deliver([orjson.loads(fields[b"job"]) for _, fields in live])
+
+    dead = {i: "rejected" for i in rejected}
+    for i in failed:
+        if await _delivery_count(live[i][0]) >= EMAIL_MAX_ATTEMPTS:
+            dead[i] = "max_attempts"
+    for i, reason in dead.items():
+        await _redis.xadd(EMAIL_DEAD_STREAM, {"job": live[i][1][b"job"], "reason": reason})
+        logger.error(f"Email stream entry {live[i][0]} dead-lettered: {reason}")
+
+    retry = set(failed) - set(dead)
+    done += [entry_id for i, (entry_id, _) in enumerate(live) if i not in retry]
+    if done:
+        await _redis.xack(EMAIL_STREAM, EMAIL_GROUP, *done)
+
+
+async def _reclaim_pending(consumer: str) -> None:
+    """Claim and retry entries left pending by failed or dead workers."""
+    start_id = "0-0"
+    while True:
+        response = await _redis.xautoclaim(
+            EMAIL_STREAM,
+            EMAIL_GROUP,
+            consumer,
+            min_idle_time=int(EMAIL_PENDING_IDLE_SECONDS * 1000),
+            start_id=start_id,
+            count=EMAIL_BATCH_SIZE,
+        )
+        start_id, entries = response[0], response[1]
+        if entries:
+            await _deliver_entries(entries)
+        if start_id in (b"0-0", "0-0"):
+            return
+
+
+async def _drain_redis() -> None:
+    """Consume the outbound stream as part of the email-workers group."""
+    consumer = f"{socket.gethostname()}-{os.getpid()}"
+    try:
+        await _redis.xgroup_create(EMAIL_STREAM, EMAIL_GROUP, id="0", mkstream=True)
+    except ResponseError:
+        pass  # Group already exists
+
+    loop = asyncio.get_running_loop()
+    next_reclaim = loop.time()
+    while True:
+        try:
+            # Failed batches stay pending; retry them once they have idled
+            if loop.time() >= next_reclaim:
+                next_reclaim = loop.time() + EMAIL_PENDING_IDLE_SECONDS
+                await _reclaim_pending(consumer)
+
+            response = await _redis.xreadgroup(
+                EMAIL_GROUP,
+                consumer,
+                {EMAIL_STREAM: ">"},
+                count=EMAIL_BATCH_SIZE,
+                block=int(EMAIL_BATCH_WINDOW_SECONDS * 1000),
+            )
+            for _, entries in response or []:
+                await _deliver_entries(entries)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Email stream consume failed: {e}")
+            await asyncio.sleep(EMAIL_BATCH_WINDOW_SECONDS)
+
+
+async def _run() -> None:
+    if _redis is not None:
+        await asyncio.gather(_drain_redis(), _drain_memory())
+    else:
+        await _drain_memory()
+
+
+def start_worker() -> None:
+    """Start the in-process email worker (called from app lifespan)."""
+    global _worker_task
+    if _worker_task is None or _worker_task.done():
+        _worker_task = asyncio.create_task(_run())
+
+
+async def stop_worker() -> None:
+    """Flush queued in-memory jobs and stop the worker."""
+    global _worker_task
+    if _worker_task is not None:
+        _worker_task.cancel()
+        try:
+            await _worker_task
+        except asyncio.CancelledError:
+            pass
+        _worker_task = None
+
+    pending = []
+    for timer, job in _memory_retries.values():
+        timer.cancel()
+        pending.append(job)
+    _memory_retries.clear()
+    while not _memory_queue.empty():
+        pending.append(_memory_queue.get_nowait())
+    for i in range(0, len(pending), EMAIL_BATCH_SIZE):
+        try:
+            await _deliver_memory(pending[i:i + EMAIL_BATCH_SIZE], final=True)
+        except Exception as e:
+            logger.error(f"Email batch delivery failed on shutdown: {e}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_run())
@@ -0,0 +1,79 @@
+"""
+Organization Member Count Cache
+
+Caches per-org membership counts so team-limit checks on invite don't
+stream every membership document. Counts are computed with Firestore's
+server-side COUNT aggregation and invalidated whenever a membership is
+added or removed.
+
+Backed by Redis when REDIS_URL is configured, otherwise by an in-process
+TTL dict. Disable with TEAM_MEMBER_COUNT_CACHE_ENABLED=false.
+"""
+
+from __future__ import annotations
+import os
+import time
+import logging
+from typing import Dict, Tuple
+
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger("tracevox.member_count_cache")
+
+TEAM_MEMBER_COUNT_CACHE_ENABLED = os.getenv("TEAM_MEMBER_COUNT_CACHE_ENABLED", "true").lower() in ("true", "1", "yes")
+MEMBER_COUNT_TTL_SECONDS = 300
+
+_memory: Dict[str, Tuple[float, int]] = {}
+_redis = get_redis()
+
+
+def _key(org_id: str) -> str:
+    return f"org:{org_id}:member_count"
+
+
+async def count_members(db, org_id: str) -> int:
+    """Count an org's memberships with a single COUNT aggregation read."""
+    query = db.collection("memberships").where("org_id", "==", org_id)
+    result = await query.count().get()
+    return int(result[0][0].value)
+
+
+async def get_member_count(db, org_id: str) -> int:
+    """Return the cached member count for org_id, computing it on a miss."""
+    if not TEAM_MEMBER_COUNT_CACHE_ENABLED:
+        return await count_members(db, org_id)
+
+    key = _key(org_id)
+    if _redis is not None:
+        try:
+            raw = await _redis.get(key)
+            if raw is not None:
+                return int(raw)
+        except Exception as e:
+            logger.warning(f"Member count cache get failed: {e}")
+    else:
+        entry = _memory.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+
+    count = await count_members(db, org_id)
+
+    if _redis is not None:
+        try:
+            await _redis.set(key, count, ex=MEMBER_COUNT_TTL_SECONDS)
+        except Exception as e:
+            logger.warning(f"Member count cache set failed: {e}")
+    else:
+        _memory[key] = (time.monotonic() + MEMBER_COUNT_TTL_SECONDS, count)
+    return count
+
+
+async def invalidate(org_id: str) -> None:
+    """Drop the cached member count for org_id after membership changes."""
+    key = _key(org_id)
+    _memory.pop(key, None)
+    if _redis is not None:
+        try:
+            await _redis.delete(key)
+        except Exception as e:
+            logger.warning(f"Member count cache invalidate failed: {e}")
@@ -12,6 +12,7 @@ and webhooks for Slack/Discord integration.
 """
 
 import os
+import html
 import logging
 import httpx
 from typing import Optional, List, Dict, Any
@@ -175,6 +176,10 @@ def save_notification_settings(settings: dict, org_id: Optional[str] = None) ->
 # EMAIL NOTIFICATIONS
 # =============================================================================
 
+class EmailRejectedError(Exception):
+    """Resend refused a request as invalid (4xx); resending it won't help."""
+
+
 async def send_email(
     to_email: str,
     subject: str,
@@ -222,6 +227,58 @@ async def send_email(
         return False
 
 
+async def send_email_batch(messages: List[Dict[str, str]]) -> int:
+    """
+    Send several emails in one Resend batch request.
+    
+    Each message is {"to": ..., "subject": ..., "html": ...}. Returns the
+    number of messages accepted for delivery. Resend validates the whole
+    batch, so one bad message rejects all of them; that raises
+    EmailRejectedError, while transient failures return 0.
+    """
+    if not messages:
+        return 0
+    
+    if not RESEND_API_KEY:
+        for message in messages:
+            logger.info(f"📧 EMAIL (dev mode - not sent): {message['to']} - {message['subject']}")
+        return len(messages)
+    
+    try:
+        async with httpx.AsyncClient() as client:
+            response = await client.post(
+                "https://api.resend.com/emails/batch",
+                headers={
+                    "Authorization": f"Bearer {RESEND_API_KEY}",
+                    "Content-Type": "application/json",
+                },
+                json=[
+                    {
+                        "from": f"{FROM_NAME} <{FROM_EMAIL}>",
+                        "to": [message["to"]],
+                        "subject": message["subject"],
+                        "html": message["html"],
+                    }
+                    for message in messages
+                ],
+            )
+            
+            if response.status_code == 200:
+                logger.info(f"Batch of {len(messages)} emails sent")
+                return len(messages)
+            logger.error(f"Resend batch error: {response.status_code} - {response.text}")
+            # 429 is rate limiting, not a problem with the batch itself
+            if 400 <= response.status_code < 500 and response.status_code != 429:
+                raise EmailRejectedError(f"Resend rejected batch: {response.status_code}")
+            return 0
+                
+    except EmailRejectedError:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to send email batch: {e}")
+        return 0
+
+
 async def send_admin_notification(
     notification_type: NotificationType,
     data: Dict[str, Any],
@@ -409,6 +466,42 @@ async def send_welcome_email(
     return await send_email(user_email, subject, html_content)
 
 
+def build_invite_email(
+    org_name: str,
+    invite_url: str,
+    inviter_name: str,
+    message: Optional[str] = None,
+) -> tuple:
+    """
+    Build (subject, html) for a team invitation email.
+    """
+    subject = f"{inviter_name or 'A teammate'} invited you to join {org_name} on Tracevox"
+    
+    note = ""
+    if message:
+        note = f"""
+            <div style="background: white; padding: 20px; border-radius: 10px; margin-top: 20px; border: 1px solid #eee;">
+                <p style="margin: 0; white-space: pre-wrap;">{html.escape(message)}</p>
+            </div>"""
+    
+    html_content = f"""
+    <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
+        <div style="background: linear-gradient(135deg, #8B5CF6, #06B6D4); padding: 30px; border-radius: 10px 10px 0 0; text-align: center;">
+            <h1 style="color: white; margin: 0; font-size: 24px;">Join {html.escape(org_name)} on Tracevox</h1>
+        </div>
+        <div style="background: #f8f9fa; padding: 30px; border-radius: 0 0 10px 10px;">
+            <p style="font-size: 16px;">{html.escape(inviter_name or "A teammate")} has invited you to their Tracevox organization.</p>{note}
+            <div style="text-align: center; margin-top: 30px;">
+                <a href="{invite_url}" style="background: linear-gradient(135deg, #8B5CF6, #7C3AED); color: white; padding: 15px 30px; text-decoration: none; border-radius: 8px; font-weight: bold; display: inline-block;">Accept Invitation →</a>
+            </div>
+            <p style="color: #666; font-size: 12px; text-align: center; margin-top: 30px;">This invitation expires in 7 days.</p>
+        </div>
+    </div>
+    """
+    
+    return subject, html_content
+
+
 # =============================================================================
 # WEBHOOK NOTIFICATIONS (Slack / Discord)
 # =============================================================================
@@ -0,0 +1,46 @@
+"""
+Permission Bitmasks
+
+Each named permission maps to one bit so role checks compile down to a
+single integer AND. Role -> permission-name sets stay with the API that
+owns the roles (see app.api.team.ROLE_PERMISSIONS); this module only
+turns them into masks.
+"""
+
+from enum import IntFlag
+from typing import Dict, Iterable
+
+
+class Perm(IntFlag):
+    """Individual permission bits."""
+    ORG_DELETE = 1 << 0
+    ORG_MANAGE = 1 << 1
+    BILLING_MANAGE = 1 << 2
+    TEAM_MANAGE = 1 << 3
+    API_KEYS_MANAGE = 1 << 4
+    DASHBOARD_VIEW = 1 << 5
+    SETTINGS_MANAGE = 1 << 6
+    ALERTS_MANAGE = 1 << 7
+    ALERTS_VIEW = 1 << 8
+
+
+# Plain ints so hot-path checks avoid IntFlag object construction
+PERM_BY_NAME: Dict[str, int] = {
+    "org.delete": int(Perm.ORG_DELETE),
+    "org.manage": int(Perm.ORG_MANAGE),
+    "billing.manage": int(Perm.BILLING_MANAGE),
+    "team.manage": int(Perm.TEAM_MANAGE),
+    "api_keys.manage": int(Perm.API_KEYS_MANAGE),
+    "dashboard.view": int(Perm.DASHBOARD_VIEW),
+    "settings.manage": int(Perm.SETTINGS_MANAGE),
+    "alerts.manage": int(Perm.ALERTS_MANAGE),
+    "alerts.view": int(Perm.ALERTS_VIEW),
+}
+
+
+def to_mask(permissions: Iterable[str]) -> int:
+    """Combine permission names into a bitmask (unknown names raise KeyError)."""
+    mask = 0
+    for name in permissions:
+        mask |= PERM_BY_NAME[name]
+    return mask
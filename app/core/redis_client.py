@@ -0,0 +1,41 @@
+"""
+Shared Redis Client
+
+One process-wide async Redis client for the modules that use Redis when
+REDIS_URL is configured (response cache, member counts, email queue), so
+they share a connection pool. Callers fall back to in-process storage
+when get_redis() returns None.
+"""
+
+from __future__ import annotations
+import logging
+from typing import Optional
+
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import ResponseError
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+    aioredis = None
+    ResponseError = Exception
+
+from app.core.config import config
+
+logger = logging.getLogger("tracevox.redis")
+
+_client = None
+_initialized = False
+
+
+def get_redis() -> Optional["aioredis.Redis"]:
+    """Return the shared Redis client, or None when Redis is not configured."""
+    global _client, _initialized
+    if not _initialized:
+        _initialized = True
+        if config.redis_url and REDIS_AVAILABLE:
+            try:
+                _client = aioredis.from_url(config.redis_url)
+            except Exception as e:
+                logger.warning(f"Redis unavailable, using in-memory fallbacks: {e}")
+    return _client
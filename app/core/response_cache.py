@@ -0,0 +1,104 @@
+"""
+API Response Cache
+
+Short-lived cache for slow-changing GET responses (team member and invite
+lists, template details). Entries are keyed per org so writers can
+invalidate a single entry or everything for an org by key prefix.
+
+Backed by Redis when REDIS_URL is configured, otherwise by an in-process
+TTL dict that evicts least recently used entries when full.
+"""
+
+from __future__ import annotations
+import time
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Tuple
+
+import orjson
+
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger("tracevox.response_cache")
+
+KEY_PREFIX = "resp_cache:"
+MAX_MEMORY_ENTRIES = 10000
+
+_memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+_redis = get_redis()
+
+
+def _default(obj: Any) -> Any:
+    # Firestore timestamps are datetime subclasses, which orjson rejects
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError
+
+
+async def cached(key: str, ttl: int, producer: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Return the cached value for key, or await producer() and cache it.
+
+    Exceptions from producer propagate and nothing is cached.
+    """
+    full_key = KEY_PREFIX + key
+
+    if _redis is not None:
+        try:
+            raw = await _redis.get(full_key)
+            if raw is not None:
+                return orjson.loads(raw)
+        except Exception as e:
+            logger.warning(f"Response cache get failed: {e}")
+    else:
+        entry = _memory.get(full_key)
+        if entry and entry[0] > time.monotonic():
+            _memory.move_to_end(full_key)
+            return entry[1]
+
+    value = await producer()
+
+    if _redis is not None:
+        try:
+            await _redis.set(full_key, orjson.dumps(value, default=_default), ex=ttl)
+        except Exception as e:
+            logger.warning(f"Response cache set failed: {e}")
+    else:
+        now = time.monotonic()
+        if len(_memory) >= MAX_MEMORY_ENTRIES:
+            for k in [k for k, (expires_at, _) in _memory.items() if expires_at <= now]:
+                del _memory[k]
+        _memory[full_key] = (now + ttl, value)
+        _memory.move_to_end(full_key)
+        while len(_memory) > MAX_MEMORY_ENTRIES:
+            _memory.popitem(last=False)
+    return value
+
+
+async def invalidate(key: str) -> None:
+    """Drop a single cached response."""
+    full_key = KEY_PREFIX + key
+    _memory.pop(full_key, None)
+
+    if _redis is not None:
+        try:
+            await _redis.unlink(full_key)
+        except Exception as e:
+            logger.warning(f"Response cache invalidate failed: {e}")
+
+
+async def invalidate_prefix(prefix: str) -> None:
+    """Drop every cached response whose key starts with prefix."""
+    full_prefix = KEY_PREFIX + prefix
+
+    for key in [k for k in _memory if k.startswith(full_prefix)]:
+        _memory.pop(key, None)
+
+    if _redis is not None:
+        try:
+            keys = [k async for k in _redis.scan_iter(match=f"{full_prefix}*", count=500)]
+            if keys:
+                await _redis.unlink(*keys)
+        except Exception as e:
+            logger.warning(f"Response cache invalidate failed: {e}")
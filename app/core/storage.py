@@ -211,6 +211,8 @@ class DualWriteStorage:
         """Shutdown and flush buffers."""
         logger.info("Shutting down dual-write storage...")
         await self._bq_buffer.stop()
+        if self.bigquery:
+            await self.bigquery.close()
     
     # =========================================================================
     # WRITE OPERATIONS
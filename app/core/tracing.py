@@ -18,19 +18,47 @@ import asyncio
 import uuid
 import time
 import logging
-from datetime import datetime, timezone
+from collections import Counter
+from datetime import date, datetime, timezone, timedelta
 from dataclasses import dataclass, field
-from typing import Optional, Dict, List, Any, Union, Callable
+from typing import Optional, Dict, List, Any, Union, Callable, Tuple
 from enum import Enum
 import json
 import hashlib
 from contextlib import contextmanager, asynccontextmanager
 import threading
 import functools
+import itertools
+import heapq
+
+try:
+    import ciso8601
+    CISO8601_AVAILABLE = True
+except ImportError:
+    CISO8601_AVAILABLE = False
+    ciso8601 = None
 
 logger = logging.getLogger(__name__)
 
 
+def parse_iso(value: str) -> datetime:
+    """
+    Parse an ISO 8601 timestamp, including a trailing "Z".
+    
+    Uses ciso8601's C parser when installed; Python 3.11+ fromisoformat
+    handles "Z" natively otherwise. Timestamps without an offset are taken
+    as UTC, so parsed values always compare with aware datetimes. Raises
+    ValueError on invalid input.
+    """
+    if CISO8601_AVAILABLE:
+        parsed = ciso8601.parse_datetime(value)
+    else:
+        parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
 # =============================================================================
 # ENUMS
 # =============================================================================
@@ -193,6 +221,11 @@ class Span:
     # Computed
     level: int = 0  # Nesting level (0 = root)
     
+    def __post_init__(self):
+        # Normalize once so readers can use .value without type checks
+        self.kind = SpanKind(self.kind)
+        self.status = SpanStatus(self.status)
+    
     @property
     def duration_ms(self) -> int:
         """Calculate duration in milliseconds."""
@@ -217,7 +250,7 @@ class Span:
     ) -> "Span":
         """End the span with optional output."""
         self.end_time = datetime.now(timezone.utc)
-        self.status = status
+        self.status = SpanStatus(status)
         
         if output is not None:
             if isinstance(output, SpanOutput):
@@ -241,8 +274,8 @@ class Span:
             "trace_id": self.trace_id,
             "parent_span_id": self.parent_span_id,
             "name": self.name,
-            "kind": self.kind.value if isinstance(self.kind, SpanKind) else self.kind,
-            "status": self.status.value if isinstance(self.status, SpanStatus) else self.status,
+            "kind": self.kind.value,
+            "status": self.status.value,
             "start_time": self.start_time.isoformat() if self.start_time else None,
             "end_time": self.end_time.isoformat() if self.end_time else None,
             "duration_ms": self.duration_ms,
@@ -307,9 +340,9 @@ class Span:
         
         # Parse times
         if data.get("start_time"):
-            span.start_time = datetime.fromisoformat(data["start_time"].replace("Z", "+00:00"))
+            span.start_time = parse_iso(data["start_time"])
         if data.get("end_time"):
-            span.end_time = datetime.fromisoformat(data["end_time"].replace("Z", "+00:00"))
+            span.end_time = parse_iso(data["end_time"])
         
         # Parse input/output
         if data.get("input"):
@@ -367,6 +400,20 @@ class Trace:
     version: Optional[str] = None
     release: Optional[str] = None
     
+    # Derived, kept out of storage: parent_span_id -> child spans, and the
+    # last built span tree (cleared whenever the trace is saved)
+    _children: Optional[Dict[Optional[str], List[Span]]] = field(default=None, init=False, repr=False, compare=False)
+    _span_tree: Optional[List[Dict[str, Any]]] = field(default=None, init=False, repr=False, compare=False)
+    # span_id -> position in spans, built on first lookup and kept by add_span
+    _span_index: Optional[Dict[str, int]] = field(default=None, init=False, repr=False, compare=False)
+    # (datetime, isoformat) pairs, reused while the timestamp is unchanged
+    _start_iso: Optional[Tuple[datetime, str]] = field(default=None, init=False, repr=False, compare=False)
+    _end_iso: Optional[Tuple[datetime, str]] = field(default=None, init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        # Normalize once so readers can use .value without type checks
+        self.status = TraceStatus(self.status)
+    
     @property
     def duration_ms(self) -> int:
         """Calculate total duration in milliseconds."""
@@ -380,6 +427,29 @@ class Trace:
                 return int((latest_end - earliest).total_seconds() * 1000)
         return 0
     
+    @property
+    def status_value(self) -> str:
+        """Status as its string value."""
+        return self.status.value
+    
+    @property
+    def start_time_iso(self) -> Optional[str]:
+        """start_time in ISO 8601, formatted once per value."""
+        if not self.start_time:
+            return None
+        if self._start_iso is None or self._start_iso[0] is not self.start_time:
+            self._start_iso = (self.start_time, self.start_time.isoformat())
+        return self._start_iso[1]
+    
+    @property
+    def end_time_iso(self) -> Optional[str]:
+        """end_time in ISO 8601, formatted once per value."""
+        if not self.end_time:
+            return None
+        if self._end_iso is None or self._end_iso[0] is not self.end_time:
+            self._end_iso = (self.end_time, self.end_time.isoformat())
+        return self._end_iso[1]
+    
     @property
     def span_count(self) -> int:
         """Number of spans in this trace."""
@@ -407,12 +477,39 @@ class Trace:
         
         # Calculate level
         if span.parent_span_id:
-            parent = next((s for s in self.spans if s.id == span.parent_span_id), None)
+            parent = self.get_span(span.parent_span_id)
             span.level = parent.level + 1 if parent else 0
         
         self.spans.append(span)
+        if self._span_index is not None:
+            self._span_index[span.id] = len(self.spans) - 1
+        if self._children is not None:
+            self._children.setdefault(span.parent_span_id, []).append(span)
+        self._span_tree = None
         return span
     
+    def get_span(self, span_id: str) -> Optional[Span]:
+        """Look up a span by ID."""
+        if self._span_index is None:
+            self._span_index = {s.id: i for i, s in enumerate(self.spans)}
+        i = self._span_index.get(span_id)
+        return self.spans[i] if i is not None else None
+    
+    def replace_span(self, span: Span) -> Optional[Span]:
+        """Put span in place of the stored span with the same ID; returns the old span, or None."""
+        old = self.get_span(span.id)
+        if old is not None:
+            self.spans[self._span_index[span.id]] = span
+            self._children = None
+            self._span_tree = None
+        return old
+    
+    def invalidate_span_tree(self) -> None:
+        """Drop derived span structures after spans were changed in place."""
+        self._children = None
+        self._span_tree = None
+        self._span_index = None
+    
     def end(self) -> "Trace":
         """End the trace and calculate aggregates."""
         self.end_time = datetime.now(timezone.utc)
@@ -433,14 +530,20 @@ class Trace:
         return self
     
     def get_span_tree(self) -> List[Dict[str, Any]]:
-        """Get spans organized as a tree structure."""
-        # Build a map of parent -> children
-        children_map: Dict[Optional[str], List[Span]] = {}
-        for span in self.spans:
-            parent_id = span.parent_span_id
-            if parent_id not in children_map:
-                children_map[parent_id] = []
-            children_map[parent_id].append(span)
+        """
+        Get spans organized as a tree structure.
+        
+        The parent -> children map is maintained by add_span and the built
+        tree is reused until the trace changes.
+        """
+        if self._span_tree is not None:
+            return self._span_tree
+        
+        if self._children is None:
+            self._children = {}
+            for span in self.spans:
+                self._children.setdefault(span.parent_span_id, []).append(span)
+        children_map = self._children
         
         def build_tree(parent_id: Optional[str]) -> List[Dict[str, Any]]:
             children = children_map.get(parent_id, [])
@@ -452,16 +555,17 @@ class Trace:
                 for span in sorted(children, key=lambda s: s.start_time)
             ]
         
-        return build_tree(None)
+        self._span_tree = build_tree(None)
+        return self._span_tree
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary for storage/API."""
         return {
             "id": self.id,
             "name": self.name,
-            "status": self.status.value if isinstance(self.status, TraceStatus) else self.status,
-            "start_time": self.start_time.isoformat() if self.start_time else None,
-            "end_time": self.end_time.isoformat() if self.end_time else None,
+            "status": self.status_value,
+            "start_time": self.start_time_iso,
+            "end_time": self.end_time_iso,
             "duration_ms": self.duration_ms,
             "org_id": self.org_id,
             "user_id": self.user_id,
@@ -503,9 +607,9 @@ class Trace:
         
         # Parse times
         if data.get("start_time"):
-            trace.start_time = datetime.fromisoformat(data["start_time"].replace("Z", "+00:00"))
+            trace.start_time = parse_iso(data["start_time"])
         if data.get("end_time"):
-            trace.end_time = datetime.fromisoformat(data["end_time"].replace("Z", "+00:00"))
+            trace.end_time = parse_iso(data["end_time"])
         
         # Parse spans
         for span_data in data.get("spans", []):
@@ -581,9 +685,24 @@ def set_current_span(span: Optional[Span]) -> None:
 # TRACE STORAGE
 # =============================================================================
 
+# Write-behind persistence: saved traces are handed to the persistence hook
+# in batches (Firestore caps a WriteBatch at 500 writes)
+PERSIST_BATCH_SIZE = 500
+PERSIST_FLUSH_INTERVAL_SECONDS = 0.1
+
+
 class TraceStore:
     """
     In-memory trace storage with optional persistence hooks.
+    
+    Saves only mark a trace dirty; a background flusher passes dirty traces
+    to the persistence hook every PERSIST_FLUSH_INTERVAL_SECONDS, or as soon
+    as PERSIST_BATCH_SIZE are pending. Repeated saves of one trace (e.g. a
+    span per call) coalesce into a single write.
+    
+    Keeps per-org, per-day and per-session stat rollups up to date on every
+    save so stats reads never scan traces. Each trace's last contribution is
+    remembered and swapped out when the trace is saved again.
     """
     
     def __init__(self, max_traces: int = 10000):
@@ -594,49 +713,240 @@ class TraceStore:
         self._max_traces = max_traces
         self._lock = asyncio.Lock()
         self._persistence_hook: Optional[Callable] = None
+        self._dirty: Dict[str, None] = {}  # Insertion-ordered set of trace IDs
+        self._flush_now = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+        # (org_id, day) -> rollup counters; session_id -> rollup counters;
+        # trace_id -> (bucket key, session_id, contribution)
+        self._daily_stats: Dict[Tuple[str, date], Counter] = {}
+        self._session_stats: Dict[str, Counter] = {}
+        self._stats_contrib: Dict[str, Tuple[Tuple[str, date], Optional[str], Counter]] = {}
+        # Write counters for cache keys and ETags
+        self._trace_versions: Dict[str, int] = {}
+        self._org_versions: Dict[str, int] = {}
     
     def set_persistence_hook(self, hook: Callable) -> None:
-        """Set a hook for persisting traces (e.g., to Firestore/BigQuery)."""
+        """
+        Set a hook for persisting traces (e.g., to Firestore/BigQuery).
+        
+        The hook is awaited with a list of up to PERSIST_BATCH_SIZE traces.
+        Set from a running event loop, it also starts the flusher.
+        """
         self._persistence_hook = hook
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return  # start_flusher() picks it up once the app starts
+        self.start_flusher()
+    
+    async def flush(self) -> None:
+        """
+        Persist every dirty trace now.
+        
+        A batch the hook fails on is marked dirty again for the next flush.
+        """
+        while self._dirty and self._persistence_hook:
+            trace_ids = list(itertools.islice(self._dirty, PERSIST_BATCH_SIZE))
+            for trace_id in trace_ids:
+                del self._dirty[trace_id]
+            traces = [self._traces[tid] for tid in trace_ids if tid in self._traces]
+            try:
+                await self._persistence_hook(traces)
+            except Exception as e:
+                logger.error(f"Failed to persist {len(traces)} traces: {e}")
+                # Traces saved again meanwhile are already queued
+                for trace in traces:
+                    self._dirty.setdefault(trace.id, None)
+                return
+    
+    async def _flush_loop(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), PERSIST_FLUSH_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            await self.flush()
+    
+    def start_flusher(self) -> None:
+        """Start the background persistence flusher if a hook is set."""
+        if self._persistence_hook is None:
+            return
+        if self._flusher is None or self._flusher.done():
+            self._stopping.clear()
+            self._flusher = asyncio.create_task(self._flush_loop())
+    
+    async def stop_flusher(self) -> None:
+        """Stop the flusher, letting an in-flight batch finish, and persist anything still pending."""
+        if self._flusher is not None:
+            self._stopping.set()
+            self._flush_now.set()
+            await self._flusher
+            self._flusher = None
+        await self.flush()
+    
+    @staticmethod
+    def _stats_contribution(trace: Trace) -> Counter:
+        """
+        What a trace adds to its org's daily rollup.
+        
+        Scalar totals use string keys; breakdowns use tuple keys:
+        ("status", status), ("kind", kind) and ("model", model, metric).
+        """
+        counts = Counter({
+            "traces": 1,
+            "tokens": trace.total_tokens,
+            "cost_usd": trace.total_cost_usd,
+            "latency_ms": trace.duration_ms,
+            "errors": 1 if trace.status == TraceStatus.ERROR else 0,
+            ("status", trace.status.value): 1,
+        })
+        for span in trace.spans:
+            counts.update(TraceStore._span_contribution(span))
+        return counts
+    
+    @staticmethod
+    def _span_contribution(span: Span) -> Counter:
+        """The part of a trace's rollup contribution that comes from one span."""
+        counts = Counter({"spans": 1, ("kind", span.kind.value): 1})
+        if span.model:
+            counts[("model", span.model, "count")] += 1
+            counts[("model", span.model, "tokens")] += span.metrics.total_tokens
+            counts[("model", span.model, "cost")] += span.metrics.cost_usd
+        return counts
+    
+    def _record_stats(self, trace: Trace) -> None:
+        """Replace the trace's previous rollup contribution with its current one."""
+        previous = self._stats_contrib.get(trace.id)
+        if previous:
+            old_key, old_session_id, old_counts = previous
+            self._daily_stats[old_key].subtract(old_counts)
+            if old_session_id:
+                self._session_stats[old_session_id].subtract(old_counts)
+        
+        key = (trace.org_id, trace.start_time.date())
+        counts = self._stats_contribution(trace)
+        self._daily_stats.setdefault(key, Counter()).update(counts)
+        if trace.session_id:
+            self._session_stats.setdefault(trace.session_id, Counter()).update(counts)
+        self._stats_contrib[trace.id] = (key, trace.session_id, counts)
+    
+    def _apply_stats_delta(self, trace: Trace, delta: Counter) -> None:
+        """Add a span-level change to the trace's recorded rollup contribution."""
+        recorded = self._stats_contrib.get(trace.id)
+        if not recorded:
+            self._record_stats(trace)
+            return
+        
+        key, session_id, counts = recorded
+        # An open trace's duration follows its spans
+        delta["latency_ms"] += trace.duration_ms - counts["latency_ms"]
+        counts.update(delta)
+        self._daily_stats[key].update(delta)
+        if session_id:
+            self._session_stats[session_id].update(delta)
+    
+    def _bump_versions(self, trace: Trace) -> None:
+        self._trace_versions[trace.id] = self._trace_versions.get(trace.id, 0) + 1
+        self._org_versions[trace.org_id] = self._org_versions.get(trace.org_id, 0) + 1
+    
+    def trace_version(self, trace_id: str) -> int:
+        """Number of writes to a trace since it was loaded; changes on every save."""
+        return self._trace_versions.get(trace_id, 0)
+    
+    def org_version(self, org_id: str) -> int:
+        """Number of trace writes for an org; changes whenever its stats may have."""
+        return self._org_versions.get(org_id, 0)
+    
+    async def get_daily_stats(self, org_id: str, days: int) -> Counter:
+        """Summed rollup counters for the org over the last `days` UTC days (today included)."""
+        today = datetime.now(timezone.utc).date()
+        totals = Counter()
+        for offset in range(days):
+            bucket = self._daily_stats.get((org_id, today - timedelta(days=offset)))
+            if bucket:
+                totals.update(bucket)
+        return totals
+    
+    async def session_aggregate(self, session_id: str) -> Tuple[int, int, float]:
+        """(trace count, total tokens, total cost) for a session from its rollup."""
+        totals = self._session_stats.get(session_id) or Counter()
+        return totals["traces"], totals["tokens"], totals["cost_usd"]
     
     async def save_trace(self, trace: Trace) -> None:
         """Save a trace."""
+        await self.save_traces_bulk([trace])
+    
+    async def save_traces_bulk(self, traces: List[Trace]) -> None:
+        """Save several traces under a single lock acquisition."""
         async with self._lock:
-            self._traces[trace.id] = trace
-            
-            # Index by org
-            if trace.org_id not in self._by_org:
-                self._by_org[trace.org_id] = []
-            if trace.id not in self._by_org[trace.org_id]:
-                self._by_org[trace.org_id].append(trace.id)
-            
-            # Index by session
-            if trace.session_id:
-                if trace.session_id not in self._by_session:
-                    self._by_session[trace.session_id] = []
-                if trace.id not in self._by_session[trace.session_id]:
-                    self._by_session[trace.session_id].append(trace.id)
-            
-            # Enforce max size
-            if len(self._traces) > self._max_traces:
-                oldest_id = next(iter(self._traces))
-                old_trace = self._traces.pop(oldest_id)
-                if old_trace.org_id in self._by_org:
-                    self._by_org[old_trace.org_id] = [
-                        tid for tid in self._by_org[old_trace.org_id] if tid != oldest_id
-                    ]
+            for trace in traces:
+                self._save_locked(trace)
         
-        # Persist async
+        self._mark_dirty(traces)
+    
+    def _mark_dirty(self, traces: List[Trace]) -> None:
+        """Queue traces for the write-behind flusher."""
         if self._persistence_hook:
-            try:
-                await self._persistence_hook(trace)
-            except Exception as e:
-                logger.error(f"Failed to persist trace: {e}")
+            for trace in traces:
+                self._dirty[trace.id] = None
+            if len(self._dirty) >= PERSIST_BATCH_SIZE:
+                self._flush_now.set()
+    
+    def _save_locked(self, trace: Trace) -> None:
+        self._traces[trace.id] = trace
+        # Spans may have been edited in place since the tree was built
+        trace._span_tree = None
+        self._record_stats(trace)
+        self._bump_versions(trace)
+        
+        # Index by org
+        if trace.org_id not in self._by_org:
+            self._by_org[trace.org_id] = []
+        if trace.id not in self._by_org[trace.org_id]:
+            self._by_org[trace.org_id].append(trace.id)
+        
+        # Index by session
+        if trace.session_id:
+            if trace.session_id not in self._by_session:
+                self._by_session[trace.session_id] = []
+            if trace.id not in self._by_session[trace.session_id]:
+                self._by_session[trace.session_id].append(trace.id)
+        
+        # Enforce max size
+        if len(self._traces) > self._max_traces:
+            oldest_id = next(iter(self._traces))
+            old_trace = self._traces.pop(oldest_id)
+            # Evicted traces stay counted in the org rollups
+            self._stats_contrib.pop(oldest_id, None)
+            self._trace_versions.pop(oldest_id, None)
+            if old_trace.org_id in self._by_org:
+                self._by_org[old_trace.org_id] = [
+                    tid for tid in self._by_org[old_trace.org_id] if tid != oldest_id
+                ]
+            # A session's rollup goes with its last in-memory trace
+            session_trace_ids = self._by_session.get(old_trace.session_id)
+            if session_trace_ids is not None:
+                session_trace_ids = [tid for tid in session_trace_ids if tid != oldest_id]
+                if session_trace_ids:
+                    self._by_session[old_trace.session_id] = session_trace_ids
+                else:
+                    del self._by_session[old_trace.session_id]
+                    self._session_stats.pop(old_trace.session_id, None)
     
     async def get_trace(self, trace_id: str) -> Optional[Trace]:
         """Get a trace by ID."""
         return self._traces.get(trace_id)
     
+    def trace_ids(self):
+        """Live view of the stored trace IDs, for O(1) membership checks."""
+        return self._traces.keys()
+    
+    async def get_traces_bulk(self, trace_ids: List[str]) -> Dict[str, Trace]:
+        """Get several traces by ID; missing IDs are omitted."""
+        return {tid: self._traces[tid] for tid in trace_ids if tid in self._traces}
+    
     async def list_traces(
         self,
         org_id: str,
@@ -646,47 +956,117 @@ class TraceStore:
         user_id: Optional[str] = None,
         status: Optional[TraceStatus] = None,
         tags: Optional[List[str]] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        before: Optional[Tuple[datetime, str]] = None,
     ) -> List[Trace]:
-        """List traces for an organization."""
-        if session_id and session_id in self._by_session:
-            trace_ids = self._by_session[session_id]
+        """
+        List traces for an organization, newest first.
+        
+        All filters are applied in one pass and only the top offset + limit
+        traces are ranked. since is inclusive, until exclusive. before is a
+        (start_time, id) cursor: only traces ordered after it are returned.
+        """
+        if session_id:
+            trace_ids = self._by_session.get(session_id, [])
         else:
             trace_ids = self._by_org.get(org_id, [])
         
-        traces = [self._traces[tid] for tid in trace_ids if tid in self._traces]
-        
-        # Filter
-        if user_id:
-            traces = [t for t in traces if t.user_id == user_id]
-        if status:
-            traces = [t for t in traces if t.status == status]
-        if tags:
-            traces = [t for t in traces if any(tag in t.tags for tag in tags)]
-        
-        # Sort by start time descending
-        traces.sort(key=lambda t: t.start_time, reverse=True)
+        matching = (
+            t for t in (self._traces.get(tid) for tid in trace_ids)
+            if t is not None
+            and t.org_id == org_id
+            and (not user_id or t.user_id == user_id)
+            and (not status or t.status == status)
+            and (not tags or any(tag in t.tags for tag in tags))
+            and (since is None or t.start_time >= since)
+            and (until is None or t.start_time < until)
+            and (before is None or (t.start_time, t.id) < before)
+        )
         
-        return traces[offset:offset + limit]
+        newest = heapq.nlargest(offset + limit, matching, key=lambda t: (t.start_time, t.id))
+        return newest[offset:]
     
     async def save_session(self, session: Session) -> None:
         """Save a session."""
+        await self.save_sessions_bulk([session])
+    
+    async def save_sessions_bulk(self, sessions: List[Session]) -> None:
+        """Save several sessions under a single lock acquisition."""
         async with self._lock:
-            self._sessions[session.id] = session
+            for session in sessions:
+                self._sessions[session.id] = session
     
     async def get_session(self, session_id: str) -> Optional[Session]:
         """Get a session by ID."""
         return self._sessions.get(session_id)
     
+    async def upsert_span(self, trace_id: str, span: Span) -> Optional[Trace]:
+        """
+        Add a span to a trace, or replace the span with the same ID.
+        
+        Only the span's share of the rollups is adjusted and the trace is
+        queued for the flusher; the trace is not re-saved. Pass a new Span
+        object when replacing, so the old one can be subtracted. Returns the
+        trace, or None if it is not stored.
+        """
+        async with self._lock:
+            trace = self._traces.get(trace_id)
+            if not trace:
+                return None
+            
+            old = trace.replace_span(span)
+            if old is None:
+                trace.add_span(span)
+            
+            delta = self._span_contribution(span)
+            if old is not None:
+                delta.subtract(self._span_contribution(old))
+            self._apply_stats_delta(trace, delta)
+            self._bump_versions(trace)
+        
+        self._mark_dirty([trace])
+        return trace
+    
+    async def update_trace_fields(
+        self,
+        trace_id: str,
+        org_id: str,
+        fields: Dict[str, Any],
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> Optional[Trace]:
+        """
+        Apply a partial update to a stored trace under the store lock.
+        
+        fields are set as attributes and metadata is merged into the
+        existing metadata. A COMPLETED or ERROR status ends the trace. Only
+        a status change recomputes the trace's rollup contribution. Returns
+        the trace, or None if it is missing or belongs to another org.
+        """
+        async with self._lock:
+            trace = self._traces.get(trace_id)
+            if not trace or trace.org_id != org_id:
+                return None
+            
+            fields = dict(fields)
+            status = fields.pop("status", None)
+            for name, value in fields.items():
+                setattr(trace, name, value)
+            if metadata:
+                trace.metadata.update(metadata)
+            if status is not None:
+                trace.status = TraceStatus(status)
+                if trace.status in (TraceStatus.COMPLETED, TraceStatus.ERROR):
+                    trace.end()
+                self._record_stats(trace)
+            self._bump_versions(trace)
+        
+        self._mark_dirty([trace])
+        return trace
+    
     async def update_span(self, trace_id: str, span: Span) -> None:
         """Update a span within a trace."""
-        trace = self._traces.get(trace_id)
-        if trace:
-            for i, s in enumerate(trace.spans):
-                if s.id == span.id:
-                    trace.spans[i] = span
-                    break
-            else:
-                trace.spans.append(span)
+        await self.upsert_span(trace_id, span)
 
 
 # Global trace store
@@ -11,7 +11,7 @@ This module provides persistent storage for:
 import os
 import time
 from datetime import datetime, timedelta, timezone
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from dataclasses import dataclass, asdict
 import logging
 
@@ -31,6 +31,7 @@ FIRESTORE_PROJECT = os.getenv("GOOGLE_CLOUD_PROJECT", os.getenv("VERTEX_PROJECT"
 REQUESTS_COLLECTION = "llm_requests"
 INCIDENTS_COLLECTION = "llm_incidents"
 METRICS_COLLECTION = "llm_metrics"
+REQUESTS_PAGE_SIZE = 500  # Documents read per query in get_requests_page
 
 
 LATENCY_THRESHOLD_MS = 5000  
@@ -154,42 +155,112 @@ class FirestoreDB:
             logger.error(f"Failed to store request: {e}")
             return False
     
+    def _requests_query(
+        self,
+        since: datetime,
+        until: Optional[datetime] = None,
+        org_id: Optional[str] = None,
+        session_id: Optional[str] = None,
+        ok: Optional[bool] = None,
+        env: Optional[str] = None,
+    ):
+        """Build the newest-first requests query for the given filters."""
+        query = self.db.collection(REQUESTS_COLLECTION).where(filter=FieldFilter("timestamp", ">=", since))
+        if until is not None:
+            query = query.where(filter=FieldFilter("timestamp", "<", until))
+        if org_id:
+            query = query.where(filter=FieldFilter("org_id", "==", org_id))
+        if session_id:
+            query = query.where(filter=FieldFilter("session_id", "==", session_id))
+        if ok is not None:
+            query = query.where(filter=FieldFilter("ok", "==", ok))
+        if env:
+            query = query.where(filter=FieldFilter("env", "==", env))
+        return query.order_by("timestamp", direction=firestore.Query.DESCENDING)
+    
+    @staticmethod
+    def _format_request(data: Dict[str, Any]) -> Dict[str, Any]:
+        """Shape a stored request document for API consumers."""
+        if 'timestamp' in data and data['timestamp']:
+            ts = data['timestamp']
+            data['ts'] = ts.isoformat() if hasattr(ts, 'isoformat') else str(ts)
+            data['timestamp'] = ts  # Keep original timestamp
+        else:
+            data['ts'] = datetime.now(timezone.utc).isoformat()
+            data['timestamp'] = datetime.now(timezone.utc)
+        
+        return {
+            'request_id': data.get('request_id'),
+            'org_id': data.get('org_id'),
+            'timestamp': data.get('timestamp'),
+            'ts': data.get('ts'),
+            'route': data.get('route', 'POST /chat'),
+            'model': data.get('model', 'gemini-2.0-flash'),
+            'latency_ms': data.get('latency_ms', 0),
+            'ok': data.get('ok', True),
+            'safe_mode': data.get('safe_mode', False),
+            'trace_id': data.get('trace_id'),
+            'span_id': data.get('span_id'),
+            'session_id': data.get('session_id'),
+            'message_len': data.get('message_len', 0),
+            'answer_len': data.get('answer_len', 0),
+            'error_type': data.get('error_type'),
+            'prompt_tokens': data.get('prompt_tokens', 0),
+            'completion_tokens': data.get('completion_tokens', 0),
+            'total_tokens': data.get('total_tokens', 0),
+            'tokens': {
+                'prompt_tokens': data.get('prompt_tokens', 0),
+                'completion_tokens': data.get('completion_tokens', 0),
+                'total_tokens': data.get('total_tokens', 0),
+            } if data.get('total_tokens', 0) > 0 else None,
+            'total_cost_usd': data.get('total_cost_usd', 0),
+            'cost': {
+                'input_cost_usd': data.get('input_cost_usd', 0),
+                'output_cost_usd': data.get('output_cost_usd', 0),
+                'total_cost_usd': data.get('total_cost_usd', 0),
+            } if data.get('total_cost_usd', 0) > 0 else None,
+            'hallucination_risk': data.get('hallucination_risk', 0.0),
+            'abuse_detected': data.get('abuse_detected', False),
+            'abuse_type': data.get('abuse_type'),
+            'performance_score': data.get('performance_score', 1.0),
+            'response_quality': data.get('response_quality', 1.0),
+        }
+    
     def get_requests(
         self, 
         org_id: Optional[str] = None,
         limit: int = 40, 
         since_minutes: int = 60,
-        env: Optional[str] = None
+        env: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        session_id: Optional[str] = None,
+        ok: Optional[bool] = None,
     ) -> List[Dict[str, Any]]:
         """Get recent requests from Firestore.
         
         Args:
             org_id: If provided, filter by org_id. Old requests without org_id are included.
             limit: Max number of requests to return
-            since_minutes: Time window in minutes
+            since_minutes: Time window in minutes (ignored when since is given)
             env: Optional environment filter
+            since/until: Optional explicit timestamp range (until is exclusive)
+            session_id: Optional session filter
+            ok: Optional success/failure filter
         """
         if not self.is_available:
             return []
         
         try:
-            since = datetime.now(timezone.utc) - timedelta(minutes=since_minutes)
-            
-            # Base query - filter by timestamp
-            query = (
-                self.db.collection(REQUESTS_COLLECTION)
-                .where(filter=FieldFilter("timestamp", ">=", since))
-                .order_by("timestamp", direction=firestore.Query.DESCENDING)
-                .limit(limit * 2 if org_id else limit)  # Fetch more for client-side filtering
-            )
+            if since is None:
+                since = datetime.now(timezone.utc) - timedelta(minutes=since_minutes)
             
-            if env:
-                query = query.where(filter=FieldFilter("env", "==", env))
-            
-            docs = query.stream()
+            query = self._requests_query(
+                since, until, session_id=session_id, ok=ok, env=env,
+            ).limit(limit * 2 if org_id else limit)  # Fetch more for client-side filtering
             
             results = []
-            for doc in docs:
+            for doc in query.stream():
                 data = doc.to_dict()
                 
                 # Filter by org_id if provided
@@ -198,50 +269,7 @@ class FirestoreDB:
                 if org_id and record_org_id and record_org_id != org_id:
                     continue  # Skip records with different org_id
                 
-                if 'timestamp' in data and data['timestamp']:
-                    ts = data['timestamp']
-                    data['ts'] = ts.isoformat() if hasattr(ts, 'isoformat') else str(ts)
-                    data['timestamp'] = ts  # Keep original timestamp
-                else:
-                    data['ts'] = datetime.now(timezone.utc).isoformat()
-                    data['timestamp'] = datetime.now(timezone.utc)
-                
-                results.append({
-                    'request_id': data.get('request_id'),
-                    'org_id': data.get('org_id'),
-                    'timestamp': data.get('timestamp'),
-                    'ts': data.get('ts'),
-                    'route': data.get('route', 'POST /chat'),
-                    'model': data.get('model', 'gemini-2.0-flash'),
-                    'latency_ms': data.get('latency_ms', 0),
-                    'ok': data.get('ok', True),
-                    'safe_mode': data.get('safe_mode', False),
-                    'trace_id': data.get('trace_id'),
-                    'span_id': data.get('span_id'),
-                    'session_id': data.get('session_id'),
-                    'message_len': data.get('message_len', 0),
-                    'answer_len': data.get('answer_len', 0),
-                    'error_type': data.get('error_type'),
-                    'prompt_tokens': data.get('prompt_tokens', 0),
-                    'completion_tokens': data.get('completion_tokens', 0),
-                    'total_tokens': data.get('total_tokens', 0),
-                    'tokens': {
-                        'prompt_tokens': data.get('prompt_tokens', 0),
-                        'completion_tokens': data.get('completion_tokens', 0),
-                        'total_tokens': data.get('total_tokens', 0),
-                    } if data.get('total_tokens', 0) > 0 else None,
-                    'total_cost_usd': data.get('total_cost_usd', 0),
-                    'cost': {
-                        'input_cost_usd': data.get('input_cost_usd', 0),
-                        'output_cost_usd': data.get('output_cost_usd', 0),
-                        'total_cost_usd': data.get('total_cost_usd', 0),
-                    } if data.get('total_cost_usd', 0) > 0 else None,
-                    'hallucination_risk': data.get('hallucination_risk', 0.0),
-                    'abuse_detected': data.get('abuse_detected', False),
-                    'abuse_type': data.get('abuse_type'),
-                    'performance_score': data.get('performance_score', 1.0),
-                    'response_quality': data.get('response_quality', 1.0),
-                })
+                results.append(self._format_request(data))
                 
                 # Stop if we have enough results
                 if len(results) >= limit:
@@ -252,6 +280,58 @@ class FirestoreDB:
             logger.error(f"Failed to get requests: {e}")
             return []
     
+    def get_requests_page(
+        self,
+        org_id: str,
+        limit: int = 40,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        session_id: Optional[str] = None,
+        ok: Optional[bool] = None,
+        cursor: Optional[Any] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[Any]]:
+        """Get one org's requests newest first, filtered in the query.
+        
+        Unlike get_requests, records without an org_id are not included.
+        Documents are read in chunks of REQUESTS_PAGE_SIZE.
+        
+        Args:
+            org_id: Organization whose requests to return
+            limit: Max number of requests to return
+            since/until: Optional timestamp range (until is exclusive; since
+                defaults to 7 days ago)
+            session_id: Optional session filter
+            ok: Optional success/failure filter
+            cursor: next_cursor from a previous call, to continue after it
+        
+        Returns:
+            (requests, next_cursor); next_cursor is None once exhausted.
+        """
+        if not self.is_available:
+            return [], None
+        
+        try:
+            if since is None:
+                since = datetime.now(timezone.utc) - timedelta(days=7)
+            query = self._requests_query(since, until, org_id=org_id, session_id=session_id, ok=ok)
+            
+            results = []
+            while len(results) < limit:
+                size = min(limit - len(results), REQUESTS_PAGE_SIZE)
+                chunk = query.limit(size)
+                if cursor is not None:
+                    chunk = chunk.start_after(cursor)
+                docs = chunk.get()
+                results.extend(self._format_request(doc.to_dict()) for doc in docs)
+                if len(docs) < size:
+                    return results, None
+                cursor = docs[-1]
+            
+            return results, cursor
+        except Exception as e:
+            logger.error(f"Failed to get requests page: {e}")
+            return [], None
+    
     def calculate_metrics(self, window_minutes: int = 60) -> MetricsSummary:
         """Calculate real-time metrics from stored requests."""
         if not self.is_available:
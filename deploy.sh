@@ -40,6 +40,21 @@ setup() {
         --project="${PROJECT_ID}"
     log_success "APIs enabled"
 
+    log_info "Configuring Firestore TTL policies..."
+    gcloud firestore fields ttls update expires_at \
+        --collection-group=sso_states \
+        --enable-ttl \
+        --project="${PROJECT_ID}" --quiet 2>/dev/null || log_warning "TTL policy for sso_states already configured"
+    log_success "Firestore TTL policies ready"
+
+    if command -v firebase >/dev/null 2>&1; then
+        log_info "Deploying Firestore composite indexes..."
+        firebase deploy --only firestore:indexes --project="${PROJECT_ID}" || log_warning "Firestore index deploy failed"
+        log_success "Firestore indexes deployed (firestore.indexes.json)"
+    else
+        log_warning "firebase CLI not found - deploy firestore.indexes.json manually"
+    fi
+
     log_info "Creating Artifact Registry repository..."
     gcloud artifacts repositories create "${REPOSITORY}" \
         --repository-format=docker \
@@ -173,7 +173,7 @@ import { Switch } from "@/components/ui/switch";
 import { Separator } from "@/components/ui/separator";
 import { Textarea } from "@/components/ui/textarea";
 
-import api, { listApiKeys, createApiKey, revokeApiKey, apiRequest, apiPost, apiDelete } from "@/lib/api";
+import api, { listApiKeys, createApiKey, revokeApiKey, apiRequest, apiRequestAllPages, apiPost, apiDelete } from "@/lib/api";
 import { cn } from "@/lib/utils";
 import { HackathonControlsSidebar } from "@/components/dashboard/HackathonControlsSidebar";
 
@@ -3774,13 +3774,13 @@ function TeamModal({ isOpen, onClose, currentUser }) {
   async function loadTeamData() {
     setLoading(true);
     try {
-      const [membersRes, invitesRes] = await Promise.all([
-        apiRequest('/api/team/members'),
-        apiRequest('/api/team/invites'),
+      const [allMembers, allInvites] = await Promise.all([
+        apiRequestAllPages('/api/team/members', 'members'),
+        apiRequestAllPages('/api/team/invites', 'invites'),
       ]);
       
-      setMembers(membersRes.members || []);
-      setInvites(invitesRes.invites || []);
+      setMembers(allMembers);
+      setInvites(allInvites);
     } catch (err) {
       console.error('Failed to load team:', err);
     } finally {
@@ -42,14 +42,14 @@ export function TeamPage({ currentUser }) {
   async function loadTeamData() {
     setLoading(true);
     try {
-      const [membersRes, invitesRes, rolesRes] = await Promise.all([
-        api.apiRequest('/api/team/members'),
-        api.apiRequest('/api/team/invites'),
+      const [allMembers, allInvites, rolesRes] = await Promise.all([
+        api.apiRequestAllPages('/api/team/members', 'members'),
+        api.apiRequestAllPages('/api/team/invites', 'invites'),
         api.apiRequest('/api/team/roles'),
       ]);
       
-      setMembers(membersRes.members || []);
-      setInvites(invitesRes.invites || []);
+      setMembers(allMembers);
+      setInvites(allInvites);
       setRoles(rolesRes.roles || []);
     } catch (err) {
       setError(err.message || 'Failed to load team data');
@@ -118,6 +118,19 @@ export async function apiDelete(endpoint) {
   });
 }
 
+// Helper for cursor-paginated list endpoints: follows next_cursor and
+// returns the items under `key` from every page
+export async function apiRequestAllPages(endpoint, key) {
+  const items = [];
+  let cursor = null;
+  do {
+    const page = await apiRequest(endpoint + buildQuery({ cursor }));
+    items.push(...(page[key] || []));
+    cursor = page.next_cursor;
+  } while (cursor);
+  return items;
+}
+
 // Export apiRequest for direct use
 export { apiRequest };
 
@@ -50,7 +50,7 @@ from app.api.credentials import router as credentials_router
 from app.api.team import router as team_router
 from app.api.alerts import router as alerts_router
 from app.api.dashboards import router as dashboards_router
-from app.api.sso import router as sso_router
+from app.api.sso import router as sso_router, close_http_client as close_sso_http_client
 from app.api.playground import router as playground_router
 from app.api.templates import router as templates_router
 from app.api.experiments import router as experiments_router
@@ -63,6 +63,8 @@ from app.api.admin import router as admin_router
 # Import storage
 from app.core.storage import dual_storage
 from app.core.proxy import set_dual_storage_hook
+from app.core import email_queue
+from app.core.tracing import trace_store
 
 
 # =============================================================================
@@ -93,12 +95,18 @@ async def lifespan(app: FastAPI):
     set_dual_storage_hook(dual_storage_save_hook)
     logger.info("✓ Dual-write storage initialized")
     
+    email_queue.start_worker()
+    trace_store.start_flusher()  # No-op until a persistence hook is set
+    
     yield
     
     # Cleanup
     logger.info("Shutting down...")
     await dual_storage.shutdown()
     await gateway.close()
+    await close_sso_http_client()
+    await email_queue.stop_worker()
+    await trace_store.stop_flusher()
 
 
 # =============================================================================
@@ -152,6 +160,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Backfill Membership Profiles for Tracevox
+
+Copies each user's email and name onto their membership documents so
+the team member list can be served from the memberships collection alone.
+Safe to re-run; memberships that already carry both fields are skipped.
+
+Usage:
+    python scripts/backfill_membership_profiles.py
+"""
+
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.auth import get_db, MEMBERSHIPS_COLLECTION, USERS_COLLECTION
+
+BATCH_SIZE = 400  # Firestore allows up to 500 writes per batch
+
+
+def backfill_membership_profiles():
+    """Denormalize user email/name onto memberships missing them."""
+    print("=" * 60)
+    print("Backfilling Membership Profiles")
+    print("=" * 60)
+
+    db = get_db()
+    if not db:
+        print("\n❌ Firestore not available")
+        return
+
+    pending = [
+        doc for doc in db.collection(MEMBERSHIPS_COLLECTION).stream()
+        if not ("email" in (data := doc.to_dict()) and "name" in data)
+    ]
+    print(f"\nℹ️  {len(pending)} memberships need backfilling")
+
+    users = db.collection(USERS_COLLECTION)
+    user_ids = list({doc.to_dict().get("user_id") for doc in pending if doc.to_dict().get("user_id")})
+    users_by_id = {}
+    for i in range(0, len(user_ids), 100):
+        for user_doc in db.get_all([users.document(uid) for uid in user_ids[i:i + 100]]):
+            if user_doc.exists:
+                users_by_id[user_doc.id] = user_doc.to_dict()
+
+    updated = 0
+    batch = db.batch()
+    for doc in pending:
+        user_data = users_by_id.get(doc.to_dict().get("user_id"))
+        if not user_data:
+            continue
+        batch.update(doc.reference, {
+            "email": user_data.get("email", ""),
+            "name": user_data.get("name", ""),
+        })
+        updated += 1
+        if updated % BATCH_SIZE == 0:
+            batch.commit()
+            batch = db.batch()
+    batch.commit()
+
+    print(f"\n✅ Updated {updated} memberships")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    backfill_membership_profiles()
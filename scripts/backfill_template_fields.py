@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Backfill Prompt Template Fields for Tracevox
+
+Fills in fields that template listing queries order or filter on, for
+templates written before those fields existed. Safe to re-run; only
+templates missing a field are updated.
+
+Usage:
+    python scripts/backfill_template_fields.py
+"""
+
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.auth import get_db
+
+BATCH_SIZE = 400  # Firestore allows up to 500 writes per batch
+
+
+def missing_fields(data: dict) -> dict:
+    """Return the derived fields a template document is missing."""
+    updates = {}
+    if "usage_count" not in data:
+        updates["usage_count"] = 0
+    if "name_lower" not in data and data.get("name"):
+        updates["name_lower"] = data["name"].lower()
+    if "message_count" not in data:
+        updates["message_count"] = len(data.get("messages") or [])
+    if "variable_count" not in data:
+        updates["variable_count"] = len(data.get("variables") or [])
+    return updates
+
+
+def backfill_template_fields():
+    """Add derived listing fields to templates missing them."""
+    print("=" * 60)
+    print("Backfilling Prompt Template Fields")
+    print("=" * 60)
+
+    db = get_db()
+    if not db:
+        print("\n❌ Firestore not available")
+        return
+
+    updated = 0
+    batch = db.batch()
+    for doc in db.collection("prompt_templates").stream():
+        updates = missing_fields(doc.to_dict())
+        if not updates:
+            continue
+        batch.update(doc.reference, updates)
+        updated += 1
+        if updated % BATCH_SIZE == 0:
+            batch.commit()
+            batch = db.batch()
+    batch.commit()
+
+    print(f"\n✅ Updated {updated} templates")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    backfill_template_fields()
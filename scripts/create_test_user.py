@@ -60,7 +60,7 @@ def create_test_user():
     print(f"   Org ID: {org_id}")
     
     # Create membership
-    create_membership_record(user_id, org_id, "owner")
+    create_membership_record(user_id, org_id, "owner", TEST_USER_EMAIL, TEST_USER_NAME)
     print(f"\n✅ Created membership (owner)")
     
     print("\n" + "=" * 60)
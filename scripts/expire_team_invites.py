@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Expire Stale Team Invites for Tracevox
+
+Marks pending team invitations past their expires_at as "expired".
+accept_invite already rejects them at query time; this sweep keeps the
+stored status accurate. Intended to run hourly (e.g. as a Cloud Run job
+triggered by Cloud Scheduler).
+
+Usage:
+    python scripts/expire_team_invites.py
+"""
+
+import os
+import sys
+from datetime import datetime, timezone
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.auth import get_db
+
+BATCH_SIZE = 500  # Firestore's per-batch write limit
+
+
+def expire_team_invites():
+    """Bulk-transition expired pending invites in batches of BATCH_SIZE."""
+    db = get_db()
+    if not db:
+        print("❌ Firestore not available")
+        return
+
+    now = datetime.now(timezone.utc)
+    query = (
+        db.collection("team_invites")
+        .where("status", "==", "pending")
+        .where("expires_at", "<=", now)
+        .limit(BATCH_SIZE)
+    )
+
+    expired = 0
+    while True:
+        docs = query.get()
+        if not docs:
+            break
+        batch = db.batch()
+        for doc in docs:
+            batch.update(doc.reference, {"status": "expired", "expired_at": now})
+        batch.commit()
+        expired += len(docs)
+        if len(docs) < BATCH_SIZE:
+            break
+
+    print(f"✅ Expired {expired} team invites")
+
+
+if __name__ == "__main__":
+    expire_team_invites()
@@ -0,0 +1,113 @@
+"""Tests for the outbound email queue."""
+
+import asyncio
+
+import pytest
+
+from app.core import email_queue
+from app.core.notifications import EmailRejectedError
+
+
+class _FakeRedis:
+    def __init__(self, times_delivered=1):
+        self.acked = []
+        self.dead = []
+        self.times_delivered = times_delivered
+
+    async def xack(self, stream, group, *ids):
+        self.acked.extend(ids)
+
+    async def xadd(self, stream, fields):
+        self.dead.append((stream, fields))
+
+    async def xpending_range(self, stream, group, min, max, count):
+        return [{"message_id": min, "times_delivered": self.times_delivered}]
+
+
+def _job(to):
+    return ('{"to":"%s","template":"invite","vars":{}}' % to).encode()
+
+
+def _entries():
+    return [(b"1-0", {b"job": _job("a@example.com")}), (b"2-0", None)]
+
+
+def _stub_send(monkeypatch, send):
+    sent = []
+
+    async def send_email_batch(messages):
+        sent.append([m["to"] for m in messages])
+        return send(messages)
+    monkeypatch.setattr(email_queue, "send_email_batch", send_email_batch)
+    monkeypatch.setattr(email_queue, "_render", lambda job: {"to": job["to"]})
+    return sent
+
+
+def test_stream_entries_acked_after_delivery(monkeypatch):
+    redis = _FakeRedis()
+    monkeypatch.setattr(email_queue, "_redis", redis)
+    _stub_send(monkeypatch, len)
+
+    asyncio.run(email_queue._deliver_entries(_entries()))
+
+    assert redis.acked == [b"2-0", b"1-0"]
+    assert redis.dead == []
+
+
+def test_failed_delivery_leaves_entries_pending(monkeypatch):
+    redis = _FakeRedis()
+    monkeypatch.setattr(email_queue, "_redis", redis)
+    _stub_send(monkeypatch, lambda messages: 0)
+
+    asyncio.run(email_queue._deliver_entries(_entries()))
+
+    assert redis.acked == [b"2-0"]
+    assert redis.dead == []
+
+
+def test_entries_dead_lettered_after_max_attempts(monkeypatch):
+    redis = _FakeRedis(times_delivered=email_queue.EMAIL_MAX_ATTEMPTS)
+    monkeypatch.setattr(email_queue, "_redis", redis)
+    _stub_send(monkeypatch, lambda messages: 0)
+
+    asyncio.run(email_queue._deliver_entries(_entries()))
+
+    assert redis.acked == [b"2-0", b"1-0"]
+    assert redis.dead == [
+        (email_queue.EMAIL_DEAD_STREAM, {"job": _job("a@example.com"), "reason": "max_attempts"}),
+    ]
+
+
+def test_rejected_batch_is_resent_one_message_at_a_time(monkeypatch):
+    redis = _FakeRedis()
+    monkeypatch.setattr(email_queue, "_redis", redis)
+
+    def send(messages):
+        if any(m["to"] == "bad" for m in messages):
+            raise EmailRejectedError("422")
+        return len(messages)
+    sent = _stub_send(monkeypatch, send)
+
+    entries = [(b"1-0", {b"job": _job("a@example.com")}), (b"2-0", {b"job": _job("bad")})]
+    asyncio.run(email_queue._deliver_entries(entries))
+
+    assert sent == [["a@example.com", "bad"], ["a@example.com"], ["bad"]]
+    assert redis.acked == [b"1-0", b"2-0"]
+    assert redis.dead == [(email_queue.EMAIL_DEAD_STREAM, {"job": _job("bad"), "reason": "rejected"})]
+
+
+def test_memory_retries_are_bounded(monkeypatch):
+    monkeypatch.setattr(email_queue, "_memory_retries", {})
+    _stub_send(monkeypatch, lambda messages: 0)
+
+    async def run():
+        await email_queue._deliver_memory([{"to": "a@example.com"}])
+        await email_queue._deliver_memory(
+            [{"to": "b@example.com", "attempts": email_queue.EMAIL_MAX_ATTEMPTS}]
+        )
+        retries = [job for _, job in email_queue._memory_retries.values()]
+        for timer, _ in email_queue._memory_retries.values():
+            timer.cancel()
+        return retries
+
+    assert asyncio.run(run()) == [{"to": "a@example.com", "attempts": 2}]
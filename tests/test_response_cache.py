@@ -0,0 +1,24 @@
+"""Tests for the API response cache's in-memory fallback."""
+
+import asyncio
+
+from app.core import response_cache
+
+
+def test_memory_fallback_evicts_oldest_when_full(monkeypatch):
+    monkeypatch.setattr(response_cache, "_redis", None)
+    monkeypatch.setattr(response_cache, "_memory", response_cache.OrderedDict())
+    monkeypatch.setattr(response_cache, "MAX_MEMORY_ENTRIES", 2)
+
+    async def produce(value):
+        return value
+
+    async def run():
+        await response_cache.cached("a", 60, lambda: produce(1))
+        await response_cache.cached("b", 60, lambda: produce(2))
+        await response_cache.cached("a", 60, lambda: produce(-1))  # hit, now newest
+        await response_cache.cached("c", 60, lambda: produce(3))
+
+    asyncio.run(run())
+
+    assert list(response_cache._memory) == ["resp_cache:a", "resp_cache:c"]
@@ -0,0 +1,25 @@
+"""Tests for SSO config helpers."""
+
+import asyncio
+
+from app.api import sso
+
+
+def test_cancelled_caller_does_not_cancel_shared_config_read(monkeypatch):
+    monkeypatch.setattr(sso, "_safe_config_cache", {})
+
+    async def fetch(db, org_id):
+        await asyncio.sleep(0.05)
+        return [{"provider": "oidc"}]
+    monkeypatch.setattr(sso, "_fetch_safe_sso_configs", fetch)
+
+    async def run():
+        owner = asyncio.create_task(sso.get_safe_sso_configs(None, "org_1"))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(sso.get_safe_sso_configs(None, "org_1"))
+        await asyncio.sleep(0.01)
+        owner.cancel()  # Client disconnect on the request that started the read
+        return await waiter
+
+    assert asyncio.run(run()) == [{"provider": "oidc"}]
+    assert sso._safe_config_inflight == {}
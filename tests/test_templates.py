@@ -0,0 +1,93 @@
+"""Tests for prompt template endpoints."""
+
+import asyncio
+
+from app.api import templates
+
+
+class _FakeSnapshot:
+    def __init__(self, data):
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class _FakeDocRef:
+    def __init__(self, data, doc_id="tmpl_1"):
+        self._data = data
+        self.id = doc_id
+
+    async def get(self):
+        return _FakeSnapshot(self._data)
+
+
+class _FakeBatch:
+    def __init__(self):
+        self.writes = []
+
+    def set(self, ref, data):
+        self.writes.append((ref, data))
+
+    async def commit(self):
+        pass
+
+
+class _FakeDB:
+    def __init__(self, source):
+        self._source = source
+        self.batches = []
+
+    def collection(self, name):
+        return self
+
+    def document(self, doc_id):
+        return _FakeDocRef(self._source, doc_id)
+
+    def batch(self):
+        batch = _FakeBatch()
+        self.batches.append(batch)
+        return batch
+
+
+def test_duplicate_playground_template(monkeypatch):
+    # Shape written by playground.save_as_template: variables are plain names
+    source = {
+        "org_id": "org_1",
+        "created_by": "user_1",
+        "name": "Blog intro",
+        "category": "playground",
+        "tags": None,
+        "messages": [{"role": "user", "content": "Write about {{topic}} in a {{tone}} tone"}],
+        "message_count": 1,
+        "variables": ["topic", "tone"],
+        "variable_count": 2,
+        "default_model": "gpt-4o",
+        "default_temperature": None,
+    }
+    db = _FakeDB(source)
+    monkeypatch.setattr(templates, "get_async_db", lambda: db)
+    monkeypatch.setattr(templates, "new_template_ref", lambda db, org_id: _FakeDocRef(None, "org_1_copy"))
+    monkeypatch.setattr(templates, "_stage_category_change", lambda *args: None)
+
+    result = asyncio.run(templates.duplicate_template(
+        "tmpl_1",
+        name=None,
+        current_user={"org_id": "org_1", "user": {"id": "user_2"}},
+    ))
+
+    assert result == {"success": True, "template_id": "org_1_copy", "name": "Blog intro (Copy)"}
+    (_, written), = db.batches[0].writes
+    assert written["variables"] == ["topic", "tone"]
+    assert written["variable_count"] == 2
+    assert written["tags"] == []
+    assert written["default_temperature"] == 0.7
+    assert written["created_by"] == "user_2"
+
+
+def test_list_projection_covers_cursor_fields():
+    # Cursors are built from the projected snapshot of the last document
+    for order in (templates.LIST_ORDER, templates.SEARCH_ORDER):
+        for field, _ in order:
+            assert field in templates.LIST_FIELDS
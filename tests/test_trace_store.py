@@ -0,0 +1,87 @@
+"""Tests for the in-memory trace store."""
+
+import asyncio
+from datetime import datetime, timezone
+
+from app.core.tracing import Trace, TraceStore
+
+
+def test_failed_flush_requeues_batch():
+    store = TraceStore()
+    calls = []
+
+    async def hook(traces):
+        calls.append([t.id for t in traces])
+        if len(calls) == 1:
+            raise RuntimeError("firestore unavailable")
+
+    async def run():
+        store._persistence_hook = hook
+        await store.save_trace(Trace(id="t1", org_id="org_1"))
+        await store.flush()
+        assert list(store._dirty) == ["t1"]
+        await store.flush()
+        assert not store._dirty
+
+    asyncio.run(run())
+    assert calls == [["t1"], ["t1"]]
+
+
+def test_stop_flusher_waits_for_in_flight_batch():
+    store = TraceStore()
+    persisted = []
+
+    async def hook(traces):
+        await asyncio.sleep(0.05)
+        persisted.extend(t.id for t in traces)
+
+    async def run():
+        store.set_persistence_hook(hook)
+        await store.save_trace(Trace(id="t1", org_id="org_1"))
+        store._flush_now.set()
+        await asyncio.sleep(0.01)  # Flusher is now inside the hook
+        await store.stop_flusher()
+
+    asyncio.run(run())
+    assert persisted == ["t1"]
+
+
+def test_flusher_not_started_without_hook():
+    store = TraceStore()
+
+    async def run():
+        store.start_flusher()
+        return store._flusher
+
+    assert asyncio.run(run()) is None
+
+
+def test_offsetless_timestamps_compare_with_date_filters():
+    store = TraceStore()
+    trace = Trace.from_dict({
+        "id": "t1",
+        "org_id": "org_1",
+        "start_time": "2026-10-17T10:00:00",
+    })
+    assert trace.start_time.tzinfo is not None
+
+    async def run():
+        await store.save_trace(trace)
+        return await store.list_traces(
+            "org_1", since=datetime(2026, 10, 17, tzinfo=timezone.utc)
+        )
+
+    assert [t.id for t in asyncio.run(run())] == ["t1"]
+
+
+def test_evicting_last_session_trace_drops_session_rollup():
+    store = TraceStore(max_traces=2)
+
+    async def run():
+        await store.save_trace(Trace(id="t1", org_id="org_1", session_id="s1"))
+        await store.save_trace(Trace(id="t2", org_id="org_1", session_id="s2"))
+        await store.save_trace(Trace(id="t3", org_id="org_1", session_id="s2"))
+
+    asyncio.run(run())
+    assert set(store._session_stats) == {"s2"}
+    assert store._by_session == {"s2": ["t2", "t3"]}